@@ -0,0 +1,194 @@
+'''
+Headless batch reports: runs the dashboard pipeline over a directory of solve histories in parallel.
+
+Usage:
+    py batch.py histories/ reports/                 # one process per CPU
+    py batch.py histories/ reports/ --workers 4 --window 1000
+
+Every "<cuber>.csv" (same layout as data.csv) gets a "reports/<cuber>/" folder with summary.json,
+weekly.csv (weekly structure bins), sessions.csv (session stats and clusters), fatigue_curve.csv and yearly.csv.
+reports/summary.csv has one row per cuber.
+'''
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from threadpoolctl import threadpool_limits
+
+import data_processing as dp
+
+SESSION_MAX_GAP_SEC = 600
+WINDOW = 500
+STRUCTURE_CLUSTERS = 4
+SESSION_CLUSTERS = 3
+MIN_SOLVES_K_MEANS = 10
+MIN_SESSION_SIZE = 40
+AVERAGES = (5, 12, 100)
+
+def _ranked_clusters(stage: dp.ClusteringStage, features: pd.DataFrame, k: int, z_scores: pd.Series) -> np.ndarray:
+    '''
+    K-Means labels renumbered by the mean z-score of each cluster (0 = best performing), NaN when there are fewer samples than k.
+    '''
+    valid = features.notna().all(axis=1).to_numpy() & z_scores.notna().to_numpy()
+    ranked = np.full(len(features), np.nan)
+    if valid.sum() < k:
+        return ranked
+    labels = stage.fit_predict(features[valid], k)
+    order = pd.Series(z_scores.to_numpy()[valid]).groupby(labels).mean().sort_values().index
+    ranked[valid] = pd.Series(labels).map({cluster: rank for rank, cluster in enumerate(order)}).to_numpy()
+    return ranked
+
+def analyze_history(
+    path: str,
+    session_max_gap_sec: int = SESSION_MAX_GAP_SEC,
+    window: int = WINDOW,
+    structure_clusters: int = STRUCTURE_CLUSTERS,
+    session_clusters: int = SESSION_CLUSTERS,
+    min_solves_k_means: int = MIN_SOLVES_K_MEANS,
+    min_session_size: int = MIN_SESSION_SIZE
+) -> dict:
+    """
+    Runs the dashboard pipeline (base frame, Ao-N, z-scores, weekly structure bins, clusters, fatigue curve)
+    on one solve history with the dashboard defaults.
+
+    Returns:
+        {"summary": dict, "weekly": frame, "sessions": frame, "fatigue_curve": frame, "yearly": frame}
+    """
+    df = dp.prepare_base_dataframe(dp.read_solves_csv(path), session_max_gap_sec)
+    dates = df["date"].to_numpy()
+    times = df["time_sec"].to_numpy()
+    session_ids = df["session_id"].to_numpy()
+    sessions = dp.SessionIndex.from_session_ids(session_ids)
+
+    _, _, z_score = dp.RollingStats(times).z_score(window)
+    df["z_score"] = z_score.astype(np.float32)
+
+    # ----- Weekly structure -----
+    cube = dp.RollupCube(dates, times, z_score, session_ids)
+    _, weekly_valid = dp.weekly_tables(cube.weekly())
+    weekly_valid = dp.add_weekly_structure_bins(weekly_valid)
+
+    yearly = cube.rollup("year")[["count", "mean_time"]].rename(columns={"count": "solves"})
+    yearly["median_time"] = dp.sorted_group_medians(df["year"].to_numpy(), times)
+
+    # ----- Sessions and clusters -----
+    session_stats = dp.compute_session_stats(df, sessions)
+    features = dp.session_structure_features(session_stats).set_index("session_id")
+    session_stats["weekly_n_sessions"] = features["weekly_n_sessions"]
+    session_stats["structure_cluster"] = _ranked_clusters(
+        dp.ClusteringStage(random_state=1),
+        features[["session_size", "weekly_n_sessions"]], structure_clusters, features["z_score_mean"]
+    )
+    large = session_stats[session_stats["session_size"] >= min_solves_k_means]
+    session_stats["session_cluster"] = pd.Series(_ranked_clusters(
+        dp.ClusteringStage(random_state=42),
+        large[["z_score", "session_size"]], session_clusters, large["z_score"]
+    ), index=large.index)
+
+    # ----- Fatigue -----
+    fatigue_df = dp.compute_fatigue_bins(df, sessions, min_session_size)
+    fatigue_curve = (
+        fatigue_df.groupby("fatigue_bin", observed=False)
+        .agg(mean_z_score=("z_score", "mean"), n_solves=("z_score", "count"))
+        .reset_index()
+    )
+
+    summary = {
+        "cuber": os.path.splitext(os.path.basename(path))[0],
+        "solves": len(df),
+        "first_solve": str(df["date"].iloc[0]) if len(df) else None,
+        "last_solve": str(df["date"].iloc[-1]) if len(df) else None,
+        "sessions": len(sessions),
+        "weeks": len(weekly_valid),
+        "mean_time": float(np.mean(times)) if len(df) else None,
+        "best_time": float(np.min(times)) if len(df) else None,
+    }
+    for n in AVERAGES:
+        ao = dp.rolling_wca_average(times, session_ids, n)
+        finite = ao[np.isfinite(ao)]
+        summary[f"best_ao{n}"] = float(finite.min()) if len(finite) else None
+        summary[f"last_ao{n}"] = float(finite[-1]) if len(finite) else None
+
+    return {"summary": summary, "weekly": weekly_valid, "sessions": session_stats, "fatigue_curve": fatigue_curve, "yearly": yearly}
+
+def process_history(path: str, out_dir: str, **params) -> dict:
+    '''
+    Analyzes one history and writes its report folder to out_dir/<cuber>/.
+
+    Returns:
+        The summary of the history, with the elapsed seconds
+    '''
+    start = time.perf_counter()
+    with threadpool_limits(1): # parallelism comes from the process pool, keep BLAS/OpenMP single-threaded per worker
+        report = analyze_history(path, **params)
+
+    summary = report.pop("summary")
+    cuber_dir = os.path.join(out_dir, summary["cuber"])
+    os.makedirs(cuber_dir, exist_ok=True)
+    for name, frame in report.items():
+        frame.to_csv(os.path.join(cuber_dir, f"{name}.csv"))
+
+    summary["seconds"] = time.perf_counter() - start
+    with open(os.path.join(cuber_dir, "summary.json"), "w") as f:
+        json.dump({**summary, "params": params}, f, indent=2)
+    return summary
+
+def run_batch(input_dir: str, out_dir: str, workers: int | None = None, pattern: str = "*.csv", **params) -> pd.DataFrame:
+    """
+    Processes every history matching pattern in input_dir on a process pool (largest files first,
+    so the batch takes about as long as the slowest history). A failing history is reported in
+    the "error" column instead of stopping the batch.
+
+    Returns:
+        Summary frame with one row per cuber, also written to out_dir/summary.csv
+    """
+    paths = sorted(glob.glob(os.path.join(input_dir, pattern)), key=os.path.getsize, reverse=True)
+    os.makedirs(out_dir, exist_ok=True)
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(process_history, path, out_dir, **params): path for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                rows.append(future.result())
+            except Exception as error:
+                rows.append({"cuber": os.path.splitext(os.path.basename(path))[0], "error": f"{type(error).__name__}: {error}"})
+
+    summary = pd.DataFrame(rows) if rows else pd.DataFrame(columns=["cuber"])
+    summary = summary.sort_values("cuber").reset_index(drop=True)
+    summary.to_csv(os.path.join(out_dir, "summary.csv"), index=False)
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the speedcube analytics pipeline over a directory of solve histories.")
+    parser.add_argument("input_dir", help="directory with one \"date;time\" CSV per cuber")
+    parser.add_argument("out_dir", help="directory for the reports")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--pattern", default="*.csv")
+    parser.add_argument("--session-gap-min", type=int, default=SESSION_MAX_GAP_SEC // 60)
+    parser.add_argument("--window", type=int, default=WINDOW)
+    parser.add_argument("--structure-clusters", type=int, default=STRUCTURE_CLUSTERS)
+    parser.add_argument("--session-clusters", type=int, default=SESSION_CLUSTERS)
+    parser.add_argument("--min-solves-k-means", type=int, default=MIN_SOLVES_K_MEANS, help="min solves of a session to be clustered")
+    parser.add_argument("--min-session-size", type=int, default=MIN_SESSION_SIZE)
+    args = parser.parse_args()
+
+    summary = run_batch(
+        args.input_dir, args.out_dir, args.workers, args.pattern,
+        session_max_gap_sec=args.session_gap_min * 60,
+        window=args.window,
+        structure_clusters=args.structure_clusters,
+        session_clusters=args.session_clusters,
+        min_solves_k_means=args.min_solves_k_means,
+        min_session_size=args.min_session_size
+    )
+    print(summary.to_string(index=False))
+
+if __name__ == "__main__":
+    main()
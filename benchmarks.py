@@ -0,0 +1,200 @@
+'''
+Benchmark suite of the data_processing pipeline on synthetic histories.
+
+Usage:
+    py benchmarks.py                                   # 100k, 1M and 10M solves
+    py benchmarks.py --sizes 100000 --save baseline.json
+    py benchmarks.py --sizes 100000 --compare baseline.json
+'''
+import argparse
+import json
+import os
+import platform
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import data_processing as dp
+import profiling
+import storage
+import synthetic
+
+SIZES = [100_000, 1_000_000, 10_000_000]
+SESSION_MAX_GAP_SEC = 600
+WINDOW = 500
+REGRESSION_THRESHOLD = 1.25 # flag stages more than 25% slower than the baseline
+MIN_SLOWDOWN_SEC = 0.005 # ... and by more than timer noise
+
+def pipeline_stages(csv_path: str) -> list:
+    '''
+    Returns the benchmarked stages as (name, function) in dashboard order.
+    Each function receives the shared state dict, stores what later stages need and returns its row count.
+    '''
+
+    def read(state):
+        state["raw"] = dp.read_solves_csv(csv_path)
+        return len(state["raw"])
+
+    def prepare(state):
+        state["df"] = dp.prepare_base_dataframe(state["raw"].copy(), SESSION_MAX_GAP_SEC)
+        return len(state["df"])
+
+    def rolling_z(state):
+        df = state["df"]
+        ma, std, z = dp.RollingStats(df["time_sec"].to_numpy()).z_score(WINDOW)
+        df["z_score"] = z.astype(np.float32)
+        return len(df)
+
+    def best_ao5(state):
+        dp.compute_best_ao5_wca(state["df"])
+        return len(state["df"])
+
+    def rolling_ao100(state):
+        df = state["df"]
+        dp.rolling_wca_average(df["time_sec"].to_numpy(), df["session_id"].to_numpy(), 100)
+        return len(df)
+
+    def session_index(state):
+        state["sessions"] = dp.GapIndex(state["df"]["date"].to_numpy()).sessions(SESSION_MAX_GAP_SEC)
+        return len(state["sessions"])
+
+    def session_stats(state):
+        state["session_stats"] = dp.compute_session_stats(state["df"], state["sessions"])
+        return len(state["session_stats"])
+
+    def week_column(state):
+        _, state["weekly"], state["weekly_valid"] = dp.week_column(state["df"].copy())
+        return len(state["weekly"])
+
+    def rollup_cube(state):
+        df = state["df"]
+        cube = dp.RollupCube(df["date"].to_numpy(), df["time_sec"].to_numpy(), df["z_score"].to_numpy(), df["session_id"].to_numpy())
+        cube.rollup("weekday_hour")
+        cube.rollup("year")
+        dp.weekly_tables(cube.weekly())
+        return len(cube.days)
+
+    def weekly_bins(state):
+        return len(dp.add_weekly_structure_bins(state["weekly_valid"]))
+
+    def fatigue_bins(state):
+        return len(dp.compute_fatigue_bins(state["df"], state["sessions"]))
+
+    def subx(state):
+        times = state["df"]["time_sec"].to_numpy()
+        dp.SubXIndex(times).probabilities(np.arange(6, 16))
+        dp.rolling_subx_probability(times, 8.0, 100)
+        return len(times)
+
+    def clustering(state):
+        features = state["session_stats"][["session_size", "z_score"]].dropna()
+        dp.ClusteringStage(random_state=42).fit_predict(features, 3)
+        return len(features)
+
+    def regression(state):
+        stats = state["session_stats"].dropna(subset=["mean_time"])
+        days = (stats["end"].max() - stats["end"]).dt.days.to_numpy(np.float64)
+        dp.bootstrap_weighted_regression(stats["session_size"], stats["mean_time"], days, [0, 0.001, 0.01], n_boot=1000)
+        return len(stats)
+
+    def downsample(state):
+        df = state["df"]
+        x = df["date"].to_numpy().astype(np.int64)
+        dp.minmax_downsample_indices(x, df["time_sec"].to_numpy(), 2000)
+        return len(df)
+
+    return [
+        ("read_solves_csv", read),
+        ("prepare_base_dataframe", prepare),
+        ("rolling_z_score", rolling_z),
+        ("compute_best_ao5_wca", best_ao5),
+        ("rolling_wca_average_100", rolling_ao100),
+        ("session_index", session_index),
+        ("compute_session_stats", session_stats),
+        ("week_column", week_column),
+        ("rollup_cube", rollup_cube),
+        ("add_weekly_structure_bins", weekly_bins),
+        ("compute_fatigue_bins", fatigue_bins),
+        ("subx", subx),
+        ("clustering", clustering),
+        ("bootstrap_regression", regression),
+        ("downsample", downsample),
+    ]
+
+def run_benchmarks(sizes: list[int], seed: int = 0, repeat: int = 1) -> list[dict]:
+    """
+    Times (best of repeat runs) and memory-profiles (tracemalloc peak, separate run) every stage for each size.
+
+    Returns:
+        One record per (size, stage) with seconds, peak_mb and rows
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            csv_path = os.path.join(tmp, f"solves_{size}.csv")
+            storage.write_solves_csv(synthetic.generate_solves(size, seed=seed), csv_path)
+
+            timings = {}
+            for _ in range(repeat):
+                state, profiler = {}, profiling.StageProfiler()
+                for name, stage in pipeline_stages(csv_path):
+                    with profiler.stage(name) as record:
+                        record["rows"] = stage(state)
+                for record in profiler.records:
+                    timings[record["stage"]] = min(record["seconds"], timings.get(record["stage"], np.inf))
+
+            state, profiler = {}, profiling.StageProfiler(trace_memory=True)
+            for name, stage in pipeline_stages(csv_path):
+                with profiler.stage(name) as record:
+                    record["rows"] = stage(state)
+                results.append({"size": size, "stage": name, "seconds": timings[name], "peak_mb": record["peak_mb"], "rows": record["rows"]})
+                print(f"{size:>10} {name:<28} {timings[name]:9.4f} s {record['peak_mb']:10.1f} MB")
+            profiler.close()
+    return results
+
+def compare(results: list[dict], baseline: list[dict]) -> pd.DataFrame:
+    '''
+    Joins results with a saved baseline and flags stages slower than REGRESSION_THRESHOLD times the baseline.
+    '''
+    current = pd.DataFrame(results).set_index(["size", "stage"])
+    previous = pd.DataFrame(baseline).set_index(["size", "stage"])
+    report = current[["seconds", "peak_mb"]].join(previous[["seconds", "peak_mb"]], rsuffix="_baseline", how="inner")
+    report["time_ratio"] = report["seconds"] / report["seconds_baseline"]
+    report["memory_ratio"] = report["peak_mb"] / report["peak_mb_baseline"]
+    report["regression"] = (report["time_ratio"] > REGRESSION_THRESHOLD) & (report["seconds"] - report["seconds_baseline"] > MIN_SLOWDOWN_SEC)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the data_processing pipeline on synthetic solve histories.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", help="compare against a JSON baseline written with --save")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.seed, args.repeat)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "created": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "pandas": pd.__version__,
+                "machine": platform.platform(),
+                "seed": args.seed,
+                "results": results,
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            report = compare(results, json.load(f)["results"])
+        print(report.round(3).to_string())
+        if report["regression"].any():
+            raise SystemExit(f"{int(report['regression'].sum())} stage(s) slower than {REGRESSION_THRESHOLD}x the baseline")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,14 @@
+import hashlib
+import io
+import threading
+from collections import OrderedDict
 import pandas as pd
 import plotly.express as px
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+from sklearn.preprocessing import StandardScaler
 
 def parse_time_mmss(s):
     """Converts strings mm:ss.xx to pd.Timedelta"""
@@ -14,24 +22,538 @@ def parse_time_mmss(s):
     except:
         return pd.Timedelta(0)
 
-def prepare_base_dataframe(df, SESSION_MAX_GAP_SEC):
-    df["date"] = pd.to_datetime(df["date"], dayfirst=True)
-    df["time_sec"] = df["time"].astype(str).str.split(":").apply(lambda x: float(x[0]) * 60 + float(x[1]))
-    
-    df = df.sort_values("date")
-    
-    df["year"] = df["date"].dt.year
-    df["hour"] = df["date"].dt.hour
-    df["weekday"] = df["date"].dt.day_name()
+DATE_LAYOUTS = ["DD/MM/YYYY hh:mm", "DD/MM/YYYY hh:mm:ss"]
+TIME_LAYOUTS = ["mm:ss.ff", "mm:ss.fff", "ss.ff", "h:mm:ss.ff"]
 
-    df["time_diff"] = df["date"].diff().dt.total_seconds()
-    df["new_session"] = df["time_diff"] > SESSION_MAX_GAP_SEC
-    df["session_id"] = df["new_session"].cumsum()
+def _parse_fixed_width(values: pd.Series, layout: str) -> dict[str, np.ndarray] | None:
+    """
+    Reads the digit fields of fixed-width strings directly from their code points.
+    Letters in layout are digit positions (repeated letters form one field), anything else must match literally.
 
-    df["days_from_latest"] = (df["date"].max() - df["date"]).dt.days
-    
+    Returns:
+        {field letter: int array} or None if any value does not follow the layout
+    """
+    arr = values.to_numpy(dtype=str)
+    if len(arr) == 0 or arr.dtype.itemsize // 4 != len(layout):
+        return None
+
+    codes = arr.view(np.uint32).reshape(len(arr), len(layout))
+    fields = {}
+    for i, char in enumerate(layout):
+        if char.isalpha():
+            digit = codes[:, i].astype(np.int64) - ord("0")
+            if ((digit < 0) | (digit > 9)).any():
+                return None
+            fields[char] = fields.get(char, 0) * 10 + digit
+        elif (codes[:, i] != ord(char)).any():
+            return None
+    return fields
+
+def parse_solve_dates(dates: pd.Series) -> pd.Series:
+    """Converts "dd/mm/yyyy hh:mm" strings to datetime64 without per-row parsing"""
+    for layout in DATE_LAYOUTS:
+        f = _parse_fixed_width(dates, layout)
+        if f is None or ((f["M"] < 1) | (f["M"] > 12) | (f["D"] < 1)).any():
+            continue
+
+        months = ((f["Y"] - 1970) * 12 + f["M"] - 1).astype("datetime64[M]")
+        days = months.astype("datetime64[D]") + (f["D"] - 1)
+        if (days.astype("datetime64[M]") != months).any():
+            continue # day out of range for its month
+
+        seconds = f["h"] * 3600 + f["m"] * 60 + f.get("s", 0)
+        return pd.Series((days.astype("datetime64[s]") + seconds).astype("datetime64[ns]"), index=dates.index, name=dates.name)
+
+    return pd.to_datetime(dates, dayfirst=True)
+
+def parse_solve_times(times: pd.Series) -> pd.Series:
+    """Converts "mm:ss.xx" strings to seconds (float) without per-row parsing"""
+    times = times.astype(str).str.strip()
+    for layout in TIME_LAYOUTS:
+        f = _parse_fixed_width(times, layout)
+        if f is None:
+            continue
+
+        seconds = f.get("h", 0) * 3600 + f.get("m", 0) * 60 + f["s"] + f["f"] / 10 ** layout.count("f")
+        return pd.Series(seconds, index=times.index, name=times.name, dtype=np.float64)
+
+    # Mixed layouts: split from the right so "ss.xx", "mm:ss.xx" and "hh:mm:ss.xx" all work
+    rest, _, sec = times.str.rpartition(":").T.to_numpy()
+    hours, _, minutes = pd.Series(rest).str.rpartition(":").T.to_numpy()
+    seconds = pd.to_numeric(pd.Series(sec), errors="coerce").to_numpy()
+    for part, factor in ((minutes, 60), (hours, 3600)):
+        seconds = seconds + pd.to_numeric(pd.Series(part).replace("", "0"), errors="coerce").to_numpy() * factor
+    return pd.Series(seconds, index=times.index, name=times.name)
+
+def read_solves_csv(path: str, offset: int = 0) -> pd.DataFrame:
+    '''
+    Reads a "date;time" solves file with lower-case column names.
+    With offset > 0 only the rows starting at that byte position are read (the header is still taken from the first line).
+    '''
+    source = path
+    if offset > 0:
+        with open(path, "rb") as f:
+            header = f.readline()
+            f.seek(offset)
+            source = io.BytesIO(header + f.read())
+
+    df = pd.read_csv(source, sep=";", dtype=str, encoding="utf-8-sig")
+    df.columns = df.columns.str.strip().str.lower()
+    return df
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+BASE_SCHEMA_VERSION = 2 # bump when the columns/dtypes of the base frame change (invalidates binary caches)
+
+def _parse_solves(df: pd.DataFrame) -> pd.DataFrame:
+    '''
+    Builds the compact base columns from raw "date;time" rows, sorted by date:
+    float32 times, int16 year, int8 hour and an ordered categorical weekday.
+    '''
+    solves = pd.DataFrame({
+        "date": parse_solve_dates(df["date"]),
+        "time_sec": parse_solve_times(df["time"]).astype(np.float32),
+    })
+    solves = solves.sort_values("date", kind="stable")
+
+    dates = solves["date"].dt
+    solves["year"] = dates.year.astype(np.int16)
+    solves["hour"] = dates.hour.astype(np.int8)
+    solves["weekday"] = pd.Categorical.from_codes(dates.weekday.to_numpy(), categories=WEEKDAYS, ordered=True)
+    return solves
+
+def _new_sessions(dates: np.ndarray, SESSION_MAX_GAP_SEC, previous_date=None) -> np.ndarray:
+    '''
+    Flags the solves that start a new session (gap to the previous solve above SESSION_MAX_GAP_SEC).
+    '''
+    if len(dates) == 0:
+        return np.zeros(0, dtype=bool)
+    prepend = dates[0] if previous_date is None else previous_date
+    return np.diff(dates, prepend=prepend) / np.timedelta64(1, "s") > SESSION_MAX_GAP_SEC
+
+def prepare_base_dataframe(df, SESSION_MAX_GAP_SEC):
+    '''
+    Creates the base frame: one row per solve with date, time_sec, year, hour, weekday and session_id.
+    Derived columns (gaps, days_from_latest, weeks) are computed on demand instead of stored.
+    '''
+    df = _parse_solves(df)
+    df["session_id"] = np.cumsum(_new_sessions(df["date"].to_numpy(), SESSION_MAX_GAP_SEC), dtype=np.int32)
     return df
 
+def read_only_frame(df: pd.DataFrame) -> pd.DataFrame:
+    '''
+    Rebuilds a frame over read-only column arrays (categorical codes included), so writing values of a
+    frame shared by every session (df.loc[...] = ..., writes through to_numpy()) raises instead of corrupting it.
+    Adding or replacing columns still changes the shared frame object: each session works on its own
+    shallow copy (df.copy(deep=False)), whose writes copy the touched columns instead (copy-on-write).
+    '''
+    columns = {}
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            codes = df[col].cat.codes.to_numpy().copy()
+            codes.setflags(write=False)
+            columns[col] = pd.Categorical.from_codes(codes, dtype=df[col].dtype)
+        else:
+            values = df[col].to_numpy().copy()
+            values.setflags(write=False)
+            columns[col] = values
+    return pd.DataFrame(columns, index=df.index, copy=False)
+
+def days_from_latest(dates: pd.Series, latest=None) -> pd.Series:
+    '''
+    Whole days between each solve and the latest solve (or latest, e.g. the end of the full history).
+    '''
+    latest = dates.max() if latest is None else latest
+    return (latest - dates).dt.days.astype(np.int32)
+
+def prepare_appended_solves(df: pd.DataFrame, new_rows: pd.DataFrame, SESSION_MAX_GAP_SEC) -> pd.DataFrame | None:
+    """
+    Prepares raw "date;time" rows appended after the solves of a frame built by prepare_base_dataframe,
+    without re-parsing, re-sorting or re-splitting the existing history.
+    - The gap to the last known solve decides whether the first new solve continues the last session
+    - Session ids and index labels continue from the last known solve
+
+    Returns:
+        The new rows with the columns of df, or None if they reach back before the last known solve (full rebuild needed)
+    """
+
+    if len(new_rows) == 0:
+        return df.iloc[:0]
+
+    new = _parse_solves(new_rows)
+    last_date = df["date"].iloc[-1]
+    if new["date"].iloc[0] < last_date:
+        return None
+
+    new.index = pd.RangeIndex(df.index.max() + 1, df.index.max() + 1 + len(new))
+    new_session = _new_sessions(new["date"].to_numpy(), SESSION_MAX_GAP_SEC, last_date.to_datetime64())
+    new["session_id"] = (df["session_id"].iloc[-1] + np.cumsum(new_session)).astype(np.int32)
+    return new[df.columns]
+
+class _AppendBuffer:
+    """
+    Array grown at the end in amortized O(appended values): values live in a buffer with spare capacity (doubled
+    when full) and readers get read-only views of its filled part. Appending never changes a view handed out earlier.
+    """
+
+    def __init__(self, values: np.ndarray):
+        values = np.asarray(values)
+        self._data = np.empty((2 * len(values) + 16,) + values.shape[1:], dtype=values.dtype)
+        self._data[:len(values)] = values
+        self._size = len(values)
+        self._lock = threading.Lock()
+
+    def view(self) -> np.ndarray:
+        with self._lock:
+            view = self._data[:self._size]
+        view.setflags(write=False)
+        return view
+
+    def append(self, view: np.ndarray, values) -> np.ndarray | None:
+        '''
+        Returns:
+            Read-only view of view followed by values, or None if view is not the filled part of this buffer
+            (it was appended to past view, or view comes from elsewhere)
+        '''
+        values = np.asarray(values, dtype=self._data.dtype)
+        with self._lock:
+            if view.base is not self._data or len(view) != self._size:
+                return None
+            size = self._size + len(values)
+            if size > len(self._data):
+                data = np.empty((2 * size,) + self._data.shape[1:], dtype=self._data.dtype)
+                data[:self._size] = self._data[:self._size]
+                self._data = data
+            self._data[self._size:size] = values
+            self._size = size
+            view = self._data[:size]
+        view.setflags(write=False)
+        return view
+
+def _appended(buffers: dict, name, view: np.ndarray, values) -> np.ndarray:
+    '''
+    Returns view followed by values through the append buffer buffers[name], so repeated appends to arrays of the
+    history (see the extended() methods) cost O(appended values). The first append, or an append to an older view,
+    copies view into a new buffer.
+    '''
+    buffer = buffers.get(name)
+    appended = None if buffer is None else buffer.append(view, values)
+    if appended is None:
+        buffer = _AppendBuffer(np.concatenate((view, np.asarray(values, dtype=view.dtype))))
+        appended = buffer.view()
+    buffers[name] = buffer
+    return appended
+
+class SolveLog:
+    """
+    Base frame of a solve history that only grows at the end (like "data.csv"), extended without copying the history.
+    Columns (categorical codes included) live in append buffers, so append() costs O(appended solves), and frame()
+    is a read-only frame over views of them (like read_only_frame): frames taken earlier keep their solves.
+    Not thread-safe: one owner appends, any thread reads the frames.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self._dtypes = df.dtypes.to_dict()
+        self._buffers = {}
+        self._views = {}
+        for name, values in self._arrays(df).items():
+            self._buffers[name] = _AppendBuffer(values)
+            self._views[name] = self._buffers[name].view()
+
+    @staticmethod
+    def _arrays(df: pd.DataFrame) -> dict[str, np.ndarray]:
+        arrays = {"__index__": df.index.to_numpy(np.int64)}
+        for col in df.columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                arrays[col] = df[col].cat.codes.to_numpy()
+            else:
+                arrays[col] = df[col].to_numpy()
+        return arrays
+
+    def __len__(self):
+        return len(self._views["__index__"])
+
+    def append(self, new: pd.DataFrame) -> None:
+        '''
+        Appends prepared rows with the columns of the log (see prepare_appended_solves).
+        '''
+        for name, values in self._arrays(new).items():
+            self._views[name] = _appended(self._buffers, name, self._views[name], values)
+
+    def frame(self) -> pd.DataFrame:
+        columns = {}
+        for col, dtype in self._dtypes.items():
+            if isinstance(dtype, pd.CategoricalDtype):
+                columns[col] = pd.Categorical.from_codes(self._views[col], dtype=dtype)
+            else:
+                columns[col] = self._views[col]
+        return pd.DataFrame(columns, index=pd.Index(self._views["__index__"], copy=False), copy=False)
+
+class SessionIndex:
+    """
+    Sessions of a date-sorted solve array in CSR form: session k covers the solves offsets[k]:offsets[k + 1].
+    - ids: session id of each session, session_ids: session id of each solve
+    - positions: index of each solve inside its session (0 for the first solve)
+    Built once per session split and shared by Ao-N, session stats, clustering and fatigue,
+    so per-session work is segmented numpy reductions instead of hash grouping.
+    """
+
+    def __init__(self, offsets: np.ndarray, ids: np.ndarray | None = None):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.sizes = np.diff(self.offsets)
+        self.ids = np.arange(len(self.sizes), dtype=np.int32) if ids is None else np.asarray(ids, dtype=np.int32)
+        self.session_ids = np.repeat(self.ids, self.sizes)
+        self.positions = np.arange(self.offsets[-1], dtype=np.int32) - np.repeat(self.offsets[:-1], self.sizes).astype(np.int32)
+        self._buffers = {}
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def extended(self, n: int, starts: np.ndarray) -> "SessionIndex":
+        """
+        Index of the solves of this one followed by new solves up to n, where starts are the positions of the new
+        solves that start a session (the others continue the last session). Only the new solves are indexed;
+        new sessions take the ids following the last one.
+        """
+        if len(self) == 0:
+            return SessionIndex(np.concatenate(([0], starts, [n])))
+        starts = np.asarray(starts, dtype=np.int64)
+        n_old = int(self.offsets[-1])
+        last = int(self.offsets[-2]) # start of the last session, the first one the new solves can extend
+        new_ids = self.ids[-1] + 1 + np.arange(len(starts), dtype=np.int32)
+        tail = SessionIndex(np.concatenate(([last], starts, [n])) - last, np.concatenate((self.ids[-1:], new_ids)))
+
+        index = object.__new__(SessionIndex)
+        index.offsets = np.concatenate((self.offsets[:-1], starts, [n]))
+        index.sizes = np.diff(index.offsets)
+        index.ids = np.concatenate((self.ids, new_ids))
+        index._buffers = dict(self._buffers)
+        index.session_ids = _appended(index._buffers, "session_ids", self.session_ids, tail.session_ids[n_old - last:])
+        index.positions = _appended(index._buffers, "positions", self.positions, tail.positions[n_old - last:])
+        return index
+
+    @classmethod
+    def from_session_ids(cls, session_ids: np.ndarray) -> "SessionIndex":
+        """Index of a solve array whose sessions are runs of equal session ids"""
+        session_ids = np.asarray(session_ids)
+        starts = np.flatnonzero(np.diff(session_ids)) + 1
+        offsets = np.concatenate(([0], starts, [len(session_ids)]))
+        return cls(offsets, session_ids[offsets[:-1]] if len(session_ids) else np.zeros(0))
+
+    def restrict(self, selection: slice) -> "SessionIndex":
+        """
+        Index of a positional slice of the solves (e.g. a date_range_slice), keeping the session ids.
+        Sessions cut by the slice keep only their selected solves.
+        """
+        start, stop, _ = selection.indices(self.offsets[-1])
+        if stop <= start:
+            return SessionIndex(np.zeros(1), np.zeros(0))
+        first = np.searchsorted(self.offsets, start, side="right") - 1
+        last = np.searchsorted(self.offsets, stop, side="left")
+        offsets = np.clip(self.offsets[first:last + 1], start, stop) - start
+        return SessionIndex(offsets, self.ids[first:last])
+
+    def aggregate(self, values: np.ndarray, how: str = "mean") -> np.ndarray:
+        """
+        Reduces values per session, skipping NaNs like pandas groupby ("count", "sum", "mean", "min" or "max").
+
+        Returns:
+            Array with one value per session (NaN where a session has no valid value)
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if len(self) == 0:
+            return np.empty(0)
+        starts = self.offsets[:-1]
+        valid = ~np.isnan(values)
+
+        count = np.add.reduceat(valid, starts)
+        if how == "count":
+            return count
+        if how in ("min", "max"):
+            func = np.fmin if how == "min" else np.fmax
+            return func.reduceat(values, starts)
+
+        total = np.add.reduceat(np.where(valid, values, 0.0), starts)
+        if how == "sum":
+            return total
+        if how == "mean":
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return np.where(count > 0, total / count, np.nan)
+        raise ValueError(f"Unknown aggregation '{how}'.")
+
+class GapIndex:
+    """
+    Inter-solve gaps of a date-sorted solve array, computed once so the session gap threshold can change freely.
+    - Session counts for any threshold come from a binary search on the sorted gaps
+    - Session splits are built in one vectorized pass and cached per threshold
+    """
+
+    def __init__(self, dates: np.ndarray):
+        self.n = len(dates)
+        self.gaps = np.diff(np.asarray(dates)) / np.timedelta64(1, "s")
+        self.sorted_gaps = np.sort(self.gaps)
+        self._cache = {}
+        self._stale = {} # splits of a shorter history (see extended), extended on their next use
+        self._buffers = {}
+
+    def n_sessions(self, thresholds) -> np.ndarray:
+        """Number of sessions for each threshold (a gap greater than the threshold starts a new session)"""
+        if len(self.gaps) == 0:
+            return np.ones_like(np.asarray(thresholds), dtype=np.int64) # one solve, one session
+        return 1 + len(self.gaps) - np.searchsorted(self.sorted_gaps, thresholds, side="right")
+
+    def sessions(self, threshold: float) -> SessionIndex:
+        """Sessions for a gap threshold in seconds, cached per threshold"""
+        if threshold not in self._cache:
+            stale = self._stale.pop(threshold, None)
+            if stale is None:
+                starts = np.flatnonzero(self.gaps > threshold) + 1
+                self._cache[threshold] = SessionIndex(np.concatenate(([0], starts, [self.n])))
+            else:
+                n_old = int(stale.offsets[-1])
+                starts = np.flatnonzero(self.gaps[n_old - 1:] > threshold) + n_old
+                self._cache[threshold] = stale.extended(self.n, starts)
+        return self._cache[threshold]
+
+    def extended(self, dates: np.ndarray) -> "GapIndex":
+        """
+        Index of dates, the solves of this index followed by new ones: only the new gaps are computed and merged
+        into the sorted gaps, and the cached session splits are extended over the new solves on their next use.
+        """
+        dates = np.asarray(dates)
+        if self.n == 0:
+            return GapIndex(dates)
+        new_gaps = np.diff(dates[self.n - 1:]) / np.timedelta64(1, "s")
+        index = object.__new__(GapIndex)
+        index.n = len(dates)
+        index._buffers = dict(self._buffers)
+        index.gaps = _appended(index._buffers, "gaps", self.gaps, new_gaps)
+        new_gaps = np.sort(new_gaps)
+        index.sorted_gaps = np.insert(self.sorted_gaps, np.searchsorted(self.sorted_gaps, new_gaps), new_gaps)
+        index._cache = {}
+        index._stale = {**self._stale, **self._cache}
+        return index
+
+def date_range_slice(dates: np.ndarray, start_date=None, end_date=None) -> slice:
+    """
+    Finds the solves between start_date and end_date (inclusive days) by binary search on the sorted datetime64 array.
+
+    Returns:
+        Positional slice, usable as df.iloc[slice] or array[slice] without copying
+    """
+    dates = np.asarray(dates)
+    start = 0
+    stop = len(dates)
+    if start_date is not None:
+        start = int(np.searchsorted(dates, np.datetime64(start_date, "ns"), side="left"))
+    if end_date is not None:
+        end = np.datetime64(end_date, "D") + np.timedelta64(1, "D")
+        stop = int(np.searchsorted(dates, end.astype("datetime64[ns]"), side="left"))
+    return slice(start, max(start, stop))
+
+def select_date_range(df: pd.DataFrame, start_date=None, end_date=None) -> pd.DataFrame:
+    '''
+    Returns the rows of a date-sorted frame between start_date and end_date (inclusive) as a positional slice.
+    '''
+    return df.iloc[date_range_slice(df["date"].to_numpy(), start_date, end_date)]
+
+def _sliding_extreme(values: np.ndarray, n: int, func, fill: float) -> np.ndarray:
+    """
+    Sliding min/max over windows of n values in O(len(values)) (van Herk/Gil-Werman).
+
+    Returns:
+        Array of length len(values) - n + 1, one value per window start
+    """
+    n_windows = len(values) - n + 1
+    n_blocks = -(-len(values) // n)
+    padded = np.full(n_blocks * n, fill)
+    padded[:len(values)] = values
+
+    blocks = padded.reshape(n_blocks, n)
+    prefix = func.accumulate(blocks, axis=1).ravel()
+    suffix = func.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+
+    starts = np.arange(n_windows)
+    return func(suffix[starts], prefix[starts + n - 1])
+
+def rolling_wca_average(times: np.ndarray, session_ids: np.ndarray, n: int) -> np.ndarray:
+    """
+    Computes the rolling WCA-style Average of n (Ao5, Ao12, Ao50, Ao100, ...):
+    - n consecutive solves
+    - Must belong to the same session
+    - The ceil(5%) best and worst times are removed (1 each for Ao5 and Ao12)
+    - Average of the remaining times
+    - DNFs (inf) count as the worst times, more DNFs than trimmed times give a DNF average (inf)
+
+    Returns:
+        Array aligned with times holding the average of the window ending at each solve,
+        NaN where no complete window ends
+    """
+    times = np.asarray(times, dtype=np.float64)
+    session_ids = np.asarray(session_ids)
+    result = np.full(len(times), np.nan)
+    if n < 1 or len(times) < n:
+        return result
+
+    trim = int(np.ceil(n * 0.05)) if n >= 3 else 0
+    kept = n - 2 * trim
+
+    starts = np.flatnonzero(session_ids[n - 1:] == session_ids[:len(times) - n + 1])
+    if len(starts) == 0:
+        return result
+
+    dnf = ~np.isfinite(times)
+    n_dnf = np.concatenate(([0], np.cumsum(dnf)))
+    n_dnf = n_dnf[starts + n] - n_dnf[starts]
+
+    if trim <= 1:
+        finite = np.where(dnf, 0.0, times)
+        window_sum = np.zeros(len(starts))
+        for k in range(n): # n <= 20 passes, summed in the same order for every window (equal windows, equal averages)
+            window_sum += finite[starts + k]
+        if trim == 1:
+            window_sum -= _sliding_extreme(times, n, np.minimum, np.inf)[starts]
+            window_max = _sliding_extreme(finite, n, np.maximum, -np.inf)[starts]
+            window_sum -= np.where(n_dnf == 0, window_max, 0.0)
+        averages = np.where(n_dnf > trim, np.inf, window_sum / kept)
+    else:
+        windows = sliding_window_view(times, n)
+        averages = np.empty(len(starts))
+        step = max(1, 2_000_000 // n)
+        for first in range(0, len(starts), step):
+            block = np.partition(windows[starts[first:first + step]], (trim, n - trim - 1), axis=1)
+            averages[first:first + step] = block[:, trim:n - trim].sum(axis=1) / kept
+
+    result[starts + n - 1] = averages
+    return result
+
+def compute_rolling_ao(df: pd.DataFrame, n: int) -> pd.Series:
+    """
+    Computes the rolling WCA-style Average of n for every solve of a date-sorted frame.
+
+    Returns:
+        Series aligned with df.index (NaN where no complete window ends, inf for DNF averages)
+    """
+
+    if "session_id" not in df.columns:
+        raise ValueError("DataFrame must contain 'session_id' column.")
+    if not df["date"].is_monotonic_increasing:
+        df = df.sort_values("date", kind="stable")
+    values = rolling_wca_average(df["time_sec"].to_numpy(), df["session_id"].to_numpy(), n)
+    return pd.Series(values, index=df.index, name=f"ao{n}")
+
+def compute_best_average(df: pd.DataFrame, n: int) -> float | None:
+    """
+    Computes the best WCA-style Average of n from the rolling series.
+
+    Returns:
+        Best Ao-n value (float) or None if not enough data
+    """
+
+    ao = compute_rolling_ao(df, n).to_numpy()
+    ao = ao[np.isfinite(ao)]
+    if len(ao) == 0:
+        return None
+    return float(ao.min())
 
 def compute_best_ao5_wca(df: pd.DataFrame) -> float | None:
     """
@@ -45,34 +567,457 @@ def compute_best_ao5_wca(df: pd.DataFrame) -> float | None:
         Best Ao5 value (float) or None if not enough data
     """
 
-    if "session_id" not in df.columns:
-        raise ValueError("DataFrame must contain 'session_id' column.")
-    best_ao5 = np.inf
-    df = df.sort_values("date").reset_index(drop=True)
-    for session_id, session_df in df.groupby("session_id"):
-        times = session_df["time_sec"].values
-        if len(times) < 5:
-            continue
-        for i in range(len(times) - 4):
-            window = times[i:i+5]
-            sorted_window = np.sort(window)
-            trimmed = sorted_window[1:-1]
-            ao5 = trimmed.mean()
-            if ao5 < best_ao5:
-                best_ao5 = ao5
-    if best_ao5 == np.inf:
-        return None
-    return best_ao5
+    return compute_best_average(df, 5)
 
-def week_column(df):
+RECORD_AVERAGES = (5, 12, 100)
+
+def running_minimum(values: np.ndarray, segments: np.ndarray | None = None) -> np.ndarray:
+    """
+    Running minimum of the finite values, restarting whenever segments (e.g. the year of each solve) changes.
+    Each position is visited once: one accumulate per run of equal segments (meant for few runs, like years).
+
+    Returns:
+        Best value so far in the segment of each position (NaN before the segment's first finite value)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    best = np.where(np.isfinite(values), values, np.inf)
+    if segments is None or len(values) == 0:
+        bounds = [0, len(values)]
+    else:
+        segments = np.asarray(segments)
+        bounds = np.concatenate(([0], np.flatnonzero(segments[1:] != segments[:-1]) + 1, [len(values)]))
+
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        np.minimum.accumulate(best[start:stop], out=best[start:stop])
+    best[np.isinf(best)] = np.nan
+    return best
+
+def record_flags(values: np.ndarray, segments: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
     '''
-    Creates a week column 
+    Flags the values that beat every earlier value of their segment (the first finite value of a segment is a record).
+
+    Returns:
+        (record flags, previous record of each position, NaN at the first record of a segment)
     '''
-    df["week"] = df["date"].dt.to_period("W").apply(lambda r: r.start_time)
+    values = np.asarray(values, dtype=np.float64)
+    best = running_minimum(values, segments)
+    previous = np.concatenate(([np.nan], best[:-1]))
+    if segments is not None and len(values):
+        segments = np.asarray(segments)
+        previous[1:][segments[1:] != segments[:-1]] = np.nan
+    with np.errstate(invalid="ignore"):
+        records = np.isfinite(values) & (np.isnan(previous) | (values < previous))
+    return records, previous
 
-    weekly = df.groupby("week").agg(weekly_volume=("z_score", "count"), weekly_z_mean=("z_score", "mean"),)
-    sessions_per_week = ( df.groupby(["week", "session_id"]).size().reset_index(name="session_size").groupby("week").size())
-    weekly["n_sessions"] = sessions_per_week
+class RecordIndex:
+    """
+    Personal-best progression of singles and WCA-style averages (Ao5, Ao12, Ao100 by default), all-time and per year.
+    The rolling averages, running minima and record flags are computed once in vectorized passes, so record
+    timelines and the best value of any date range are binary searches and slices, without re-scanning the solves.
+    """
+
+    def __init__(self, dates: np.ndarray, times: np.ndarray, session_ids: np.ndarray, averages=RECORD_AVERAGES):
+        self.dates = np.asarray(dates)
+        years = self.dates.astype("datetime64[Y]")
+        self.series = {"single": np.asarray(times, dtype=np.float64)}
+        for n in averages:
+            self.series[f"ao{n}"] = rolling_wca_average(times, session_ids, n)
+
+        self._records = {}
+        for kind, values in self.series.items():
+            for scope, segments in (("all", None), ("year", years)):
+                flags, previous = record_flags(values, segments)
+                positions = np.flatnonzero(flags)
+                self._records[(kind, scope)] = (positions, previous[positions])
+        self._buffers = {}
+
+    def extended(self, dates: np.ndarray, times: np.ndarray, session_ids: np.ndarray) -> "RecordIndex":
+        """
+        Index of dates/times/session_ids, the solves of this index followed by new ones (session ids of the earlier
+        solves unchanged): only the averages ending at the new solves are computed, and the records continue
+        from the current bests.
+        """
+        dates = np.asarray(dates)
+        n_old = len(self.dates)
+        if n_old == 0:
+            return RecordIndex(dates, times, session_ids, [int(kind[2:]) for kind in self.kinds[1:]])
+        times = np.asarray(times, dtype=np.float64)
+        session_ids = np.asarray(session_ids)
+        last_year = self.dates[-1].astype("datetime64[Y]")
+        new_years = dates[n_old:].astype("datetime64[Y]")
+
+        index = object.__new__(RecordIndex)
+        index._buffers = dict(self._buffers)
+        index.dates = _appended(index._buffers, "dates", self.dates, dates[n_old:])
+        index.series = {}
+        index._records = {}
+        for kind, values in self.series.items():
+            if kind == "single":
+                new = times[n_old:]
+            else:
+                n = int(kind[2:])
+                first = max(n_old - n + 1, 0) # the windows ending at new solves start here at the earliest
+                new = rolling_wca_average(times[first:], session_ids[first:], n)[n_old - first:]
+            index.series[kind] = _appended(index._buffers, kind, values, new)
+
+            for scope, segments in (("all", None), ("year", new_years)):
+                positions, previous = self._records[(kind, scope)]
+                best = np.nan # best so far in the scope of the last solve, continued by the new values
+                if len(positions) and (scope == "all" or self.dates[positions[-1]].astype("datetime64[Y]") == last_year):
+                    best = values[positions[-1]]
+                if segments is not None:
+                    segments = np.concatenate(([last_year], segments))
+                flags, new_previous = record_flags(np.concatenate(([best], new)), segments)
+                new_positions = np.flatnonzero(flags[1:])
+                index._records[(kind, scope)] = (
+                    np.concatenate((positions, n_old + new_positions)),
+                    np.concatenate((previous, new_previous[1:][new_positions]))
+                )
+        return index
+
+    @property
+    def kinds(self) -> list[str]:
+        return list(self.series)
+
+    def progression(self, kind: str = "single", scope: str = "all", start_date=None, end_date=None) -> pd.DataFrame:
+        """
+        Records set between start_date and end_date: every solve ("single") or average ending there that beat
+        the previous best of its scope ("all" = all-time, "year" = best of its calendar year).
+
+        Returns:
+            Frame with date, year, value, previous record and improvement, one row per record
+        """
+        positions, previous = self._records[(kind, scope)]
+        selection = date_range_slice(self.dates[positions], start_date, end_date)
+        positions, previous = positions[selection], previous[selection]
+        dates = self.dates[positions]
+        values = self.series[kind][positions]
+        return pd.DataFrame({
+            "date": dates,
+            "year": dates.astype("datetime64[Y]").astype(np.int64) + 1970,
+            "value": values,
+            "previous": previous,
+            "improvement": previous - values,
+        })
+
+    def best(self, kind: str, selection: slice = slice(None)) -> float | None:
+        '''
+        Best single or average of kind among the windows lying entirely inside a positional selection (e.g. a date_range_slice).
+
+        Returns:
+            Best value or None if the selection holds no complete window
+        '''
+        start, stop, _ = selection.indices(len(self.dates))
+        n = 1 if kind == "single" else int(kind[2:])
+        values = self.series[kind][start + n - 1:stop]
+        values = values[np.isfinite(values)]
+        return float(values.min()) if len(values) else None
+
+class SlidingOrderStatistics:
+    """
+    k-th smallest value of any window values[lo:hi], from a wavelet matrix over the dense ranks of the values.
+    Built once in O(n log V) (V distinct values); a query descends one level per rank bit and is answered for
+    arrays of windows at once, so every sliding window costs O(log V) whatever the window size.
+    NaN values rank last, like DNFs (inf).
+    """
+
+    def __init__(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64)
+        self.sorted, ranks = np.unique(np.where(np.isnan(values), np.inf, values), return_inverse=True)
+        self.n = len(values)
+        self.bits = max(int(len(self.sorted) - 1).bit_length(), 1)
+
+        self._zeros = [] # per level: number of 0 bits before each position
+        self._n_zeros = []
+        current = ranks.astype(np.int64)
+        for level in range(self.bits):
+            is_zero = ((current >> (self.bits - 1 - level)) & 1) == 0
+            self._zeros.append(np.concatenate(([0], np.cumsum(is_zero))))
+            self._n_zeros.append(int(is_zero.sum()))
+            current = np.concatenate((current[is_zero], current[~is_zero])) # stable partition by bit
+
+    def kth(self, lo: np.ndarray, hi: np.ndarray, k: np.ndarray) -> np.ndarray:
+        '''
+        Returns:
+            The k-th smallest (0-based) value of values[lo:hi] for each (lo, hi, k), requires 0 <= k < hi - lo
+        '''
+        lo, hi, k = (np.array(a, dtype=np.int64) for a in np.broadcast_arrays(lo, hi, k))
+        rank = np.zeros(lo.shape, dtype=np.int64)
+        for level in range(self.bits):
+            zeros = self._zeros[level]
+            zeros_lo = zeros[lo]
+            zeros_hi = zeros[hi]
+            n_zeros = zeros_hi - zeros_lo
+            right = k >= n_zeros
+            k -= n_zeros * right
+            lo = np.where(right, self._n_zeros[level] + lo - zeros_lo, zeros_lo)
+            hi = np.where(right, self._n_zeros[level] + hi - zeros_hi, zeros_hi)
+            rank |= right.astype(np.int64) << (self.bits - 1 - level)
+        return self.sorted[rank]
+
+    def rolling_median(self, window: int) -> np.ndarray:
+        """Median of the last window values (NaN until window values are available)"""
+        out = np.full(self.n, np.nan)
+        if window > self.n:
+            return out
+        hi = np.arange(window, self.n + 1)
+        lo = hi - window
+        out[window - 1:] = (self.kth(lo, hi, (window - 1) // 2) + self.kth(lo, hi, window // 2)) / 2
+        return out
+
+    def rolling_mad(self, window: int, median: np.ndarray | None = None) -> np.ndarray:
+        """
+        Median absolute deviation from the rolling median over the last window values
+        (NaN until window values, and where the median itself is a DNF).
+        The deviations of a sorted window form two sorted lists (below and above the median), so the middle
+        deviation is found by a binary search over how many of them come from the lower list (O(log window) queries).
+        """
+        out = np.full(self.n, np.nan)
+        if window > self.n:
+            return out
+        median = self.rolling_median(window) if median is None else median
+        ends = np.flatnonzero(np.isfinite(median[window - 1:])) + window # windows with more DNFs than the median position have no MAD
+        hi = ends
+        lo = hi - window
+        m = median[ends - 1]
+        n_low = (window - 1) // 2 + 1 # sorted positions mid, mid - 1, ..., 0 (deviation m - y)
+        n_high = window - n_low # sorted positions mid + 1, ..., window - 1 (deviation y - m)
+
+        def low(t):
+            return m - self.kth(lo, hi, np.clip(n_low - 1 - t, 0, window - 1))
+
+        def high(t):
+            return self.kth(lo, hi, np.clip(n_low + t, 0, window - 1)) - m
+
+        def deviation(j):
+            # t = deviations taken from the low list among the j smallest: smallest t with not (low(t) < high(j - t - 1))
+            t_lo = np.full(len(m), max(0, j - n_high))
+            t_hi = np.full(len(m), min(j, n_low))
+            while (t_lo < t_hi).any():
+                t = (t_lo + t_hi) // 2
+                take_more = (t < n_low) & (j - t > 0) & (low(t) < high(j - t - 1))
+                t_lo = np.where(take_more, t + 1, t_lo)
+                t_hi = np.where(take_more, t_hi, t)
+            last_low = np.where(t_lo > 0, low(t_lo - 1), -np.inf)
+            last_high = np.where(j - t_lo > 0, high(j - t_lo - 1), -np.inf)
+            next_low = np.where(t_lo < n_low, low(t_lo), np.inf)
+            next_high = np.where(j - t_lo < n_high, high(j - t_lo), np.inf)
+            return np.maximum(last_low, last_high), np.minimum(next_low, next_high)
+
+        j_th, next_dev = deviation(window // 2 if window % 2 == 0 else (window + 1) // 2)
+        out[ends - 1] = (j_th + next_dev) / 2 if window % 2 == 0 else j_th
+        return out
+
+MAD_TO_STD = 1.4826 # MAD of a normal distribution times this is its standard deviation
+
+class RollingStats:
+    """
+    Rolling mean, standard deviation and z-score of a series for any window size.
+    Prefix sums of the (centered) values and their squares are built once, so every window
+    is a single O(n) pass. The last max_entries results are cached (LRU), so returning to a recent window is free.
+    Missing values (NaN/inf) are skipped like pandas rolling does.
+    """
+
+    def __init__(self, values: np.ndarray, max_entries: int = 8):
+        self.values = np.asarray(values, dtype=np.float64)
+        self.max_entries = max_entries
+        valid = np.isfinite(self.values)
+        self.center = self.values[valid].mean() if valid.any() else 0.0
+        centered = np.where(valid, self.values - self.center, 0.0)
+
+        self._count = np.concatenate(([0], np.cumsum(valid)))
+        self._sum = np.concatenate(([0.0], np.cumsum(centered)))
+        self._sum_sq = np.concatenate(([0.0], np.cumsum(centered ** 2)))
+        self._cache = OrderedDict() # 3 arrays of len(values) per entry, with their append buffers
+        self._stale = {} # results of a shorter series (see extended), extended on their next use
+        self._buffers = {}
+        self._lock = threading.Lock()
+        self._order_statistics = None # built on the first robust z-score
+
+    def extended(self, values: np.ndarray) -> "RollingStats":
+        """
+        Stats of values, the values of this series followed by new ones. The prefix sums are continued over the
+        new values only (same center), and the cached results are extended on their next use by computing the
+        windows ending at the new values only (rolling windows only look back, so earlier values never change).
+        """
+        values = np.asarray(values, dtype=np.float64)
+        new = values[len(self.values):]
+        valid = np.isfinite(new)
+        centered = np.where(valid, new - self.center, 0.0)
+
+        stats = object.__new__(RollingStats)
+        stats.max_entries = self.max_entries
+        stats.center = self.center
+        stats._buffers = dict(self._buffers)
+        stats.values = _appended(stats._buffers, "values", self.values, new)
+        stats._count = _appended(stats._buffers, "count", self._count, np.cumsum(np.concatenate((self._count[-1:], valid)))[1:])
+        stats._sum = _appended(stats._buffers, "sum", self._sum, np.cumsum(np.concatenate((self._sum[-1:], centered)))[1:])
+        stats._sum_sq = _appended(stats._buffers, "sum_sq", self._sum_sq, np.cumsum(np.concatenate((self._sum_sq[-1:], centered ** 2)))[1:])
+        stats._cache = OrderedDict()
+        with self._lock:
+            stats._stale = {**self._stale, **self._cache}
+        stats._lock = threading.Lock()
+        stats._order_statistics = None # the wavelet matrix ranks all values, it is rebuilt on the next full robust z-score
+        return stats
+
+    def _cached(self, key, compute) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        Cached compute(0), or a stale result of a shorter series extended with compute(len(stale result)).
+        '''
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key][0]
+            stale = self._stale.pop(key, None)
+        if stale is None:
+            entry = (compute(0), {})
+        else:
+            (previous, buffers), buffers = stale, dict(stale[1])
+            value = tuple(_appended(buffers, i, old, new) for i, (old, new) in enumerate(zip(previous, compute(len(previous[0])))))
+            entry = (value, buffers)
+        with self._lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return entry[0]
+
+    def _window(self, prefix: np.ndarray, window: int, start: int = 0) -> np.ndarray:
+        end = np.arange(start + 1, len(self.values) + 1)
+        return prefix[end] - prefix[np.maximum(end - window, 0)]
+
+    def mean(self, window: int, min_periods: int | None = None, start: int = 0) -> np.ndarray:
+        """Rolling mean over the last window values (NaN until min_periods, default window, are available), from position start on"""
+        min_periods = window if min_periods is None else min_periods
+        count = self._window(self._count, window, start)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = self._window(self._sum, window, start) / count + self.center
+        return np.where(count >= max(min_periods, 1), mean, np.nan)
+
+    def std(self, window: int, min_periods: int | None = None, start: int = 0) -> np.ndarray:
+        """Rolling sample standard deviation (ddof=1) over the last window values, from position start on"""
+        min_periods = window if min_periods is None else min_periods
+        count = self._window(self._count, window, start)
+        total = self._window(self._sum, window, start)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            var = (self._window(self._sum_sq, window, start) - total ** 2 / count) / (count - 1)
+        std = np.sqrt(np.maximum(var, 0.0))
+        return np.where(count >= max(min_periods, 2), std, np.nan)
+
+    def z_score(self, window: int, std_min_periods: int = 100) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Computes the moving z-score (x - ma) / std with ma over window values and std over window values
+        (available after min(std_min_periods, window) values).
+
+        Returns:
+            (ma, std, z_score) arrays, cached per window
+        """
+        def compute(start):
+            ma = self.mean(window, start=start)
+            std = self.std(window, min(std_min_periods, window), start=start)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                z = (self.values[start:] - ma) / std
+            return ma, std, z
+        return self._cached((window, std_min_periods), compute)
+
+    def robust_z_score(self, window: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Computes the outlier-resistant moving z-score (x - median) / (1.4826 * MAD) over window values,
+        so pops and DNFs barely move the baseline (NaN where the MAD is 0).
+
+        Returns:
+            (rolling median, scaled MAD, z_score) arrays, cached per window
+        """
+        def compute(start):
+            first = max(start - window + 1, 0) # the windows ending at start.. only need the values from first on
+            if first == 0:
+                with self._lock:
+                    if self._order_statistics is None:
+                        self._order_statistics = SlidingOrderStatistics(self.values)
+                order_statistics = self._order_statistics
+            else:
+                order_statistics = SlidingOrderStatistics(self.values[first:])
+            median = order_statistics.rolling_median(window)
+            scale = MAD_TO_STD * order_statistics.rolling_mad(window, median)
+            median, scale = median[start - first:], scale[start - first:]
+            scale[scale == 0] = np.nan
+            with np.errstate(invalid="ignore", divide="ignore"):
+                z = (self.values[start:] - median) / scale
+            return median, scale, z
+        return self._cached(("robust", window), compute)
+
+def minmax_downsample_indices(x: np.ndarray, y: np.ndarray, n_buckets: int) -> np.ndarray:
+    """
+    Downsamples a scatter by splitting the x span into n_buckets equal-width buckets and keeping the
+    lowest and highest y of each (extremes and outliers stay visible). NaN y values are dropped.
+    The bucket width follows the x span, so a shorter date range gets a finer resolution.
+
+    Returns:
+        Sorted positions of the kept points (all valid points if there are at most 2 * n_buckets)
+    """
+    x = np.asarray(x).astype(np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.flatnonzero(~np.isnan(y))
+    if len(valid) <= 2 * n_buckets:
+        return valid
+
+    xv = x[valid]
+    span = xv.max() - xv.min()
+    if span > 0:
+        bucket = np.minimum(((xv - xv.min()) / span * n_buckets).astype(np.int64), n_buckets - 1)
+    else:
+        bucket = np.arange(len(xv)) * n_buckets // len(xv)
+
+    order = np.lexsort((y[valid], bucket))
+    first = np.flatnonzero(np.diff(bucket[order], prepend=-1))
+    last = np.append(first[1:], len(order)) - 1
+    return valid[np.union1d(order[first], order[last])]
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling of a line to n_out points (NaN y values are dropped).
+
+    Returns:
+        Sorted positions of the kept points
+    """
+    x = np.asarray(x).astype(np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.flatnonzero(~np.isnan(y))
+    n = len(valid)
+    if n_out >= n or n_out < 3:
+        return valid
+
+    x = x[valid]
+    y = y[valid]
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64) # n_out - 2 buckets between the first and last point
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = (hi, edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        next_x = x[next_lo:next_hi].mean()
+        next_y = y[next_lo:next_hi].mean()
+
+        area = np.abs(
+            (x[previous] - next_x) * (y[lo:hi] - y[previous])
+            - (x[previous] - x[lo:hi]) * (next_y - y[previous])
+        )
+        previous = lo + int(np.argmax(area))
+        selected[i + 1] = previous
+    return valid[selected]
+
+def week_start(dates) -> np.ndarray:
+    """Monday 00:00 of the week of each date (the weeks of dt.to_period("W")), without per-row objects"""
+    days = np.asarray(dates).astype("datetime64[D]")
+    return (days - (days.astype(np.int64) + 3) % 7).astype("datetime64[ns]") # 1970-01-01 was a Thursday
+
+def weekly_tables(weekly: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    '''
+    Adds the previous/next week comparisons to a week-indexed frame with weekly_volume, weekly_z_mean and n_sessions.
+    '''
     weekly = weekly.fillna(0)
     weekly["prev_week_z_mean"] = weekly["weekly_z_mean"].shift(1)
     weekly["next_week_z_mean"] = weekly["weekly_z_mean"].shift(-1)
@@ -89,19 +1034,199 @@ def week_column(df):
         - weekly_valid["weekly_z_mean"]
     )
 
-    return df, weekly, weekly_valid
+    return weekly, weekly_valid
+
+def week_column(df):
+    '''
+    Creates a week column 
+    '''
+    df["week"] = week_start(df["date"].to_numpy())
+
+    weekly = df.groupby("week").agg(weekly_volume=("z_score", "count"), weekly_z_mean=("z_score", "mean"),)
+    sessions_per_week = ( df.groupby(["week", "session_id"]).size().reset_index(name="session_size").groupby("week").size())
+    weekly["n_sessions"] = sessions_per_week
+
+    return (df, *weekly_tables(weekly))
+
+def sorted_group_medians(keys: np.ndarray, values: np.ndarray) -> pd.Series:
+    '''
+    Median of values per run of equal keys in a key-sorted array (e.g. years of the date-sorted frame), without hash grouping.
+    '''
+    keys = np.asarray(keys)
+    index, starts = np.unique(keys, return_index=True)
+    bounds = np.append(starts, len(keys))
+    medians = [np.nanmedian(values[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+    return pd.Series(medians, index=index, dtype=np.float64)
+
+def rollup_statistics(sums: pd.DataFrame) -> pd.DataFrame:
+    """
+    Drops the empty groups of a frame of RollupCube.SUMS and adds mean_time, std_time and mean_z.
+    Sums of disjoint solve sets can be added before, so partial rollups merge exactly.
+    """
+    out = sums[sums["count"] > 0].copy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out["mean_time"] = out["time_sum"] / out["count"]
+        out["std_time"] = np.sqrt(np.maximum(out["time_sq"] - out["time_sum"] ** 2 / out["count"], 0) / (out["count"] - 1))
+        out["mean_z"] = out["z_sum"] / out["z_count"]
+    return out
+
+class RollupCube:
+    """
+    Count, sum and sum of squares of solve times and z-scores per (day, hour) cell, built once per z-score series.
+    Every calendar level (day, week, month, year, weekday, hour, weekday_hour) is rolled up from the small
+    cell arrays, and a date range is a contiguous run of days, so charts never rescan the solves.
+    """
+
+    SUMS = ["count", "time_sum", "time_sq", "z_count", "z_sum", "z_sq"]
+
+    def __init__(self, dates: np.ndarray, times: np.ndarray, z_scores: np.ndarray, session_ids: np.ndarray):
+        dates = np.asarray(dates)
+        self.n = len(dates)
+        self._buffers = {}
+        days = dates.astype("datetime64[D]")
+        self.first_day = days[0] if len(days) else np.datetime64("1970-01-01")
+        day_index = (days - self.first_day).astype(np.int64)
+        self.days = self.first_day + np.arange(day_index[-1] + 1 if len(days) else 0)
+        self.day_offsets = np.searchsorted(day_index, np.arange(len(self.days) + 1))
+
+        hours = ((dates - days) // np.timedelta64(1, "h")).astype(np.int64)
+        cells = day_index * 24 + hours
+        times = np.asarray(times, dtype=np.float64)
+        z_scores = np.asarray(z_scores, dtype=np.float64)
+        z_valid = ~np.isnan(z_scores)
+        z_scores = np.where(z_valid, z_scores, 0.0)
+
+        weights = {
+            "count": None, "time_sum": times, "time_sq": times ** 2,
+            "z_count": z_valid, "z_sum": z_scores, "z_sq": z_scores ** 2,
+        }
+        self.cells = {
+            name: np.bincount(cells, weights=w, minlength=len(self.days) * 24).reshape(len(self.days), 24)
+            for name, w in weights.items()
+        }
+
+        # A solve starts a (week, session) pair when the week or the session changes
+        weeks = week_start(dates)
+        session_ids = np.asarray(session_ids)
+        self.pair_start = np.ones(len(dates), dtype=bool)
+        self.pair_start[1:] = (weeks[1:] != weeks[:-1]) | (session_ids[1:] != session_ids[:-1])
+        self.day_pair_starts = np.bincount(day_index, weights=self.pair_start, minlength=len(self.days))
+
+    def extended(self, dates: np.ndarray, times: np.ndarray, z_scores: np.ndarray, session_ids: np.ndarray) -> "RollupCube":
+        """
+        Cube of the solves of this cube followed by new ones (all arrays cover the whole history): only the days
+        holding new solves are counted again. The z-scores and session ids of the earlier solves must be unchanged,
+        as with causal rolling z-scores and session ids continued by the new solves.
+        """
+        dates = np.asarray(dates)
+        if self.n == 0 or len(dates) == self.n:
+            return RollupCube(dates, times, z_scores, session_ids) if self.n == 0 else self
+        first_day = int((dates[self.n].astype("datetime64[D]") - self.first_day).astype(np.int64))
+        start = int(self.day_offsets[first_day]) # first solve of the first day with new solves
+        tail = RollupCube(dates[start:], times[start:], z_scores[start:], session_ids[start:])
+
+        cube = object.__new__(RollupCube)
+        cube.n = len(dates)
+        cube.first_day = self.first_day
+        cube.days = self.first_day + np.arange(first_day + len(tail.days))
+        cube.day_offsets = np.concatenate((self.day_offsets[:first_day], tail.day_offsets + start))
+        cube.cells = {name: np.concatenate((cell[:first_day], tail.cells[name])) for name, cell in self.cells.items()}
+
+        pair_start = tail.pair_start.copy()
+        if start > 0: # the tail cube starts a pair at its first solve, which may continue the pair of the solve before
+            weeks = week_start(dates[start - 1:start + 1])
+            pair_start[0] = weeks[0] != weeks[1] or session_ids[start - 1] != session_ids[start]
+        cube._buffers = dict(self._buffers)
+        cube.pair_start = _appended(cube._buffers, "pair_start", self.pair_start, pair_start[self.n - start:])
+        day_pair_starts = tail.day_pair_starts.copy()
+        day_pair_starts[0] -= int(tail.pair_start[0]) - int(pair_start[0])
+        cube.day_pair_starts = np.concatenate((self.day_pair_starts[:first_day], day_pair_starts))
+        return cube
+
+    def _day_range(self, start_date=None, end_date=None) -> slice:
+        start = 0 if start_date is None else int((np.datetime64(start_date, "D") - self.first_day).astype(np.int64))
+        stop = len(self.days) if end_date is None else int((np.datetime64(end_date, "D") - self.first_day).astype(np.int64)) + 1
+        start = min(max(start, 0), len(self.days))
+        return slice(start, max(start, min(stop, len(self.days))))
+
+    def rollup(self, level: str, start_date=None, end_date=None) -> pd.DataFrame:
+        """
+        Aggregates the cells of the selected days by level ("day", "week", "month", "year", "weekday", "hour"
+        or "weekday_hour"), adding count/mean/std of times and count/mean of z-scores.
+
+        Returns:
+            Frame indexed by the level with the raw sums and the derived statistics (empty groups dropped)
+        """
+        days = self._day_range(start_date, end_date)
+        dates = self.days[days]
+
+        if level == "hour":
+            sums = {name: cell[days].sum(axis=0) for name, cell in self.cells.items()}
+            index = pd.Index(np.arange(24), name="hour")
+        elif level == "weekday_hour":
+            weekday = (dates.astype(np.int64) + 3) % 7
+            sums = {name: np.stack([cell[days][weekday == k].sum(axis=0) for k in range(7)]).ravel() for name, cell in self.cells.items()}
+            index = pd.MultiIndex.from_product([WEEKDAYS, range(24)], names=["weekday", "hour"])
+        else:
+            if level == "day":
+                keys = dates.astype("datetime64[ns]")
+            elif level == "week":
+                keys = week_start(dates)
+            elif level == "month":
+                keys = dates.astype("datetime64[M]").astype("datetime64[ns]")
+            elif level == "year":
+                keys = dates.astype("datetime64[Y]").astype(np.int64) + 1970
+            elif level == "weekday":
+                keys = (dates.astype(np.int64) + 3) % 7
+            else:
+                raise ValueError(f"Unknown rollup level '{level}'.")
+
+            index, codes = np.unique(keys, return_inverse=True)
+            if level == "weekday":
+                index = np.array(WEEKDAYS)[index]
+            sums = {name: np.bincount(codes, weights=cell[days].sum(axis=1), minlength=len(index)) for name, cell in self.cells.items()}
+            index = pd.Index(index, name=level)
+
+        return rollup_statistics(pd.DataFrame(sums, index=index))
+
+    def weekly(self, start_date=None, end_date=None) -> pd.DataFrame:
+        """
+        Weekly volume (solves with a z-score), mean z-score and number of sessions of the selected days,
+        the input of weekly_tables.
+        """
+        days = self._day_range(start_date, end_date)
+        week = self.rollup("week", start_date, end_date)
+
+        pair_starts = self.day_pair_starts[days].copy()
+        first_row = self.day_offsets[days.start]
+        if len(pair_starts) and first_row < len(self.pair_start) and not self.pair_start[first_row]:
+            pair_starts[0] += 1 # the selection starts inside a (week, session) pair
+        day_weeks = week_start(self.days[days])
+        n_sessions = pd.Series(pair_starts, index=day_weeks).groupby(level=0).sum()
+
+        weekly = pd.DataFrame({
+            "weekly_volume": week["z_count"].astype(np.int64),
+            "weekly_z_mean": week["mean_z"],
+            "n_sessions": n_sessions.reindex(week.index).astype(np.int64),
+        })
+        weekly.index.name = "week"
+        return weekly
+
+def weekly_structure_edges(weekly_valid: pd.DataFrame, volume_q: int = 4, session_q: int = 3) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Returns:
+        (volume edges, session edges) of the quantile bins of add_weekly_structure_bins (duplicate edges dropped)
+    '''
+    _, volume_bins = pd.qcut(weekly_valid["weekly_volume"], q=volume_q, retbins=True, duplicates="drop")
+    _, session_bins = pd.qcut(weekly_valid["n_sessions"], q=session_q, retbins=True, duplicates="drop")
+    return volume_bins, session_bins
 
 def add_weekly_structure_bins(weekly_valid: pd.DataFrame, volume_q: int=4, session_q: int=3) -> pd.DataFrame:
     
     weekly_valid = weekly_valid.copy()
+    volume_bins, session_bins = weekly_structure_edges(weekly_valid, volume_q, session_q)
 
     # ----- Volume Quantiles -----
-    _, volume_bins = pd.qcut(
-        weekly_valid["weekly_volume"],
-        q=volume_q,
-        retbins=True,
-        duplicates="drop"
-    )
 
     volume_labels = []
     for i in range(len(volume_bins) - 1):
@@ -117,13 +1242,6 @@ def add_weekly_structure_bins(weekly_valid: pd.DataFrame, volume_q: int=4, sessi
     )
 
     # ----- Session Fragmentation Quantiles -----
-    _, session_bins = pd.qcut(
-        weekly_valid["n_sessions"],
-        q=session_q,
-        retbins=True,
-        duplicates="drop"
-    )
-
     frag_names = ["Low Frag", "Mid Frag", "High Frag"]
     session_labels = []
 
@@ -153,6 +1271,323 @@ def add_weekly_structure_bins(weekly_valid: pd.DataFrame, volume_q: int=4, sessi
 
     return weekly_valid
 
+class TrainingPlanSimulator:
+    """
+    What-if projection of a weekly training plan (solves and sessions per week) from the weekly structure bins.
+    z-scores are measured against a moving baseline, so week-to-week z changes do not accumulate; instead the plan
+    has a steady-state level: the mean next_week_z_mean of the past weeks in its volume x fragmentation bin (or a
+    coarser pool when the bin has fewer than min_weeks weeks), relative to the mean of all measured weeks.
+    Every simulation bootstraps that level once and holds it from week 1 on, so the bands show how uncertain the
+    plan's effect is and an average plan stays flat. The level is converted to seconds with the spread of the
+    recent solves, and the recent solves shifted to the simulated mean give the sub-X chance.
+    """
+
+    def __init__(self, weekly_valid: pd.DataFrame, recent_times: np.ndarray, edges: tuple[np.ndarray, np.ndarray], min_weeks: int = 5):
+        '''
+        weekly_valid must hold the volume_bin and session_bin columns of add_weekly_structure_bins,
+        and edges the weekly_structure_edges they were cut with.
+        '''
+        times = np.asarray(recent_times, dtype=np.float64)
+        times = times[np.isfinite(times)]
+        self.center = times.mean() if len(times) else np.nan
+        self.scale = times.std(ddof=1) if len(times) > 1 else np.nan
+        self.residuals = np.sort(times - self.center)
+        self.min_weeks = min_weeks
+
+        # weeks without z-scores have a filled-in z mean of 0, so weeks from or to them are not measured
+        volume = weekly_valid["weekly_volume"]
+        measured = (volume > 0) & (volume.shift(-1) != 0)
+        self.levels = weekly_valid["next_week_z_mean"].where(measured).to_numpy(dtype=np.float64)
+        self.baseline = np.nanmean(self.levels) if measured.any() else np.nan # level of the average week
+        self.volume_edges, self.session_edges = edges
+        self.volume_codes = weekly_valid["volume_bin"].cat.codes.to_numpy()
+        self.session_codes = weekly_valid["session_bin"].cat.codes.to_numpy()
+
+    @staticmethod
+    def _codes(edges: np.ndarray, values) -> np.ndarray:
+        '''
+        Quantile bin of each value (right-closed bins like qcut, values outside the edges go to the first/last bin).
+        '''
+        return np.clip(np.searchsorted(edges[1:-1], values, side="left"), 0, max(len(edges) - 2, 0))
+
+    def pool(self, solves_per_week: float, sessions_per_week: float) -> tuple[np.ndarray, str]:
+        '''
+        Returns:
+            The next_week_z_mean values the plan's level is sampled from and a description of the pool
+        '''
+        volume = self._codes(self.volume_edges, [solves_per_week])[0]
+        session = self._codes(self.session_edges, [sessions_per_week])[0]
+        valid = ~np.isnan(self.levels)
+        for name, mask in (
+            ("volume and fragmentation bin", (self.volume_codes == volume) & (self.session_codes == session)),
+            ("volume bin", self.volume_codes == volume),
+        ):
+            if (mask & valid).sum() >= self.min_weeks:
+                return self.levels[mask & valid], name
+        return self.levels[valid], "all weeks"
+
+    def simulate(self, solves_per_week: float, sessions_per_week: float, weeks: int = 12, n_sims: int = 20_000, goal: float = 8.0, seed: int = 0) -> pd.DataFrame:
+        """
+        Projects n_sims runs of the plan over weeks weeks (week 0 = now).
+
+        Returns:
+            Frame per week with mean_time_p10/p50/p90 (s), p_sub_goal (chance of a single solve under goal)
+            and p_any_sub_goal (chance of at least one sub-goal solve among the week's solves), averaged over the runs
+        """
+        levels, _ = self.pool(solves_per_week, sessions_per_week)
+        result = pd.DataFrame({"week": np.arange(weeks + 1)})
+        if len(levels) == 0 or not np.isfinite(self.scale):
+            return result.assign(mean_time_p10=np.nan, mean_time_p50=np.nan, mean_time_p90=np.nan, p_sub_goal=np.nan, p_any_sub_goal=np.nan)
+
+        rng = np.random.default_rng(seed)
+        effect = np.empty(n_sims)
+        step = max(1, 2_000_000 // len(levels))
+        for first in range(0, n_sims, step):
+            draws = rng.integers(0, len(levels), size=(min(step, n_sims - first), len(levels)))
+            effect[first:first + step] = levels[draws].mean(axis=1) - self.baseline # bootstrap mean of the pool
+        z_change = effect[:, None] * (np.arange(weeks + 1) > 0) # now, then the plan's steady state
+        mean_time = self.center + self.scale * z_change
+        p_solve = np.searchsorted(self.residuals, goal - mean_time, side="left") / len(self.residuals) # strictly under goal
+        p_week = 1 - (1 - p_solve) ** max(solves_per_week, 0)
+
+        low, median, high = np.percentile(mean_time, [10, 50, 90], axis=0)
+        return result.assign(
+            mean_time_p10=low,
+            mean_time_p50=median,
+            mean_time_p90=high,
+            p_sub_goal=p_solve.mean(axis=0),
+            p_any_sub_goal=p_week.mean(axis=0),
+        )
+
+class ClusteringStage:
+    """
+    Memoized StandardScaler + K-Means stage.
+    - Results are cached by the content of the feature matrix and k, so unrelated reruns never refit
+    - sweep() fits its ks as one chain: the first k runs the n_init restarts, every next k starts once from the
+      previous centroids (splitting the widest cluster), so a sweep only depends on the features and ks
+    - fit_predict(warm_start=True) opts in to starting once from the last centroids fitted by this stage, which
+      is much cheaper when the data or k changed slightly, but the labels then depend on what was fitted before
+      (other sessions included); by default every fit runs the n_init restarts and depends only on features and k
+    - Large inputs use MiniBatchKMeans (mode "auto" switches above minibatch_threshold rows)
+    The caches are shared across sessions and guarded by a lock.
+    """
+
+    def __init__(self, random_state: int = 1, n_init: int = 10, mode: str = "auto", minibatch_threshold: int = 20_000, max_entries: int = 64):
+        self.random_state = random_state
+        self.n_init = n_init
+        self.mode = mode
+        self.minibatch_threshold = minibatch_threshold
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._centers = {} # last centroids (feature units) per number of features, for opt-in warm starts
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(features: np.ndarray, *extra) -> tuple:
+        features = np.ascontiguousarray(features, dtype=np.float64)
+        return (features.shape, hashlib.sha1(features.tobytes()).hexdigest(), *extra)
+
+    def _store(self, key, value) -> None:
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    @staticmethod
+    def _initial_centers(scaled: np.ndarray, k: int, previous: np.ndarray | None) -> np.ndarray | None:
+        '''
+        Maps previous (scaled) centroids to k centroids: keeps the first k, or splits the cluster with the largest
+        squared error along its main axis until there are k.
+        '''
+        if previous is None or len(scaled) < k:
+            return None
+        centers = previous[:k]
+        while len(centers) < k:
+            distance = ((scaled[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+            labels = distance.argmin(axis=1)
+            sse = np.bincount(labels, weights=distance.min(axis=1), minlength=len(centers))
+            worst = int(np.argmax(sse))
+            members = scaled[labels == worst] - centers[worst]
+            if len(members) < 2:
+                return None
+            _, singular, axes = np.linalg.svd(members, full_matrices=False)
+            offset = axes[0] * singular[0] / np.sqrt(len(members))
+            centers = np.vstack([np.delete(centers, worst, axis=0), centers[worst] - offset, centers[worst] + offset])
+        if len(np.unique(centers, axis=0)) < k:
+            return None
+        return centers
+
+    def _fit(self, features: np.ndarray, k: int, previous: np.ndarray | None = None) -> tuple[np.ndarray, float, np.ndarray, np.ndarray]:
+        '''
+        Fits k clusters, starting once from the previous centroids (feature units) if given, else with n_init restarts.
+
+        Returns:
+            (labels, inertia, scaled features, centroids in feature units)
+        '''
+        scaler = StandardScaler()
+        scaled = scaler.fit_transform(features)
+        init = self._initial_centers(scaled, k, None if previous is None else scaler.transform(previous))
+
+        minibatch = self.mode == "minibatch" or (self.mode == "auto" and len(features) > self.minibatch_threshold)
+        model_class = MiniBatchKMeans if minibatch else KMeans
+        params = {"batch_size": 4096} if minibatch else {}
+        if init is None:
+            model = model_class(n_clusters=k, random_state=self.random_state, n_init=self.n_init, **params)
+        else:
+            model = model_class(n_clusters=k, random_state=self.random_state, init=init, n_init=1, **params)
+
+        labels = model.fit_predict(scaled)
+        return labels, float(model.inertia_), scaled, scaler.inverse_transform(model.cluster_centers_)
+
+    def fit_predict(self, features, k: int, warm_start: bool = False) -> np.ndarray:
+        """
+        Scales the features and clusters them into k clusters.
+        With warm_start, starts once from the last centroids of this stage (see the class docstring for the trade-off).
+
+        Returns:
+            Cluster label per row (cached per feature matrix and k)
+        """
+        features = np.asarray(features, dtype=np.float64)
+        key = self._key(features, k)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            previous = self._centers.get(features.shape[1]) if warm_start else None
+        labels, _, _, centers = self._fit(features, k, previous)
+        with self._lock:
+            self._centers[features.shape[1]] = centers
+        self._store(key, labels)
+        return labels
+
+    def sweep(self, features, ks, silhouette_sample: int = 5000) -> pd.DataFrame:
+        """
+        Fits every k in ks in one chain, each fit warm-started from the previous one, for an elbow/silhouette view.
+
+        Returns:
+            Frame with k, inertia and silhouette (NaN for k=1), cached per feature matrix and ks
+        """
+        features = np.asarray(features, dtype=np.float64)
+        ks = sorted(set(ks))
+        key = self._key(features, "sweep", tuple(ks))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        rows = []
+        centers = None # only the chain of this call, so the sweep does not depend on earlier fits
+        for k in ks:
+            if k > len(features):
+                break
+            labels, inertia, scaled, centers = self._fit(features, k, centers)
+            silhouette = np.nan
+            if 1 < len(np.unique(labels)) < len(features):
+                silhouette = silhouette_score(scaled, labels, sample_size=min(silhouette_sample, len(features)), random_state=self.random_state)
+            rows.append({"k": k, "inertia": inertia, "silhouette": silhouette})
+        sweep = pd.DataFrame(rows, columns=["k", "inertia", "silhouette"])
+        self._store(key, sweep)
+        return sweep
+
+def decay_weights(t: np.ndarray, decay_factors) -> np.ndarray:
+    """
+    Least-squares weights of an exponential time decay for every decay factor (rows) and observation (columns).
+    Follows the np.polyfit convention used by weighted_linear_regression: residuals are scaled by
+    exp(-decay * t), so the squared-error weights are exp(-2 * decay * t).
+    """
+    return np.exp(-2 * np.outer(np.atleast_1d(decay_factors), np.asarray(t, dtype=np.float64)))
+
+def _wls_from_sums(sw, swx, swy, swxx, swxy) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Closed-form slope and intercept of a weighted straight-line fit from its weighted sums (any array shape).
+    '''
+    with np.errstate(invalid="ignore", divide="ignore"):
+        denominator = sw * swxx - swx ** 2
+        slope = np.where(denominator > 0, (sw * swxy - swx * swy) / denominator, np.nan)
+        intercept = (swy - slope * swx) / sw
+    return slope, intercept
+
+def batched_weighted_regression(x, y, t, decay_factors, groups=None) -> pd.DataFrame:
+    """
+    Fits y = slope * x + intercept with exponential time-decay weights for every decay factor and every group
+    (e.g. year or cluster) at once: all weighted sums are one matrix product of the (decay x solve) weights
+    with the (solve x group) indicator columns.
+
+    Returns:
+        Frame with decay_factor, group, slope, intercept and n (rows per group); slope is NaN for groups with fewer than 2 distinct x
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    decay_factors = np.atleast_1d(np.asarray(decay_factors, dtype=np.float64))
+
+    if groups is None:
+        labels, codes = np.array([None]), np.zeros(len(x), dtype=np.int64)
+    else:
+        labels, codes = np.unique(np.asarray(groups), return_inverse=True)
+    indicator = np.zeros((len(x), len(labels)))
+    indicator[np.arange(len(x)), codes] = 1.0
+
+    x_mean, y_mean = (x.mean(), y.mean()) if len(x) else (0.0, 0.0)
+    xc = x - x_mean # centered for numerical stability
+    yc = y - y_mean
+    weights = decay_weights(t, decay_factors)
+    sw, swx, swy, swxx, swxy = (weights @ (indicator * v[:, None]) for v in (np.ones_like(x), xc, yc, xc * xc, xc * yc))
+    slope, intercept = _wls_from_sums(sw, swx, swy, swxx, swxy)
+
+    return pd.DataFrame({
+        "decay_factor": np.repeat(decay_factors, len(labels)),
+        "group": np.tile(labels, len(decay_factors)),
+        "slope": slope.ravel(),
+        "intercept": (intercept + y_mean - slope * x_mean).ravel(),
+        "n": np.tile(indicator.sum(axis=0).astype(np.int64), len(decay_factors)),
+    })
+
+def bootstrap_weighted_regression(x, y, t, decay_factors, n_boot: int = 2000, ci: float = 0.95, seed: int = 0) -> pd.DataFrame:
+    """
+    Percentile bootstrap confidence intervals of the time-decay weighted regression.
+    Each resample (with replacement) is a vector of draw counts per row, so a batch of resamples for all
+    decay factors is a single (resample x row) @ (row x decay) matrix product.
+
+    Returns:
+        Frame per decay factor with slope, intercept, slope_se, slope_low/high and intercept_low/high
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    decay_factors = np.atleast_1d(np.asarray(decay_factors, dtype=np.float64))
+    fit = batched_weighted_regression(x, y, t, decay_factors)
+
+    n = len(x)
+    rng = np.random.default_rng(seed)
+    x_mean, y_mean = x.mean(), y.mean()
+    xc = x - x_mean
+    yc = y - y_mean
+    weights = decay_weights(t, decay_factors).T # rows x decay
+    columns = [weights * v[:, None] for v in (np.ones_like(x), xc, yc, xc * xc, xc * yc)]
+
+    slopes = np.empty((n_boot, len(decay_factors)))
+    intercepts = np.empty((n_boot, len(decay_factors)))
+    step = max(1, 4_000_000 // max(n, 1))
+    for start in range(0, n_boot, step):
+        batch = min(step, n_boot - start)
+        draws = rng.integers(0, n, size=(batch, n)) + np.arange(batch)[:, None] * n
+        counts = np.bincount(draws.ravel(), minlength=batch * n).reshape(batch, n).astype(np.float64)
+        slope, intercept = _wls_from_sums(*(counts @ column for column in columns))
+        slopes[start:start + len(counts)] = slope
+        intercepts[start:start + len(counts)] = intercept + y_mean - slope * x_mean
+
+    alpha = (1 - ci) / 2 * 100
+    with np.errstate(invalid="ignore"):
+        return pd.DataFrame({
+            "decay_factor": decay_factors,
+            "slope": fit["slope"].to_numpy(),
+            "intercept": fit["intercept"].to_numpy(),
+            "slope_se": np.nanstd(slopes, axis=0, ddof=1),
+            "slope_low": np.nanpercentile(slopes, alpha, axis=0),
+            "slope_high": np.nanpercentile(slopes, 100 - alpha, axis=0),
+            "intercept_low": np.nanpercentile(intercepts, alpha, axis=0),
+            "intercept_high": np.nanpercentile(intercepts, 100 - alpha, axis=0),
+        })
+
 def weighted_linear_regression(
     df: pd.DataFrame,
     x_col: str,
@@ -160,35 +1595,297 @@ def weighted_linear_regression(
     time_col: str,
     decay_factor: float,
     n_points: int = 100
-) -> tuple[np.ndarray, np.ndarray] | tuple[None, None]:
+) -> tuple[np.ndarray, np.ndarray, float] | tuple[None, None, None]:
     """
     Computes weighted linear regression using exponential time decay.
 
     Returns:
-        x_line, y_line for plotting
-        or (None, None) if not enough data
+        x_line, y_line for plotting and the slope
+        or (None, None, None) if not enough data
     """
 
     if len(df) <= 1:
-        return None, None
+        return None, None, None
 
     x = df[x_col].values
-    y = df[y_col].values
-    w = np.exp(-decay_factor * df[time_col].values)
-
-    coef = np.polyfit(x, y, 1, w=w)
+    fit = batched_weighted_regression(x, df[y_col].values, df[time_col].values, decay_factor).iloc[0]
 
     x_line = np.linspace(x.min(), x.max(), n_points)
-    y_line = coef[0] * x_line + coef[1]
+    y_line = fit["slope"] * x_line + fit["intercept"]
 
-    return x_line, y_line, coef[0]
+    return x_line, y_line, fit["slope"]
 
 
+def compute_session_stats(df: pd.DataFrame, sessions: SessionIndex | None = None) -> pd.DataFrame:
+    """
+    Computes per-session statistics from the session index (built from df["session_id"] if not given):
+    start, end, duration_min, session_size, mean_time, best_time, std_time and z_score (mean, if df has z-scores).
 
-    
+    Returns:
+        Frame indexed by session_id
+    """
+
+    if sessions is None:
+        sessions = SessionIndex.from_session_ids(df["session_id"].to_numpy())
+    times = df["time_sec"].to_numpy()
+    dates = df["date"].to_numpy()
+
+    stats = pd.DataFrame(index=pd.Index(sessions.ids, name="session_id"))
+    stats["start"] = dates[sessions.offsets[:-1]]
+    stats["end"] = dates[sessions.offsets[1:] - 1]
+    stats["duration_min"] = (stats["end"] - stats["start"]).dt.total_seconds() / 60
+    stats["session_size"] = sessions.aggregate(times, "count").astype(np.int64)
+    stats["mean_time"] = sessions.aggregate(times, "mean")
+    stats["best_time"] = sessions.aggregate(times, "min")
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sum_sq = sessions.aggregate(np.asarray(times, dtype=np.float64) ** 2, "sum")
+        count = stats["session_size"].to_numpy()
+        variance = (sum_sq - stats["mean_time"].to_numpy() ** 2 * count) / (count - 1)
+    stats["std_time"] = np.sqrt(np.maximum(variance, 0))
+    stats.loc[count < 2, "std_time"] = np.nan
+
+    if "z_score" in df.columns:
+        stats["z_score"] = sessions.aggregate(df["z_score"].to_numpy(), "mean")
+    return stats
 
-def compute_session_stats(df):
-    ...
+def session_structure_features(session_stats: pd.DataFrame) -> pd.DataFrame:
+    """
+    Training structure features of every session: session_size, z_score_mean (if session_stats has z-scores), the week it
+    started in and weekly_n_sessions (number of sessions started that week), the input of the training structure clusters.
+
+    Returns:
+        Frame with one row per session (session_id as a column)
+    """
+    columns = ["session_size", "z_score"] if "z_score" in session_stats.columns else ["session_size"]
+    features = session_stats[columns].rename(columns={"z_score": "z_score_mean"}).reset_index()
+    features["week"] = week_start(session_stats["start"].to_numpy())
+
+    weekly_session_count = features.groupby("week").size().rename("weekly_n_sessions")
+    return features.merge(weekly_session_count, on="week")
+
+FATIGUE_BINS = 20
+
+def compute_fatigue_bins(df: pd.DataFrame, sessions: SessionIndex, min_session_size: int = 40, n_bins: int = FATIGUE_BINS) -> pd.DataFrame:
+    """
+    Places every solve of the sessions with at least min_session_size z-scores on the session phase axis:
+    - solve_index: position of the solve in its session
+    - session_size: number of z-scores in the session
+    - relative_position: solve_index / (session_size - 1)
+    - fatigue_bin: n_bins equal phase bins ("0-5%", "5-10%", ...)
+
+    Returns:
+        The selected rows of df with these columns added
+    """
+    session_size = np.repeat(sessions.aggregate(df["z_score"].to_numpy(), "count"), sessions.sizes)
+    keep = session_size >= min_session_size
+
+    fatigue_df = df[keep].copy()
+    fatigue_df["solve_index"] = sessions.positions[keep]
+    fatigue_df["session_size"] = session_size[keep].astype(np.int64)
+    fatigue_df["relative_position"] = fatigue_df["solve_index"] / (fatigue_df["session_size"] - 1)
+
+    edges = np.linspace(0, 1, n_bins + 1)
+    labels = [f"{round(100 * lo):g}-{round(100 * hi):g}%" for lo, hi in zip(edges[:-1], edges[1:])]
+    relative = fatigue_df["relative_position"].to_numpy()
+    codes = np.maximum(np.searchsorted(edges, relative, side="left") - 1, 0) # right-closed bins, first includes 0
+    codes[~((relative >= 0) & (relative <= 1))] = -1
+    fatigue_df["fatigue_bin"] = pd.Categorical.from_codes(codes, categories=labels, ordered=True)
+    return fatigue_df
+
+RESAMPLE_JOBS = 8 # resamples are split into this many seeded jobs, so results do not depend on the number of workers
+
+def _permutation_group_means(values: np.ndarray, sizes: np.ndarray, n_permutations: int, rng: np.random.Generator, counts: np.ndarray | None = None) -> np.ndarray:
+    '''
+    n_permutations means of a random relabelling (subset without replacement of the pooled units) for every group size.
+    Each shuffle of all units is cut into disjoint blocks of the group's size, every block being one relabelling,
+    so a shuffle yields n // size samples per group at once and a block sum is a difference of prefix sums.
+    Units are single values, or with counts, sums of counts[i] values (the block mean is then sum / count).
+    '''
+    n, n_groups = len(values), len(sizes)
+    means = np.empty((n_permutations, n_groups))
+    filled = np.zeros(n_groups, dtype=np.int64)
+    blocks = n // sizes
+    while (filled < n_permutations).any():
+        shuffles = int(np.ceil(((n_permutations - filled) / blocks).max()))
+        batch = min(shuffles, max(1, 4_000_000 // n))
+        order = rng.permuted(np.broadcast_to(np.arange(n), (batch, n)), axis=1)
+        prefix = np.concatenate((np.zeros((batch, 1)), np.cumsum(values[order], axis=1)), axis=1)
+        if counts is not None:
+            count_prefix = np.concatenate((np.zeros((batch, 1)), np.cumsum(counts[order], axis=1)), axis=1)
+        for g in np.flatnonzero(filled < n_permutations):
+            ends = np.arange(1, blocks[g] + 1) * sizes[g]
+            block_counts = sizes[g] if counts is None else count_prefix[:, ends] - count_prefix[:, ends - sizes[g]]
+            block_means = ((prefix[:, ends] - prefix[:, ends - sizes[g]]) / block_counts).ravel()[:n_permutations - filled[g]]
+            means[filled[g]:filled[g] + len(block_means), g] = block_means
+            filled[g] += len(block_means)
+    return means
+
+def _bootstrap_group_means(values: np.ndarray, offsets: np.ndarray, n_boot: int, rng: np.random.Generator, counts: np.ndarray | None = None) -> np.ndarray:
+    '''
+    n_boot means of a resample with replacement inside every group (units sorted by group, offsets[g]:offsets[g + 1] = group g).
+    With counts, a unit is the sum of counts[i] values and a resample mean is sum / count.
+    '''
+    n, n_groups = len(values), len(offsets) - 1
+    sizes = np.diff(offsets)
+    start = np.repeat(offsets[:-1], sizes).astype(np.float64)
+    size = np.repeat(sizes, sizes).astype(np.float64)
+    means = np.empty((n_boot, n_groups))
+    step = max(1, 4_000_000 // max(n, 1))
+    for first in range(0, n_boot, step):
+        batch = min(step, n_boot - first)
+        draws = rng.random((batch, n))
+        draws *= size
+        draws += start # uniform row inside the group, floored by the cast
+        draws = draws.astype(np.intp)
+        totals = np.add.reduceat(values[draws], offsets[:-1], axis=1)
+        means[first:first + batch] = totals / (sizes if counts is None else np.add.reduceat(counts[draws], offsets[:-1], axis=1))
+    return means
+
+def _resample_job(args) -> tuple[np.ndarray, np.ndarray]:
+    values, counts, offsets, n_permutations, n_boot, seed = args
+    rng = np.random.default_rng(seed)
+    return (
+        _permutation_group_means(values, np.diff(offsets), n_permutations, rng, counts),
+        _bootstrap_group_means(values, offsets, n_boot, rng, counts),
+    )
+
+def benjamini_hochberg(p_values) -> np.ndarray:
+    '''
+    Returns:
+        False discovery rate adjusted p-values (q-values), NaN where p is NaN
+    '''
+    p_values = np.asarray(p_values, dtype=np.float64)
+    q_values = np.full(len(p_values), np.nan)
+    valid = np.flatnonzero(~np.isnan(p_values))
+    order = valid[np.argsort(p_values[valid])]
+    ranked = p_values[order] * len(order) / np.arange(1, len(order) + 1)
+    q_values[order] = np.minimum(np.minimum.accumulate(ranked[::-1])[::-1], 1.0)
+    return q_values
+
+def group_mean_significance(values, groups, n_permutations: int = 5000, n_boot: int = 1000, ci: float = 0.95, seed: int = 0, workers: int | None = None, blocks=None) -> pd.DataFrame:
+    """
+    Significance of the group means of values (e.g. z-scores per weekday x hour cell or per fatigue bin):
+    - p_value: two-sided permutation test of the group mean against the overall mean (labels shuffled across all units)
+    - q_value: p_value adjusted for testing every group (Benjamini-Hochberg)
+    - ci_low/ci_high: percentile bootstrap interval of the group mean (units resampled inside the group)
+    Without blocks every value is an exchangeable unit. With blocks (e.g. session ids), the values of one block in
+    one group form a single unit, so correlated values (the solves of a session) move together and do not count
+    as independent evidence. The resamples are split into RESAMPLE_JOBS seeded jobs, run on a process pool with
+    workers > 1; results are identical for a given seed either way.
+
+    Returns:
+        Frame indexed by group (sorted, NaN values dropped) with n (values), units, mean, ci_low, ci_high, p_value and q_value
+    """
+    values = np.asarray(values, dtype=np.float64)
+    groups = np.asarray(groups)
+    valid = ~np.isnan(values)
+    labels, codes = np.unique(groups[valid], return_inverse=True)
+    values = values[valid]
+    n_values = np.bincount(codes, minlength=len(labels))
+    means = np.bincount(codes, weights=values, minlength=len(labels)) / np.maximum(n_values, 1)
+
+    counts = None
+    if blocks is not None: # one unit per (group, block) pair: its sum and number of values
+        _, block_codes = np.unique(np.asarray(blocks)[valid], return_inverse=True)
+        units, unit_of_value = np.unique(codes.astype(np.int64) * (block_codes.max() + 1) + block_codes, return_inverse=True)
+        values = np.bincount(unit_of_value, weights=values)
+        counts = np.bincount(unit_of_value).astype(np.float64)
+        codes = units // (block_codes.max() + 1)
+    order = np.argsort(codes, kind="stable")
+    values, codes = values[order], codes[order]
+    counts = None if counts is None else counts[order]
+    sizes = np.bincount(codes, minlength=len(labels))
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+
+    result = pd.DataFrame({"n": n_values, "units": sizes, "mean": means}, index=pd.Index(labels))
+    if len(values) == 0 or n_permutations < 1 or n_boot < 1:
+        return result.assign(ci_low=np.nan, ci_high=np.nan, p_value=np.nan, q_value=np.nan)
+
+    n_jobs = min(RESAMPLE_JOBS, n_permutations, n_boot)
+    jobs = [
+        (values, counts, offsets, len(permutations), len(boots), seed_sequence)
+        for permutations, boots, seed_sequence in zip(
+            np.array_split(np.arange(n_permutations), n_jobs),
+            np.array_split(np.arange(n_boot), n_jobs),
+            np.random.SeedSequence(seed).spawn(n_jobs)
+        )
+    ]
+    if workers and workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_resample_job, jobs))
+    else:
+        results = [_resample_job(job) for job in jobs]
+    permuted_means = np.concatenate([permuted for permuted, _ in results])
+    bootstrap_means = np.concatenate([bootstrap for _, bootstrap in results])
+
+    overall = values.sum() / (len(values) if counts is None else counts.sum())
+    observed = np.abs(means - overall)
+    extreme = (np.abs(permuted_means - overall) >= observed * (1 - 1e-9)).sum(axis=0) # tolerance for float ties
+    alpha = (1 - ci) / 2 * 100
+    result["ci_low"] = np.percentile(bootstrap_means, alpha, axis=0)
+    result["ci_high"] = np.percentile(bootstrap_means, 100 - alpha, axis=0)
+    result["p_value"] = (1 + extreme) / (1 + n_permutations)
+    result["q_value"] = benjamini_hochberg(result["p_value"].to_numpy())
+    return result
+
+def _solve_seconds(times) -> np.ndarray:
+    '''
+    float64 copy of the (float32) solve times rounded to milliseconds, so 8.70 is not below 8.7 after widening.
+    '''
+    return np.round(np.asarray(times, dtype=np.float64), 3)
+
+class SubXIndex:
+    """
+    Sorted copy of the solve times, so sub-X counts for any set of thresholds cost O(k log n).
+    Sub-X is strictly below X (8.00 is sub-9, 9.00 is not). NaN times are ignored, DNFs (inf) count as solves.
+    """
+
+    def __init__(self, times: np.ndarray):
+        times = _solve_seconds(times)
+        self.sorted_times = np.sort(times[~np.isnan(times)])
+
+    def __len__(self):
+        return len(self.sorted_times)
+
+    def counts(self, thresholds) -> np.ndarray:
+        """Number of solves strictly below each threshold"""
+        return np.searchsorted(self.sorted_times, np.asarray(thresholds, dtype=np.float64), side="left")
+
+    def probabilities(self, thresholds) -> np.ndarray:
+        """Share of solves strictly below each threshold (0 without solves)"""
+        if len(self) == 0:
+            return np.zeros(np.shape(thresholds))
+        return self.counts(thresholds) / len(self)
+
+def compute_subx_probability(df: pd.DataFrame, threshold) -> float | np.ndarray:
+    """
+    Computes the probability of a sub-X solve (time strictly below threshold) for one or many thresholds.
+
+    Returns:
+        Probability (float) for a scalar threshold, array of probabilities for a list of thresholds
+    """
+
+    probabilities = SubXIndex(df["time_sec"].to_numpy()).probabilities(threshold)
+    return float(probabilities) if np.ndim(threshold) == 0 else probabilities
+
+def rolling_subx_probability(times: np.ndarray, threshold: float, n: int) -> np.ndarray:
+    """
+    Probability of a sub-X solve over the last n solves, for every solve, in one prefix-sum pass.
+    NaN times are skipped; the value is NaN until n valid solves are available.
+
+    Returns:
+        Array aligned with times
+    """
+    times = _solve_seconds(times)
+    valid = ~np.isnan(times)
+    hits = np.concatenate(([0], np.cumsum(valid & (times < threshold))))
+    count = np.concatenate(([0], np.cumsum(valid)))
 
-def compute_subx_probability(df, threshold):
-    ...
\ No newline at end of file
+    end = np.arange(1, len(times) + 1)
+    start = np.maximum(end - n, 0)
+    window_count = count[end] - count[start]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        probability = (hits[end] - hits[start]) / window_count
+    return np.where(window_count >= n, probability, np.nan)
\ No newline at end of file
@@ -0,0 +1,336 @@
+'''
+Streaming importers of timer exports into the solve store or into the "date;time" layout of data.csv.
+
+Usage:
+    py importers.py cstimer_export.txt --store store --cuber me              # csTimer JSON export
+    py importers.py prisma.csv --store store --cuber me --event 444          # delimited export (Prisma, WCA-style, data.csv)
+    py importers.py cstimer_export.txt --csv data.csv --tz Europe/Lisbon     # convert for the dashboard
+
+Files are read chunk by chunk (chunk_rows solves at a time), so memory does not grow with the size of the export.
+Penalties are kept: time_sec includes a +2, a DNF has time_sec = inf, and penalty is 0, 2 (+2) or -1 (DNF).
+'''
+import argparse
+import json
+import re
+
+import numpy as np
+import pandas as pd
+
+import data_processing as dp
+import storage
+from solve_store import SolveStore
+
+PENALTY_NONE = 0
+PENALTY_PLUS_TWO = 2
+PENALTY_DNF = -1
+
+CHUNK_ROWS = 100_000
+READ_BYTES = 1 << 20
+
+# Lower-case header names accepted for each column of a delimited export
+DATE_COLUMNS = ("date", "datetime", "date & time", "date and time", "timestamp")
+TIME_COLUMNS = ("time", "result", "solve time", "time (s)")
+PENALTY_COLUMNS = ("penalty", "penalties")
+SCRAMBLE_COLUMNS = ("scramble",)
+SESSION_COLUMNS = ("session", "session name", "category")
+WCA_VALUE_COLUMNS = ("value1", "value2", "value3", "value4", "value5") # centiseconds, -1 = DNF, -2 = DNS, 0 = no attempt
+
+def _local_dates(timestamps, unit: str, tz: str | None) -> np.ndarray:
+    '''
+    Naive datetime64[ns] of epoch timestamps, in the time zone tz (UTC if None).
+    '''
+    dates = pd.to_datetime(np.asarray(timestamps, dtype=np.int64), unit=unit, utc=True)
+    if tz:
+        dates = dates.tz_convert(tz)
+    return dates.tz_localize(None).to_numpy(dtype="datetime64[ns]")
+
+def _solves_frame(session, dates, time_sec, penalty, scramble) -> pd.DataFrame:
+    return pd.DataFrame({
+        "session": session,
+        "date": dates,
+        "time_sec": np.asarray(time_sec, dtype=np.float64),
+        "penalty": np.asarray(penalty, dtype=np.int8),
+        "scramble": scramble,
+    })
+
+# ----- csTimer -----
+
+class _JsonStream:
+    """
+    Minimal incremental reader of a JSON document: values are decoded one at a time from a buffer
+    refilled READ_BYTES at a time, so large arrays can be walked element by element.
+    """
+
+    NUMBER_CHARS = frozenset("0123456789+-.eE")
+
+    def __init__(self, file, read_bytes: int = READ_BYTES):
+        self.file = file
+        self.read_bytes = read_bytes
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        data = self.file.read(self.read_bytes)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        '''
+        Returns:
+            The next non-whitespace character ("" at the end of the file)
+        '''
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def consume(self, char: str) -> bool:
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, char: str) -> None:
+        if not self.consume(char):
+            raise ValueError(f"Invalid JSON: expected '{char}', found '{self.peek()}'.")
+
+    def value(self):
+        '''
+        Decodes the next complete value. A value ending at the end of the buffer, or followed by a character that
+        could continue a number ("1" of "1.25"), may be a truncated number, so more is read first.
+        '''
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buffer, self.pos)
+                if self.eof or (end < len(self.buffer) and self.buffer[end] not in self.NUMBER_CHARS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+def _cstimer_frame(rows: list, tz: str | None) -> pd.DataFrame:
+    '''
+    Solves frame from csTimer solves: [[penalty ms (0, 2000 or -1 for DNF), time ms, ...], scramble, comment, unix seconds, ...].
+    '''
+    penalty_ms = np.array([solve[0][0] for _, solve in rows], dtype=np.int64)
+    raw_ms = np.array([solve[0][1] for _, solve in rows], dtype=np.float64)
+    dnf = penalty_ms < 0
+    return _solves_frame(
+        [session for session, _ in rows],
+        _local_dates([solve[3] for _, solve in rows], "s", tz),
+        np.where(dnf, np.inf, (raw_ms + np.maximum(penalty_ms, 0)) / 1000),
+        np.where(dnf, PENALTY_DNF, np.where(penalty_ms > 0, PENALTY_PLUS_TWO, PENALTY_NONE)),
+        [solve[1] if len(solve) > 1 else "" for _, solve in rows],
+    )
+
+def iter_cstimer_json(path: str, chunk_rows: int = CHUNK_ROWS, tz: str | None = None):
+    """
+    Yields the solves of a csTimer export ({"session1": [solve, ...], ..., "properties": {...}}) as frames
+    of up to chunk_rows rows with session, date, time_sec, penalty and scramble, in file order.
+    """
+    rows = []
+    with open(path, encoding="utf-8-sig") as f:
+        stream = _JsonStream(f)
+        stream.expect("{")
+        while not stream.consume("}"):
+            key = stream.value()
+            stream.expect(":")
+            if not re.fullmatch(r"session\d+", str(key)):
+                stream.value() # properties, settings
+            elif stream.peek() == "[":
+                stream.expect("[")
+                while not stream.consume("]"):
+                    rows.append((key, stream.value()))
+                    stream.consume(",")
+                    if len(rows) >= chunk_rows:
+                        yield _cstimer_frame(rows, tz)
+                        rows = []
+            else:
+                rows.extend((key, solve) for solve in json.loads(stream.value())) # session stored as a JSON string
+                while len(rows) >= chunk_rows:
+                    yield _cstimer_frame(rows[:chunk_rows], tz)
+                    rows = rows[chunk_rows:]
+            stream.consume(",")
+    if rows:
+        yield _cstimer_frame(rows, tz)
+
+# ----- Delimited (Prisma, WCA-style, data.csv) -----
+
+def _sniff_delimiter(path: str) -> str:
+    with open(path, encoding="utf-8-sig") as f:
+        header = f.readline()
+    return max((";", ",", "\t"), key=header.count)
+
+def _find_column(columns, names) -> str | None:
+    return next((name for name in names if name in columns), None)
+
+def _parse_dates(dates: pd.Series, tz: str | None) -> np.ndarray:
+    '''
+    "dd/mm/yyyy hh:mm[:ss]", ISO dates or epoch seconds/milliseconds (converted to tz).
+    '''
+    dates = dates.str.strip()
+    if len(dates) and dates.str.fullmatch(r"\d+").all():
+        values = dates.astype(np.int64)
+        return _local_dates(values, "ms" if values.max() > 10 ** 11 else "s", tz)
+    if len(dates) and dates.str.match(r"\d{4}-").all(): # ISO, not day first
+        return pd.to_datetime(dates, format="ISO8601", errors="coerce").to_numpy(dtype="datetime64[ns]")
+    return pd.to_datetime(dp.parse_solve_dates(dates), errors="coerce").to_numpy(dtype="datetime64[ns]")
+
+def parse_results(times: pd.Series, penalties: pd.Series | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Parses timer results: "12.34", "1:02.34", "12.34+" (+2 included), "DNF", "DNF(12.34)", "DNS".
+    A separate penalty column ("+2"/"2"/"2000", "DNF"/"-1") applies to raw times; +2 is added to them.
+
+    Returns:
+        (time_sec with +2 included, inf for DNF and NaN for DNS/unreadable; penalty codes)
+    """
+    text = times.fillna("").astype(str).str.strip()
+    upper = text.str.upper()
+    dnf = upper.str.startswith("DNF").to_numpy(copy=True)
+    dns = upper.str.startswith("DNS").to_numpy()
+    plus_two = text.str.endswith("+").to_numpy(copy=True)
+    seconds = dp.parse_solve_times(text.str.replace(r"^DN[FS]\(?|\)$|\+$", "", regex=True)).to_numpy(dtype=np.float64)
+
+    if penalties is not None:
+        penalty = penalties.fillna("").astype(str).str.strip().str.upper()
+        added = penalty.isin(["+2", "2", "2000"]).to_numpy() & ~plus_two
+        seconds = seconds + 2 * added
+        plus_two |= added
+        dnf |= penalty.isin(["DNF", "-1"]).to_numpy()
+
+    time_sec = np.where(dns, np.nan, np.where(dnf, np.inf, seconds))
+    penalty_codes = np.where(dnf, PENALTY_DNF, np.where(plus_two, PENALTY_PLUS_TWO, PENALTY_NONE))
+    return time_sec, penalty_codes
+
+def _delimited_frame(chunk: pd.DataFrame, tz: str | None) -> pd.DataFrame:
+    columns = set(chunk.columns)
+    values = [col for col in WCA_VALUE_COLUMNS if col in columns]
+    if values: # one row per round: attempts in order, sharing the round's date
+        if "date" in columns:
+            dates = _parse_dates(chunk["date"], tz)
+        else:
+            dates = pd.to_datetime(chunk[["year", "month", "day"]].astype(int)).to_numpy(dtype="datetime64[ns]")
+        centis = chunk[values].apply(pd.to_numeric, errors="coerce").fillna(0).to_numpy(np.int64)
+        attempted = (centis > 0) | (centis == -1) # -2 = DNS, 0 = not attempted
+        rows, _ = np.nonzero(attempted)
+        centis = centis[attempted]
+        session_col = _find_column(columns, SESSION_COLUMNS + ("competitionid",))
+        frame = _solves_frame(
+            chunk[session_col].to_numpy()[rows] if session_col else "", dates[rows], np.where(centis == -1, np.inf, centis / 100),
+            np.where(centis == -1, PENALTY_DNF, PENALTY_NONE), "",
+        )
+    else:
+        date_col, time_col = _find_column(columns, DATE_COLUMNS), _find_column(columns, TIME_COLUMNS)
+        if date_col is None or time_col is None:
+            raise ValueError(f"No date/time columns among {sorted(columns)}.")
+        penalty_col, scramble_col, session_col = (_find_column(columns, names) for names in (PENALTY_COLUMNS, SCRAMBLE_COLUMNS, SESSION_COLUMNS))
+        time_sec, penalty = parse_results(chunk[time_col], chunk[penalty_col] if penalty_col else None)
+        frame = _solves_frame(
+            chunk[session_col].to_numpy() if session_col else "",
+            _parse_dates(chunk[date_col], tz), time_sec, penalty,
+            chunk[scramble_col].to_numpy() if scramble_col else "",
+        )
+    return frame[frame["date"].notna() & frame["time_sec"].notna()].reset_index(drop=True) # DNS and unreadable rows
+
+def iter_delimited(path: str, chunk_rows: int = CHUNK_ROWS, tz: str | None = None):
+    """
+    Yields the solves of a delimited export (";", "," or tab, detected from the header) as frames of up to
+    chunk_rows rows with session, date, time_sec, penalty and scramble. Columns are matched by header name
+    (DATE_COLUMNS, TIME_COLUMNS, ...); WCA-style rows with value1..value5 in centiseconds give one solve per attempt.
+    """
+    reader = pd.read_csv(
+        path, sep=_sniff_delimiter(path), dtype=str, encoding="utf-8-sig",
+        chunksize=chunk_rows, keep_default_na=False, skipinitialspace=True
+    )
+    for chunk in reader:
+        chunk.columns = chunk.columns.str.strip().str.lower()
+        yield _delimited_frame(chunk, tz)
+
+# ----- Destinations -----
+
+def detect_format(path: str) -> str:
+    '''
+    Returns:
+        "cstimer" for a JSON export, "delimited" otherwise
+    '''
+    with open(path, encoding="utf-8-sig") as f:
+        first = f.read(64).lstrip()
+    return "cstimer" if first.startswith("{") else "delimited"
+
+def iter_solves(path: str, fmt: str | None = None, chunk_rows: int = CHUNK_ROWS, tz: str | None = None):
+    fmt = fmt or detect_format(path)
+    if fmt == "cstimer":
+        return iter_cstimer_json(path, chunk_rows, tz)
+    if fmt == "delimited":
+        return iter_delimited(path, chunk_rows, tz)
+    raise ValueError(f"Unknown export format '{fmt}'.")
+
+def import_to_store(store: SolveStore, cuber: str, path: str, event: str = "333", fmt: str | None = None, chunk_rows: int = CHUNK_ROWS, tz: str | None = None, sessions=None) -> int:
+    '''
+    Streams an export into the store (all sessions, or only those listed, go to one event).
+
+    Returns:
+        Number of solves added
+    '''
+    added = 0
+    for chunk in iter_solves(path, fmt, chunk_rows, tz):
+        if sessions is not None:
+            chunk = chunk[chunk["session"].isin(sessions)]
+        if len(chunk):
+            added += store.append(cuber, event, chunk)
+    return added
+
+def export_to_csv(path: str, out_path: str, fmt: str | None = None, chunk_rows: int = CHUNK_ROWS, tz: str | None = None, sessions=None) -> int:
+    '''
+    Converts an export to the "date;time" layout of data.csv, chunk by chunk. The layout has no penalties:
+    +2 stays included in the time and DNFs are left out.
+
+    Returns:
+        Number of solves written
+    '''
+    written = 0
+    storage.write_solves_csv(pd.DataFrame({"date": pd.Series(dtype="datetime64[ns]"), "time_sec": pd.Series(dtype=np.float64)}), out_path)
+    for chunk in iter_solves(path, fmt, chunk_rows, tz):
+        if sessions is not None:
+            chunk = chunk[chunk["session"].isin(sessions)]
+        chunk = chunk[np.isfinite(chunk["time_sec"])]
+        storage.write_solves_csv(chunk, out_path, append=True)
+        written += len(chunk)
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Import csTimer, Prisma or WCA-style exports.")
+    parser.add_argument("path", help="export file")
+    parser.add_argument("--format", choices=["cstimer", "delimited"], default=None, help="default: detected from the file")
+    parser.add_argument("--store", help="solve store directory to import into")
+    parser.add_argument("--cuber", help="cuber name in the store")
+    parser.add_argument("--event", default="333")
+    parser.add_argument("--csv", help="write a \"date;time\" file for the dashboard instead")
+    parser.add_argument("--session", action="append", help="only import this session (repeatable)")
+    parser.add_argument("--tz", default=None, help="time zone of the solve dates for epoch timestamps (default UTC)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    if args.csv:
+        n = export_to_csv(args.path, args.csv, args.format, args.chunk_rows, args.tz, args.session)
+        print(f"{n} solves written to {args.csv}")
+    elif args.store and args.cuber:
+        n = import_to_store(SolveStore(args.store), args.cuber, args.path, args.event, args.format, args.chunk_rows, args.tz, args.session)
+        print(f"{n} solves imported into {args.store}/{args.cuber}/{args.event}")
+    else:
+        parser.error("either --csv or --store with --cuber is required")
+
+if __name__ == "__main__":
+    main()
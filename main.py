@@ -3,6 +3,10 @@ import pandas as pd
 import plotly.express as px
 import numpy as np
 import data_processing as dp
+import storage
+import profiling
+from pipeline import StageGraph
+import threading
 
 ##### CONSTANTS #####
 
@@ -11,46 +15,307 @@ COLOR_SCATTERS = "#3691E0"
 COLOR_LINES = "#E17070"
 HEATMAP_COLOR_PATTERN = "Viridis_r"
 
-SESSION_MAX_GAP_SEC = 600 # Max time gap between two solves for them to be considered in the same session. 600s = 10min
+DATA_PATH = "data.csv"
+
+TIME_SERIES_BUCKETS = 2000 # Time buckets of the downsampled "Solve Times Over Time" chart (min + max solve per bucket)
+
+SESSION_MAX_GAP_SEC = 600 # Default max time gap between two solves for them to be considered in the same session. 600s = 10min
+
+SIGNIFICANCE_PERMUTATIONS = 5000 # label permutations per heatmap cell / fatigue bin (BH over 168 cells needs thousands)
+SIGNIFICANCE_LEVEL = 0.05 # false discovery rate below which a cell or bin is called significant
+SIGNIFICANCE_WORKERS = None # process pool size for the resampling, None = in the app process
+
+PLAN_SIMULATIONS = 20000 # simulated runs of a training plan (each one draws every week of the horizon)
+
+Z_MODES = {"Mean / std": "mean", "Median / MAD (robust)": "robust"} # Z-score baselines, label -> mode
+
+DIAGNOSTICS_PATH = "diagnostics.jsonl" # Per-stage timings of the reruns with diagnostics enabled, one JSON line per stage
 
 ##### CONFIG #####
 
 st.set_page_config(page_title="Cube Performance Analysis", layout="wide")
 st.title("Speedcube Performance Analysis")
 
+diagnostics = st.sidebar.checkbox("Pipeline diagnostics", value=False, help="Time every stage of this rerun and trace its peak memory (slower)")
+profiler = profiling.StageProfiler(trace_memory=diagnostics)
+
 ##### LOAD DATA #####
 
-@st.cache_data
-def load_data():
+def prepare_appended_data(df, offset):
+    '''
+    Prepares only the solves appended to "data.csv" after byte offset, continuing the sessions of the base frame df.
     '''
-    Loads data from "data.csv" to variable "df". 
+    return dp.prepare_appended_solves(df, dp.read_solves_csv(DATA_PATH, offset), SESSION_MAX_GAP_SEC)
+
+@st.cache_resource
+def solve_history():
     '''
-    df = pd.read_csv("data.csv", sep=";", engine="python", encoding="utf-8-sig")
-    df.columns = df.columns.str.strip().str.lower()
-    return df
+    State of "data.csv" held once per process and shared by all sessions: its binary cache, the base frame
+    (a SolveLog growing with the file) and the stage graph over it, updated under the lock (see load_pipeline).
+    '''
+    return {
+        "lock": threading.Lock(),
+        "cache": storage.FrameCache(DATA_PATH, {"session_max_gap_sec": SESSION_MAX_GAP_SEC, "schema": dp.BASE_SCHEMA_VERSION}),
+        "log": None,
+        "graph": None,
+    }
+
+##### PIPELINE #####
+
+def build_pipeline(base, previous=None):
+    '''
+    Declares the computations of the dashboard as stages over the full history frame "base".
+    Each stage names the widget values (params) and upstream stages (deps) it uses, so moving a widget
+    only recomputes the stages downstream of it; everything else is served from the stage memo.
+    previous is the graph of the history before solves were appended to base: the stages over the whole history
+    (gaps, rolling stats, records, cubes, clustering caches) extend its results over the new solves.
+    '''
+    graph = StageGraph(previous=previous)
+    dates = base["date"].to_numpy() # full history arrays, sliced by the date filter
+    times = base["time_sec"].to_numpy()
+    latest_date = base["date"].iloc[-1]
+
+    @graph.stage(extend=lambda previous: previous.extended(dates))
+    def gaps():
+        return dp.GapIndex(dates) # sorted inter-solve gaps, sessions for any threshold without re-diffing
+
+    @graph.stage(extend=lambda previous: previous.extended(times))
+    def stats():
+        return dp.RollingStats(times) # rolling mean/std engine, recent windows cached
+
+    @graph.stage(extend=lambda previous: previous)
+    def structure_clustering():
+        return dp.ClusteringStage(random_state=1) # cached per feature matrix, valid for any history
+
+    @graph.stage(extend=lambda previous: previous)
+    def session_clustering():
+        return dp.ClusteringStage(random_state=42)
+
+    @graph.stage(deps=("gaps",), params=("session_gap_min",))
+    def sessions(gaps, session_gap_min):
+        return gaps.sessions(session_gap_min * 60)
+
+    @graph.stage(params=("date_range",))
+    def selection(date_range):
+        return dp.date_range_slice(dates, *date_range) # binary search, no per-row dates
+
+    @graph.stage(deps=("stats",), params=("window", "z_mode"))
+    def z_scores(stats, window, z_mode):
+        if z_mode == "robust":
+            return stats.robust_z_score(window) # rolling median / MAD, outliers barely move the baseline
+        return stats.z_score(window) # std over at least 100 solves
+
+    @graph.stage(deps=("sessions", "selection"))
+    def selected_sessions(sessions, selection):
+        return sessions.restrict(selection) # session index of the selected solves
+
+    @graph.stage(deps=("sessions", "selection"))
+    def selected(sessions, selection):
+        return base.iloc[selection].assign(session_id=sessions.session_ids[selection])
+
+    @graph.stage(deps=("sessions",), max_entries=4, extend=lambda previous, sessions: previous.extended(dates, times, sessions.session_ids))
+    def records(sessions):
+        return dp.RecordIndex(dates, times, sessions.session_ids) # PB progression of singles and averages, any range is a slice
+
+    @graph.stage(deps=("records", "selection"))
+    def best_ao5(records, selection):
+        return records.best("ao5", selection)
+
+    @graph.stage(deps=("selected", "selection", "z_scores"))
+    def frame(selected, selection, z_scores):
+        ma, std_movel, z_score = z_scores
+        return selected.assign(
+            ma=ma[selection].astype(np.float32),
+            std_movel=std_movel[selection].astype(np.float32),
+            z_score=z_score[selection].astype(np.float32)
+        ) # moving stats use the solves before the selected range too
+
+    @graph.stage(
+        deps=("sessions", "z_scores"), max_entries=32,
+        extend=lambda previous, sessions, z_scores: previous.extended(dates, times, z_scores[2], sessions.session_ids)
+    )
+    def cube(sessions, z_scores):
+        return dp.RollupCube(dates, times, z_scores[2], sessions.session_ids) # calendar rollups of all solves
+
+    @graph.stage(deps=("selected", "selected_sessions"))
+    def session_times(selected, selected_sessions):
+        return dp.compute_session_stats(selected, selected_sessions) # time columns only, independent of the z-score window
+
+    @graph.stage(deps=("session_times", "selected_sessions", "frame"))
+    def session_stats(session_times, selected_sessions, frame):
+        return session_times.assign(z_score=selected_sessions.aggregate(frame["z_score"].to_numpy(), "mean"))
+
+    @graph.stage(deps=("selection", "z_scores"), max_entries=64)
+    def time_series(selection, z_scores):
+        '''
+        Solves reduced to the fastest and slowest of each time bucket and the MA line reduced with LTTB.
+        Buckets span the selected range, so shorter ranges show more detail.
+        '''
+        selected_dates, selected_times, ma = dates[selection], times[selection], z_scores[0][selection].astype(np.float32)
+        x = selected_dates.astype("datetime64[ns]").astype(np.int64)
+        points = dp.minmax_downsample_indices(x, selected_times, TIME_SERIES_BUCKETS)
+        line = dp.lttb_indices(x, ma, 2 * TIME_SERIES_BUCKETS)
+        return (
+            pd.DataFrame({"date": selected_dates[points], "time_sec": selected_times[points]}),
+            pd.DataFrame({"date": selected_dates[line], "ma": ma[line]})
+        )
+
+    @graph.stage(deps=("selection",), max_entries=16)
+    def subx_index(selection):
+        return dp.SubXIndex(times[selection]) # sorted times, any set of sub-X thresholds is a binary search
+
+    @graph.stage(params=("subx_goal", "subx_n"))
+    def subx_probability(subx_goal, subx_n):
+        return dp.rolling_subx_probability(times, subx_goal, subx_n) # whole history, sliced by the date filter
+
+    @graph.stage(deps=("subx_probability", "selection"), max_entries=32)
+    def subx_curve(subx_probability, selection):
+        probability = subx_probability[selection]
+        selected_dates = dates[selection]
+        points = dp.lttb_indices(selected_dates.astype("datetime64[ns]").astype(np.int64), probability, 2 * TIME_SERIES_BUCKETS)
+        return pd.DataFrame({"date": selected_dates[points], "probability": probability[points]})
+
+    @graph.stage(deps=("cube",), params=("date_range",))
+    def weekly(cube, date_range):
+        weekly, weekly_valid = dp.weekly_tables(cube.weekly(*date_range))
+        return weekly, dp.add_weekly_structure_bins(weekly_valid), dp.weekly_structure_edges(weekly_valid)
+
+    @graph.stage(deps=("weekly", "selection"), params=("window",), max_entries=16)
+    def plan_simulator(weekly, selection, window):
+        return dp.TrainingPlanSimulator(weekly[1], times[selection][-window:], weekly[2]) # baseline: the last window solves
+
+    @graph.stage(deps=("plan_simulator",), params=("plan_solves", "plan_sessions", "plan_weeks", "subx_goal"), max_entries=32)
+    def plan_projection(plan_simulator, plan_solves, plan_sessions, plan_weeks, subx_goal):
+        return plan_simulator.simulate(plan_solves, plan_sessions, plan_weeks, PLAN_SIMULATIONS, subx_goal)
+
+    @graph.stage(deps=("session_stats", "structure_clustering"), params=("k_structure",))
+    def structure_clusters(session_stats, structure_clustering, k_structure):
+        session_features = dp.session_structure_features(session_stats)
+        session_features["cluster"] = structure_clustering.fit_predict(session_features[["session_size", "weekly_n_sessions"]], k_structure)
+        cluster_order = (session_features.groupby("cluster")["z_score_mean"].mean().sort_values().index)
+        session_features["cluster_rank"] = session_features["cluster"].map({cluster: i for i, cluster in enumerate(cluster_order)})
+        return session_features
+
+    @graph.stage(deps=("session_times", "structure_clustering"))
+    def structure_sweep(session_times, structure_clustering):
+        return structure_clustering.sweep(dp.session_structure_features(session_times)[["session_size", "weekly_n_sessions"]], range(2, 11))
+
+    @graph.stage(deps=("session_stats", "session_clustering"), params=("min_solves_k_means", "k_sessions"))
+    def session_clusters(session_stats, session_clustering, min_solves_k_means, k_sessions):
+        sessions_df = session_stats[["z_score", "session_size"]].assign(days_from_latest=dp.days_from_latest(session_stats["end"], latest_date)).dropna()
+        sessions_df = sessions_df[sessions_df["session_size"] >= min_solves_k_means] #filter analysis to include only sessions greater than min_solves_k_means
+        return sessions_df.assign(cluster=session_clustering.fit_predict(sessions_df[["z_score", "session_size"]], k_sessions))
+
+    @graph.stage(deps=("session_times",), params=("decay_factor",))
+    def regression(session_times, decay_factor):
+        '''Time-decay weighted slope of session mean time vs session size with a bootstrap CI, overall and per year.'''
+        sessions = session_times.dropna(subset=["mean_time"])
+        x = sessions["session_size"].to_numpy(np.float64)
+        y = sessions["mean_time"].to_numpy(np.float64)
+        days = dp.days_from_latest(sessions["end"], latest_date).to_numpy(np.float64)
+        years = sessions["start"].dt.year.to_numpy()
+
+        overall = dp.bootstrap_weighted_regression(x, y, days, decay_factor, n_boot=2000)
+        per_year = [
+            dp.bootstrap_weighted_regression(x[years == year], y[years == year], days[years == year], decay_factor, n_boot=2000).assign(year=year)
+            for year in np.unique(years) if (years == year).sum() > 2
+        ]
+        return sessions, overall, pd.concat(per_year) if per_year else pd.DataFrame()
+
+    @graph.stage(deps=("frame", "selected_sessions"), params=("min_session_size",))
+    def fatigue(frame, selected_sessions, min_session_size):
+        fatigue_df = dp.compute_fatigue_bins(frame, selected_sessions, min_session_size) # 20 bins: "0-5%", "5-10%", ...
+        fatigue_curve = (
+            fatigue_df.groupby("fatigue_bin", observed=False)
+            .agg(
+                mean_z_score=("z_score", "mean"),
+                n_solves=("z_score", "count")
+            )
+            .reset_index()
+        )
+        fatigue_smooth = (fatigue_df.groupby("solve_index").agg(mean_z=("z_score", "mean")).rolling(5).mean().reset_index())
+        return fatigue_df, fatigue_curve, fatigue_smooth
+
+    @graph.stage(deps=("frame",), max_entries=16)
+    def heatmap_significance(frame):
+        '''
+        Permutation p-values (BH adjusted) and bootstrap intervals of the mean z-score of every weekday x hour cell.
+        Sessions are the resampled units: their solves share a cell and a form, so they are not independent evidence.
+        '''
+        cell = frame["date"].dt.dayofweek.to_numpy() * 24 + frame["date"].dt.hour.to_numpy()
+        significance = dp.group_mean_significance(
+            frame["z_score"].to_numpy(), cell, SIGNIFICANCE_PERMUTATIONS, workers=SIGNIFICANCE_WORKERS, blocks=frame["session_id"].to_numpy()
+        )
+        codes = significance.index.to_numpy()
+        significance.index = pd.MultiIndex.from_arrays([np.array(dp.WEEKDAYS)[codes // 24], codes % 24], names=["weekday", "hour"])
+        return significance
+
+    @graph.stage(deps=("fatigue",))
+    def fatigue_significance(fatigue):
+        fatigue_df = fatigue[0]
+        significance = dp.group_mean_significance(
+            fatigue_df["z_score"].to_numpy(), fatigue_df["fatigue_bin"].cat.codes.to_numpy(), SIGNIFICANCE_PERMUTATIONS,
+            workers=SIGNIFICANCE_WORKERS, blocks=fatigue_df["session_id"].to_numpy()
+        )
+        significance = significance[significance.index >= 0] # solves outside the phase bins
+        significance.index = fatigue_df["fatigue_bin"].cat.categories[significance.index]
+        return significance
 
-df = load_data()
-df = dp.prepare_base_dataframe(df, SESSION_MAX_GAP_SEC)
+    return graph
+
+def load_pipeline():
+    '''
+    Loads data from "data.csv" and returns the base dataframe with the stage graph over it, shared by all reruns and sessions.
+    - The first load prepares the base frame, reusing a binary cache while "data.csv" is unchanged
+    - Solves appended to the file afterwards are parsed and split into sessions alone and the base frame grows in place;
+      the new graph extends the whole-history stages of the previous one over them, the other stages start over
+    - A file changed in any other way is loaded from scratch
+    The frame arrays are read-only: each rerun takes a shallow copy.
+    '''
+    history = solve_history()
+    with history["lock"]:
+        log = history["log"]
+        new = None if log is None else history["cache"].append(log.frame(), prepare_appended_data)
+        if new is None:
+            log = history["log"] = dp.SolveLog(history["cache"].load(
+                lambda: dp.prepare_base_dataframe(dp.read_solves_csv(DATA_PATH), SESSION_MAX_GAP_SEC),
+                prepare_appended_data
+            ))
+            history["graph"] = build_pipeline(log.frame())
+        elif len(new):
+            log.append(new)
+            history["graph"] = build_pipeline(log.frame(), history["graph"])
+        return log.frame(), history["graph"]
+
+df, graph = load_pipeline()
+df = df.copy(deep=False) # own frame object, columns added by this rerun stay local
+graph.begin_run()
+profiler.checkpoint("load", len(df))
 
 ##### SIDEBAR FILTER #####
 
 st.sidebar.header("Filters")
 
-min_date = df["date"].min().date()
-max_date = df["date"].max().date()
+min_date = df["date"].iloc[0].date()
+max_date = df["date"].iloc[-1].date()
 
 date_range = st.sidebar.date_input(
     "Select Date Range",
     [min_date, max_date]
 )
+start_date, end_date = date_range if len(date_range) == 2 else (None, None)
 
-if len(date_range) == 2:
-    start_date, end_date = date_range
-    mask = (df["date"].dt.date >= start_date) & (df["date"].dt.date <= end_date)
-    df = df.loc[mask]
+session_gap_min = st.sidebar.slider("Session Max Gap (min)", 1, 60, SESSION_MAX_GAP_SEC // 60)
+
+params = {"date_range": (start_date, end_date), "session_gap_min": session_gap_min} # widget values read by the stages, filled in as the widgets appear
+
+sessions = graph.get("sessions", params)
+st.sidebar.caption(f"{len(sessions)} sessions")
+df = graph.get("selected", params)
+profiler.checkpoint("sessions + date selection", len(df))
 
 ##### METRICS #####
-best_ao5 = dp.compute_best_ao5_wca(df)
+best_ao5 = graph.get("best_ao5", params)
 
 col1, col2, col3, col4, col5 = st.columns(5)
 
@@ -61,39 +326,51 @@ col4.metric("Best Average of 5", f"{best_ao5:.2f} s" if best_ao5 is not None els
 col5.metric("Standard Deviation", f"{df['time_sec'].std():.2f}")
 
 st.divider()
+profiler.checkpoint("metrics", len(df))
 
 ######################
 ##### DASHBOARDS #####
 ######################
 
-window = st.sidebar.slider("Moving Mean Window", 1, 1000, 500)
-df["ma"] = df["time_sec"].rolling(window).mean()
-df["std_movel"] = df["time_sec"].rolling(window=window, min_periods=100).std() #calculate std variation
-df["z_score"] = (df["time_sec"] - df["ma"]) / df["std_movel"]
+window = params["window"] = st.sidebar.slider("Moving Mean Window", 1, 1000, 500)
+z_mode = params["z_mode"] = Z_MODES[st.sidebar.selectbox("Z-score baseline", list(Z_MODES))]
+df = graph.get("frame", params)
+profiler.checkpoint("rolling z-scores", len(df))
+
+cube = graph.get("cube", params)
+profiler.checkpoint("rollup cube", len(cube.days))
 
-sessions_df = df.groupby("session_id").agg({"z_score": "mean", "time_sec": "count", "days_from_latest": "min"}).rename(columns={"time_sec": "session_size"}).dropna()
+session_stats = graph.get("session_stats", params)
+profiler.checkpoint("session stats", len(session_stats))
 
 st.subheader("Solves distribution plots")
 
+downsample = st.sidebar.checkbox("Downsample solve chart", value=True)
+if downsample:
+    solves_plot, ma_plot = graph.get("time_series", params)
+else:
+    solves_plot, ma_plot = df, df
+
 fig1 = px.scatter(
-    df,
+    solves_plot,
     x="date",
     y="time_sec",
     title="Solve Times Over Time",
     labels={"time_sec": "Time (s)", "date": "Date"},
     render_mode="webgl"
-) # Plot all times as points
+) # Plot all times as points (or the fastest/slowest per time bucket)
 
 fig1.add_scattergl(
-    x=df["date"],
-    y=df["ma"],
+    x=ma_plot["date"],
+    y=ma_plot["ma"],
     mode="lines",
-    name=f"MA{window}",
+    name=f"MA{window}" if z_mode == "mean" else f"Median{window}",
     line=dict(color=COLOR_LINES, width=3)
 ) # Plots MA filtered times as line
 
 fig1.update_traces(marker=dict(color=COLOR_SCATTERS, size=3, opacity=0.5), selector=dict(mode='markers'))
 st.plotly_chart(fig1, use_container_width=True)
+profiler.checkpoint("plot: solve times", len(solves_plot))
 
 
 ##### LINE: HISTOGRAM + SUB X (MESMA LINHA) #####
@@ -115,12 +392,18 @@ with col_dist:
     st.plotly_chart(fig3, use_container_width=True) 
 
 ##### SUB X #####
+sub_x_input = st.sidebar.text_input("Sub-X thresholds (s)", "6, 7, 8, 9, 10, 11, 12, 13, 14, 15")
+try:
+    sub_x_values = sorted({float(x) for x in sub_x_input.replace(";", ",").split(",") if x.strip()})
+except ValueError:
+    st.sidebar.warning("Thresholds must be numbers separated by commas.")
+    sub_x_values = list(range(6, 16))
+
 with col_subx:
-    sub_x_values = range(6, 16)
-    total_solves = len(df) 
-    sub_x_counts = [(df["time_sec"] < x).sum() for x in sub_x_values]
-    sub_x_probs = [ (count / total_solves) if total_solves > 0 else 0 for count in sub_x_counts] 
-    sub_x_labels = [f"Sub {x}s" for x in sub_x_values]
+    sub_x = graph.get("subx_index", params)
+    sub_x_counts = sub_x.counts(sub_x_values)
+    sub_x_probs = sub_x.probabilities(sub_x_values)
+    sub_x_labels = [f"Sub {x:g}s" for x in sub_x_values]
     sub_x_df = pd.DataFrame({
         "sub_x": sub_x_labels,
         "amount": sub_x_counts,
@@ -139,6 +422,54 @@ with col_subx:
 
     fig4.update_traces(textposition="outside")
     st.plotly_chart(fig4, use_container_width=True)
+profiler.checkpoint("plot: histogram + sub-X", len(df))
+
+##### ROLLING SUB X PROBABILITY #####
+
+col_subx_goal, col_subx_n = st.columns(2)
+subx_goal = params["subx_goal"] = col_subx_goal.number_input("Sub-X goal (s)", min_value=1.0, max_value=60.0, value=8.0, step=0.1)
+subx_n = params["subx_n"] = col_subx_n.slider("Solves per probability window", 12, 1000, 100)
+
+subx_curve = graph.get("subx_curve", params)
+
+fig_subx = px.line(
+    subx_curve,
+    x="date",
+    y="probability",
+    title=f"Probability of Sub-{subx_goal:g} over the last {subx_n} solves",
+    labels={"date": "Date", "probability": f"P(sub-{subx_goal:g})"}
+)
+fig_subx.update_traces(line=dict(color=COLOR_LINES, width=2))
+fig_subx.update_yaxes(tickformat=".0%")
+st.plotly_chart(fig_subx, use_container_width=True)
+profiler.checkpoint("rolling sub-X", len(subx_curve))
+
+##### PERSONAL RECORDS #####
+
+st.subheader("Personal Record Progression")
+
+records = graph.get("records", params)
+col_record_kind, col_record_scope = st.columns(2)
+record_kind = col_record_kind.selectbox("Record", records.kinds, index=1, format_func=lambda kind: "Single" if kind == "single" else kind.replace("ao", "Ao"))
+record_scope = col_record_scope.radio("Scope", ["all", "year"], format_func={"all": "All-time", "year": "Best of each year"}.get, horizontal=True)
+progression = records.progression(record_kind, record_scope, start_date, end_date)
+
+fig_records = px.line(
+    progression.assign(year=progression["year"].astype(str)),
+    x="date",
+    y="value",
+    color="year" if record_scope == "year" else None,
+    markers=True,
+    line_shape="hv",
+    hover_data=["improvement"],
+    title=f"{'Single' if record_kind == 'single' else record_kind.replace('ao', 'Ao')} records set in the selected range",
+    labels={"date": "Date", "value": "Time (s)", "improvement": "Improvement (s)", "year": "Year"}
+) # Steps at every new personal best
+if record_scope == "all":
+    fig_records.update_traces(line=dict(color=COLOR_LINES, width=2))
+st.plotly_chart(fig_records, use_container_width=True)
+st.caption(f"{len(progression)} records. Averages only count solves of the same session.")
+profiler.checkpoint("records", len(progression))
 
 
 st.markdown(r"""
@@ -158,6 +489,8 @@ Where:
 
 **Interpretation:** A $Z = 0$ indicates a performance exactly at your current average. A $Z = -1.5$ indicates a "peak" solve, 1.5 standard deviations faster than your current baseline.
 Mean is prefered over average for this analysis to reduce the noise of outliers. $Z>0$ indicates a worse than average solve.
+
+With the **Median / MAD** baseline (sidebar), $\mu_\text{moving}$ is the median of the last $N$ solves and $\sigma_\text{moving}$ is $1.4826 \times$ their median absolute deviation, so pops, DNFs and lucky solves barely shift the baseline.
 """)
 
 
@@ -171,7 +504,7 @@ col_heatmap, col_years = st.columns(2)
 ##### HEATMAP #####
 with col_heatmap:
 
-    heatmap_data = (df.groupby(["weekday", "hour"])["z_score"].mean().reset_index() ) # creates data frame
+    heatmap_data = cube.rollup("weekday_hour", start_date, end_date)["mean_z"].rename("z_score").reset_index() # creates data frame
 
     heatmap_data["weekday"] = pd.Categorical(
         heatmap_data["weekday"],
@@ -185,6 +518,15 @@ with col_heatmap:
         values="z_score"
     ) #transforms data frame into matrix
 
+    heatmap_significance = graph.get("heatmap_significance", params)
+    cell_stats = {
+        column: heatmap_significance[column].unstack("hour").reindex(index=pivot_table.index, columns=pivot_table.columns)
+        for column in ("n", "ci_low", "ci_high", "q_value")
+    } # matrices aligned with the heatmap
+    significant_only = st.checkbox(f"Only cells significantly different from the average (q < {SIGNIFICANCE_LEVEL})")
+    if significant_only:
+        pivot_table = pivot_table.where(cell_stats["q_value"] < SIGNIFICANCE_LEVEL)
+
     fig_heat = px.imshow(
         pivot_table,
         color_continuous_scale=HEATMAP_COLOR_PATTERN,
@@ -193,8 +535,19 @@ with col_heatmap:
         title="Heatmap",
     )
 
+    fig_heat.update_traces(
+        customdata=np.dstack([cell_stats[column].to_numpy(dtype=np.float64) for column in ("n", "ci_low", "ci_high", "q_value")]),
+        hovertemplate=(
+            "%{y} %{x}:00<br>z_score: %{z:.3f}<br>solves: %{customdata[0]:.0f}"
+            "<br>95% CI: [%{customdata[1]:.3f}, %{customdata[2]:.3f}]<br>q-value: %{customdata[3]:.4f}<extra></extra>"
+        )
+    )
     fig_heat.update_xaxes(dtick=2)   
     st.plotly_chart(fig_heat, use_container_width=True)
+    st.caption(
+        f"{(heatmap_significance['q_value'] < SIGNIFICANCE_LEVEL).sum()} of {len(heatmap_significance)} cells differ from the average "
+        f"(permutation test over {SIGNIFICANCE_PERMUTATIONS} relabellings of whole sessions, Benjamini-Hochberg q < {SIGNIFICANCE_LEVEL})."
+    )
 
     st.markdown("""
     Best performance was noticed between 14:00 and 19:00. 
@@ -206,15 +559,10 @@ with col_heatmap:
 ##### SOLVES AND PERFORMANCE PER YEAR #####
 with col_years:
 
-    yearly_stats = (
-        df.groupby("year")
-        .agg(
-            solves=("time_sec", "count"),
-            median_time=("time_sec", "median")
-        )
-        .reset_index()
-        .sort_values("year")
-    )
+    yearly_stats = cube.rollup("year", start_date, end_date)[["count"]].rename(columns={"count": "solves"})
+    yearly_stats["solves"] = yearly_stats["solves"].astype(int)
+    yearly_stats["median_time"] = dp.sorted_group_medians(df["year"].to_numpy(), df["time_sec"].to_numpy())
+    yearly_stats = yearly_stats.reset_index()
 
     yearly_stats["improvement_pct"] = (
         yearly_stats["median_time"].pct_change() * -100
@@ -253,6 +601,7 @@ with col_years:
     st.markdown("""
     Years with more practice clearly result to better performance.
     """)
+profiler.checkpoint("plot: heatmap + yearly", len(yearly_stats))
 
 
 
@@ -265,37 +614,18 @@ with col_years:
 
 
 
-df, weekly, weekly_valid = dp.week_column(df)
-weekly_valid = dp.add_weekly_structure_bins(weekly_valid)
-
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
+weekly, weekly_valid, _ = graph.get("weekly", params)
+profiler.checkpoint("weekly structure bins", len(weekly_valid))
 
 
 ### Clusters 1
 
 
-k_clusters = st.sidebar.slider("Training Structure Clusters",2, 10, 4)
+k_clusters = params["k_structure"] = st.sidebar.slider("Training Structure Clusters",2, 10, 4)
 
 st.header("Clustering")
 
-session_features = (df.groupby("session_id").agg(session_size=("time_sec", "count"), z_score_mean=("z_score", "mean"), week=("week", "first")).reset_index())
-
-weekly_session_count = (session_features.groupby("week").size().rename("weekly_n_sessions"))
-session_features = session_features.merge(weekly_session_count, on="week")
-
-X = session_features[["session_size", "weekly_n_sessions"]]
-
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
-
-model = KMeans(n_clusters=k_clusters, random_state=1, n_init=10)
-session_features["cluster"] = model.fit_predict(X_scaled)
-
-cluster_order = (session_features.groupby("cluster")["z_score_mean"].mean().sort_values().index)
-cluster_color_map = {cluster: i for i, cluster in enumerate(cluster_order)}
-
-session_features["cluster_rank"] = session_features["cluster"].map(cluster_color_map)
+session_features = graph.get("structure_clusters", params) # clusters sorted by mean z-score in "cluster_rank"
 
 colors = px.colors.sample_colorscale( "RdYlGn_r", [i / (k_clusters - 1) for i in range(k_clusters)])
 color_map = {i: colors[i] for i in range(k_clusters)}
@@ -328,12 +658,64 @@ Each color represents a distinct training behavior pattern, and the gradient ref
 
 st.plotly_chart(fig_clusters, use_container_width=True)
 
+with st.expander("Choosing k: elbow and silhouette"):
+    k_sweep = graph.get("structure_sweep", params)
+
+    fig_elbow = px.line(k_sweep, x="k", y="inertia", markers=True, title="Elbow (inertia per k)")
+    fig_elbow.update_traces(line=dict(color=COLOR_LINES))
+    fig_elbow.add_scatter(x=k_sweep["k"], y=k_sweep["silhouette"], mode="lines+markers", name="Silhouette", yaxis="y2", line=dict(color=COLOR_BARS))
+    fig_elbow.update_layout(yaxis2=dict(title="Silhouette", overlaying="y", side="right"))
+    st.plotly_chart(fig_elbow, use_container_width=True)
+
 st.markdown("""
 Hihger weekly sessions frequency and longer sessions show better perfromance, which is expected. 
 When having to choose between session frequency and session size the result suggests to choose less sessions, but longer.
 """)
+profiler.checkpoint("clustering: training structure", len(session_features))
+
 
+##### TRAINING PLAN SIMULATOR #####
 
+st.header("Training Plan Simulator")
+
+recent_weeks = weekly_valid.tail(8) # defaults: the current training structure
+col_plan_solves, col_plan_sessions, col_plan_weeks = st.columns(3)
+plan_solves = params["plan_solves"] = col_plan_solves.number_input(
+    "Solves per week", min_value=1, max_value=5000, value=max(int(recent_weeks["weekly_volume"].median()) if len(recent_weeks) else 200, 1), step=10
+)
+plan_sessions = params["plan_sessions"] = col_plan_sessions.number_input(
+    "Sessions per week", min_value=1, max_value=50, value=max(int(recent_weeks["n_sessions"].median()) if len(recent_weeks) else 5, 1)
+)
+plan_weeks = params["plan_weeks"] = col_plan_weeks.slider("Weeks", 1, 52, 12)
+
+plan_simulator = graph.get("plan_simulator", params)
+projection = graph.get("plan_projection", params)
+pool, pool_source = plan_simulator.pool(plan_solves, plan_sessions)
+
+fig_plan = px.line(
+    projection.melt(id_vars="week", value_vars=["mean_time_p10", "mean_time_p50", "mean_time_p90"], var_name="percentile", value_name="mean_time"),
+    x="week",
+    y="mean_time",
+    color="percentile",
+    title=f"Projected Mean Time ({PLAN_SIMULATIONS} simulations)",
+    labels={"week": "Week", "mean_time": "Mean Time (s)", "percentile": ""},
+    color_discrete_map={"mean_time_p10": COLOR_BARS, "mean_time_p50": COLOR_LINES, "mean_time_p90": COLOR_BARS}
+)
+fig_plan.update_yaxes(autorange="reversed")
+
+col_plan_chart, col_plan_metrics = st.columns([3, 1])
+col_plan_chart.plotly_chart(fig_plan, use_container_width=True)
+final_week = projection.iloc[-1]
+col_plan_metrics.metric(f"Median mean time after {plan_weeks} weeks", f"{final_week['mean_time_p50']:.2f}s", f"{final_week['mean_time_p50'] - projection['mean_time_p50'].iloc[0]:+.2f}s", delta_color="inverse")
+col_plan_metrics.metric(f"P(sub-{subx_goal:g}) per solve", f"{final_week['p_sub_goal']:.1%}")
+col_plan_metrics.metric(f"P(at least one sub-{subx_goal:g}) in week {plan_weeks}", f"{final_week['p_any_sub_goal']:.1%}")
+
+st.caption(
+    f"The plan's level is the mean next-week z-score of {len(pool)} past weeks ({pool_source} of the plan) compared with the average week, "
+    f"bootstrapped once per simulation and converted to seconds with the spread of the last {window} solves. "
+    "z-scores follow a moving baseline, so the level is held rather than accumulated; few matching weeks make the band wider."
+)
+profiler.checkpoint("training plan simulator", PLAN_SIMULATIONS * plan_weeks)
 
 
 
@@ -343,14 +725,11 @@ When having to choose between session frequency and session size the result sugg
 
 
 
-min_solves_k_means = st.sidebar.slider("Min solves per session (K-Means)", 1, 50, 10) # Slider para controle
-sessions_df = sessions_df[sessions_df["session_size"] >= min_solves_k_means] #filter analysis to include only sessions greater than min_solves_k_means
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(sessions_df[["z_score", "session_size"]])
 
-k_clusters = st.sidebar.slider("Clusters k amount", 1, 10, 3)
-model = KMeans(n_clusters=k_clusters, random_state=42, n_init=10)
-sessions_df["cluster"] = model.fit_predict(X_scaled)
+
+params["min_solves_k_means"] = st.sidebar.slider("Min solves per session (K-Means)", 1, 50, 10) # Slider para controle
+params["k_sessions"] = st.sidebar.slider("Clusters k amount", 1, 10, 3)
+sessions_df = graph.get("session_clusters", params) # sessions with at least min_solves_k_means solves
 
 st.markdown("""     
 The Y-axis (Z-Score) is inverted in the plot. Therefore, "better" performances (negative Z-Scores) appear at the top of the chart.
@@ -379,6 +758,52 @@ REV
 In larger sessions typically the first solves are not very good, the middle ones are the best and the last ones are worse. 
 That happens because there is always a performance peak, which after reached gets worse until a point is reached where motivation is lost.
 """)
+profiler.checkpoint("clustering: sessions", len(sessions_df))
+
+
+##### SESSION SIZE REGRESSION #####
+
+st.header("Session Size and Performance")
+
+params["decay_factor"] = st.number_input("Recency decay (per day, 0 = all sessions weigh the same)", min_value=0.0, max_value=0.1, value=0.001, step=0.0005, format="%.4f")
+regression_sessions, regression, regression_years = graph.get("regression", params)
+fit = regression.iloc[0]
+
+col_reg, col_reg_years = st.columns(2)
+
+with col_reg:
+    fig_reg = px.scatter(
+        regression_sessions,
+        x="session_size",
+        y="mean_time",
+        title="Session Mean Time vs Session Size",
+        labels={"session_size": "Session Size", "mean_time": "Session Mean Time (s)"},
+        render_mode="webgl"
+    )
+    fig_reg.update_traces(marker=dict(color=COLOR_SCATTERS, size=4, opacity=0.4))
+    x_line = np.linspace(regression_sessions["session_size"].min(), regression_sessions["session_size"].max(), 100)
+    fig_reg.add_scatter(x=x_line, y=fit["slope"] * x_line + fit["intercept"], mode="lines", name="Weighted fit", line=dict(color=COLOR_LINES, width=3))
+    st.plotly_chart(fig_reg, use_container_width=True)
+
+    st.markdown(f"""
+    Slope: **{fit["slope"]:.4f} s per solve** (95% bootstrap CI {fit["slope_low"]:.4f} to {fit["slope_high"]:.4f}),
+    i.e. sessions with 50 more solves average {50 * fit["slope"]:+.2f} s.
+    """)
+
+with col_reg_years:
+    if len(regression_years):
+        fig_reg_years = px.bar(
+            regression_years,
+            x="year",
+            y="slope",
+            error_y=regression_years["slope_high"] - regression_years["slope"],
+            error_y_minus=regression_years["slope"] - regression_years["slope_low"],
+            title="Session Size Slope per Year (95% CI)",
+            labels={"year": "Year", "slope": "Slope (s per solve)"}
+        )
+        fig_reg_years.update_traces(marker=dict(color=COLOR_BARS))
+        st.plotly_chart(fig_reg_years, use_container_width=True)
+profiler.checkpoint("session size regression", len(regression_sessions))
 
 
 
@@ -412,42 +837,26 @@ That happens because there is always a performance peak, which after reached get
 
 
 
-min_session_size = 40
+params["min_session_size"] = 40
 
 st.header("Fatigue Analysis")
 
-session_sizes = df.groupby("session_id")["z_score"].transform("count")
-
-fatigue_df = df[session_sizes >= min_session_size].copy()
-fatigue_df["solve_index"] = fatigue_df.groupby("session_id").cumcount()
-fatigue_df["session_size"] = fatigue_df.groupby("session_id")["z_score"].transform("count")
-fatigue_df["relative_position"] = fatigue_df["solve_index"] / (fatigue_df["session_size"] - 1)
-fatigue_df["fatigue_bin"] = pd.cut(
-    fatigue_df["relative_position"],
-    bins=np.linspace(0, 1, 21),
-    labels=[
-        "0-5%", "5-10%", "10-15%", "15-20%",
-        "20-25%", "25-30%", "30-35%", "35-40%",
-        "40-45%", "45-50%", "50-55%", "55-60%",
-        "60-65%", "65-70%", "70-75%", "75-80%",
-        "80-85%", "85-90%", "90-95%", "95-100%"
-    ],
-    include_lowest=True
-)
+fatigue_df, fatigue_curve, fatigue_smooth = graph.get("fatigue", params)
+profiler.checkpoint("fatigue bins", len(fatigue_df))
 
-fatigue_curve = (
-    fatigue_df.groupby("fatigue_bin")
-    .agg(
-        mean_z_score=("z_score", "mean"),
-        n_solves=("z_score", "count")
-    )
-    .reset_index()
-)
+fatigue_significance = graph.get("fatigue_significance", params)
+fatigue_curve = fatigue_curve.join(fatigue_significance[["ci_low", "ci_high", "q_value"]], on="fatigue_bin")
+fatigue_curve["ci_plus"] = fatigue_curve["ci_high"] - fatigue_curve["mean_z_score"]
+fatigue_curve["ci_minus"] = fatigue_curve["mean_z_score"] - fatigue_curve["ci_low"]
+profiler.checkpoint("fatigue significance", len(fatigue_significance))
 
 fig_fatigue = px.line(
     fatigue_curve,
     x="fatigue_bin",
     y="mean_z_score",
+    error_y="ci_plus",
+    error_y_minus="ci_minus", # 95% bootstrap interval of the bin mean
+    hover_data={"q_value": ":.4f"},
     markers=True,
     title="Average Performance During Sessions",
     labels={
@@ -459,6 +868,11 @@ fig_fatigue = px.line(
 fig_fatigue.update_yaxes(autorange="reversed")
 
 st.plotly_chart(fig_fatigue, use_container_width=True)
+significant_bins = fatigue_curve.loc[fatigue_curve["q_value"] < SIGNIFICANCE_LEVEL, "fatigue_bin"].astype(str)
+st.caption(
+    f"Bins significantly different from the session average (q < {SIGNIFICANCE_LEVEL}): "
+    + (", ".join(significant_bins) or "none")
+)
 st.markdown("""
             The plot shows the following trend of the sessions:
             - The fisrst couple solves serve as warm-up and are worse than average
@@ -467,9 +881,6 @@ st.markdown("""
             """)
 
 
-fatigue_smooth = (fatigue_df.groupby("solve_index").agg(mean_z=("z_score", "mean")).rolling(5).mean().reset_index()
-)
-
 fig_smooth = px.line(
     fatigue_smooth,
     x="solve_index",
@@ -483,6 +894,7 @@ fig_smooth = px.line(
 
 fig_smooth.update_yaxes(autorange="reversed")
 st.plotly_chart(fig_smooth, use_container_width=True)
+profiler.checkpoint("plot: fatigue", len(fatigue_smooth))
 
 
 
@@ -490,7 +902,38 @@ st.plotly_chart(fig_smooth, use_container_width=True)
 
 
 
-weekly.to_csv("generated dataframes/weekly.csv")
-weekly_valid.to_csv("generated dataframes/weekly_valid.csv")
-df.to_csv("generated dataframes/df.csv")
-df.to_csv("generated dataframes/fatigue_df.csv")
\ No newline at end of file
+@st.cache_resource
+def frame_exporter():
+    '''
+    Background exporter of the generated dataframes, shared across reruns so unchanged frames are not rewritten.
+    '''
+    return storage.FrameExporter("generated dataframes", csv=("weekly", "weekly_valid"))
+
+exporter = frame_exporter()
+exporter.export({
+    "weekly": weekly,
+    "weekly_valid": weekly_valid,
+    "df": df,
+    "fatigue_df": fatigue_df,
+})
+profiler.checkpoint("export (queued)", len(df))
+export_errors = dict(exporter.errors) # failures of earlier background exports, retried by the next export of the same frame
+if export_errors:
+    st.sidebar.warning("Export of the generated dataframes failed: " + "; ".join(f"{name}: {error}" for name, error in export_errors.items()))
+
+##### DIAGNOSTICS #####
+
+if diagnostics:
+    stages = profiler.to_frame()
+    with st.sidebar.expander("Pipeline diagnostics", expanded=True):
+        st.caption(f"Rerun total: {stages['seconds'].sum():.3f} s")
+        st.caption("Recomputed stages: " + (", ".join(graph.recomputed) or "none (all memoized)"))
+        st.dataframe(
+            stages.style.format({"seconds": "{:.4f}", "peak_mb": "{:.1f}"}),
+            hide_index=True,
+            use_container_width=True
+        )
+        if exporter.write_seconds:
+            st.caption("Last background export (s): " + ", ".join(f"{name} {seconds:.3f}" for name, seconds in exporter.write_seconds.items()))
+    profiler.export_jsonl(DIAGNOSTICS_PATH, window=window, z_mode=z_mode, session_gap_min=session_gap_min, date_range=[str(d) for d in date_range])
+profiler.close()
\ No newline at end of file
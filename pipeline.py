@@ -0,0 +1,109 @@
+import inspect
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+class StageGraph:
+    """
+    Pipeline of named stages with explicitly declared inputs:
+    - params: names of the run parameters (widget values) the stage reads
+    - deps: names of the upstream stages whose results it receives
+    A stage result is memoized per values of all parameters it depends on, directly or through its deps,
+    so changing one parameter only recomputes the stages downstream of it (up to max_entries results per stage).
+    Results are shared between reruns and sessions and must be treated as read-only.
+    A graph built over a longer history can take over the results of the previous graph: stages declared with
+    extend build their result from the previous one for the same inputs instead of from scratch.
+    """
+
+    def __init__(self, max_entries: int = 8, previous: "StageGraph | None" = None):
+        self.max_entries = max_entries
+        self._stages = {}
+        self._cache = {}
+        self._carried = {} # per stage: results of the previous graph, extended on their next use
+        self._previous = {} # results of the extendable stages of previous, oldest first, until the stage is declared
+        if previous is not None:
+            with previous._lock:
+                for name, stage in previous._stages.items():
+                    if stage["extend"] is not None:
+                        self._previous[name] = OrderedDict(previous._carried[name])
+                        self._previous[name].update(previous._cache[name])
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def stage(self, params: tuple = (), deps: tuple = (), max_entries: int | None = None, extend=None):
+        '''
+        Decorator declaring a stage named after the function, called with its params and deps as keyword arguments.
+        extend(previous result, **params and deps) builds the result from the result of the previous graph
+        (see __init__) for the same inputs, e.g. by processing only the solves appended since.
+        '''
+        def register(func):
+            missing = [name for name in deps if name not in self._stages]
+            if missing:
+                raise ValueError(f"Stage '{func.__name__}' depends on undeclared stages {missing}.")
+            unused = set(inspect.signature(func).parameters) ^ set(params) ^ set(deps)
+            if unused:
+                raise ValueError(f"Stage '{func.__name__}' arguments do not match its params and deps: {sorted(unused)}.")
+
+            inputs = set(params)
+            for name in deps:
+                inputs |= set(self._stages[name]["inputs"])
+            self._stages[func.__name__] = {
+                "func": func, "params": tuple(params), "deps": tuple(deps),
+                "inputs": tuple(sorted(inputs)), "max_entries": max_entries or self.max_entries, "extend": extend,
+            }
+            self._cache[func.__name__] = OrderedDict()
+            carried = self._previous.pop(func.__name__, OrderedDict()) if extend is not None else OrderedDict()
+            while len(carried) > self._stages[func.__name__]["max_entries"]:
+                carried.popitem(last=False)
+            self._carried[func.__name__] = carried
+            return func
+        return register
+
+    def inputs(self, name: str) -> tuple[str, ...]:
+        '''
+        Returns:
+            All parameters the stage depends on, directly or through its upstream stages
+        '''
+        return self._stages[name]["inputs"]
+
+    def get(self, name: str, params: dict):
+        """
+        Returns the result of a stage for the given parameters, computing it (and any upstream stage
+        whose inputs changed) only if it is not memoized. params may hold more values than the stage needs.
+        """
+        stage = self._stages[name]
+        key = tuple(params[p] for p in stage["inputs"])
+        cache = self._cache[name]
+        with self._lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+            carried = self._carried[name]
+            previous = carried.pop(key) if key in carried else _MISSING
+
+        kwargs = {p: params[p] for p in stage["params"]}
+        kwargs.update({dep: self.get(dep, params) for dep in stage["deps"]})
+        value = stage["func"](**kwargs) if previous is _MISSING else stage["extend"](previous, **kwargs)
+        self.recomputed.append(name)
+
+        with self._lock:
+            cache[key] = value
+            while len(cache) > stage["max_entries"]:
+                cache.popitem(last=False)
+        return value
+
+    def begin_run(self) -> None:
+        '''
+        Starts tracking the stages recomputed by the current thread (one Streamlit rerun).
+        '''
+        self._local.recomputed = []
+
+    @property
+    def recomputed(self) -> list[str]:
+        '''
+        Stages computed (not served from memo) since begin_run in the current thread.
+        '''
+        if not hasattr(self._local, "recomputed"):
+            self._local.recomputed = []
+        return self._local.recomputed
@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+class StageProfiler:
+    """
+    Records wall time, peak allocation and row count of the pipeline stages of one run.
+    - checkpoint(name) closes the stage running since the previous checkpoint (for top-to-bottom scripts)
+    - stage(name) is a context manager around one block
+    Peak allocation is measured with tracemalloc (numpy arrays included) only when trace_memory is set,
+    as tracing slows allocations down. It is process-wide, so concurrent reruns show up in each other's peaks.
+    Tracing left running by a profiler that was never closed (its rerun raised or was stopped) is stopped by
+    the next profiler without trace_memory, or taken over by the next one with it.
+    """
+
+    _tracing_owner = None # profiler that started the running tracemalloc tracing and stops it on close
+    _lock = threading.Lock()
+
+    def __init__(self, trace_memory: bool = False):
+        self.run = datetime.now().isoformat(timespec="milliseconds")
+        self.records = []
+        self.trace_memory = trace_memory
+        with StageProfiler._lock:
+            if trace_memory and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                StageProfiler._tracing_owner = self
+            elif StageProfiler._tracing_owner is not None:
+                if trace_memory:
+                    StageProfiler._tracing_owner = self
+                else:
+                    tracemalloc.stop()
+                    StageProfiler._tracing_owner = None
+        self._start = self._begin()
+
+    def _begin(self) -> tuple[float, int]:
+        if not self.trace_memory:
+            return time.perf_counter(), 0
+        tracemalloc.reset_peak()
+        return time.perf_counter(), tracemalloc.get_traced_memory()[0]
+
+    def _record(self, name: str, start: tuple[float, int], rows: int | None) -> dict:
+        seconds = time.perf_counter() - start[0]
+        peak_mb = (tracemalloc.get_traced_memory()[1] - start[1]) / 1e6 if self.trace_memory else None
+        record = {"stage": name, "seconds": seconds, "peak_mb": peak_mb, "rows": rows}
+        self.records.append(record)
+        return record
+
+    def checkpoint(self, name: str, rows: int | None = None) -> dict:
+        '''
+        Records the stage since the previous checkpoint (or the start of the run) and starts the next one.
+        '''
+        record = self._record(name, self._start, rows)
+        self._start = self._begin()
+        return record
+
+    @contextmanager
+    def stage(self, name: str, rows: int | None = None):
+        '''
+        Records the enclosed block. The yielded record's "rows" can be set inside the block.
+        '''
+        start = self._begin()
+        record = {"rows": rows}
+        try:
+            yield record
+        finally:
+            record.update(self._record(name, start, record["rows"]))
+            self._start = self._begin()
+
+    def to_frame(self) -> pd.DataFrame:
+        '''
+        Returns:
+            One row per recorded stage with seconds, peak_mb and rows
+        '''
+        return pd.DataFrame(self.records, columns=["stage", "seconds", "peak_mb", "rows"])
+
+    def export_jsonl(self, path: str, **meta) -> None:
+        '''
+        Appends one JSON line per recorded stage (tagged with the run timestamp and meta) to path.
+        '''
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a") as f:
+            for record in self.records:
+                f.write(json.dumps({"run": self.run, **meta, **record}) + "\n")
+
+    def __enter__(self) -> "StageProfiler":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        '''
+        Stops tracemalloc if this profiler started it (or took it over).
+        '''
+        with StageProfiler._lock:
+            if StageProfiler._tracing_owner is self:
+                if tracemalloc.is_tracing():
+                    tracemalloc.stop()
+                StageProfiler._tracing_owner = None
@@ -0,0 +1,308 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import data_processing as dp
+
+class SolveStore:
+    """
+    Columnar, append-friendly on-disk store of solve histories, partitioned by cuber, event and year:
+        root/<cuber>/<event>/<year>/date.bin (datetime64[ns]), time_sec.bin (float32, penalty included, DNF = inf),
+        penalty.bin (int8: 0, 2 for +2, -1 for DNF) and scramble.bin + scramble.end.bin (utf-8 text and end offsets)
+    Columns are raw little-endian arrays opened as np.memmap, so a query only pages in the partitions
+    (and, inside them, the binary-searched date range) it touches, and appending new solves writes at
+    the end of the files. Queries stream one partition at a time, so resident memory depends on the
+    size of a cuber-year, not on the total history.
+    """
+
+    COLUMNS = {"date": np.dtype("<M8[ns]"), "time_sec": np.dtype("<f4"), "penalty": np.dtype("<i1")}
+    TEXT_COLUMNS = ("scramble",) # variable length, stored as bytes + int64 end offsets
+    OFFSET = np.dtype("<i8")
+
+    def __init__(self, root: str):
+        self.root = root
+
+    # ----- Layout -----
+
+    @staticmethod
+    def _check_key(key: str) -> str:
+        if not key or key.startswith(".") or os.sep in key or "/" in key:
+            raise ValueError(f"Invalid cuber/event name '{key}'.")
+        return key
+
+    def _dir(self, *keys) -> str:
+        return os.path.join(self.root, *(self._check_key(str(key)) for key in keys))
+
+    def _list(self, path: str) -> list[str]:
+        return sorted(name for name in os.listdir(path) if not name.startswith(".")) if os.path.isdir(path) else []
+
+    def cubers(self) -> list[str]:
+        return self._list(self.root)
+
+    def events(self, cuber: str) -> list[str]:
+        return self._list(self._dir(cuber))
+
+    def years(self, cuber: str, event: str) -> list[int]:
+        return sorted(int(name) for name in self._list(self._dir(cuber, event)) if name.isdigit())
+
+    def _files(self, path: str) -> dict[str, tuple[str, np.dtype]]:
+        '''
+        Fixed-width files of a partition: the columns and the end offsets of the text columns.
+        '''
+        files = {col: (os.path.join(path, f"{col}.bin"), dtype) for col, dtype in self.COLUMNS.items()}
+        files.update({col: (os.path.join(path, f"{col}.end.bin"), self.OFFSET) for col in self.TEXT_COLUMNS})
+        return files
+
+    def _length(self, path: str) -> int:
+        '''
+        Rows of a partition. Columns added after the partition was written (missing files) are ignored.
+        '''
+        sizes = [os.path.getsize(file) // dtype.itemsize for file, dtype in self._files(path).values() if os.path.exists(file)]
+        return min(sizes) if sizes else 0
+
+    def _columns(self, cuber: str, event: str, year: int) -> dict[str, np.ndarray]:
+        '''
+        Memory-maps the columns of one partition (read-only, nothing is loaded until sliced).
+        '''
+        path = self._dir(cuber, event, year)
+        n = self._length(path)
+        columns = {}
+        for col, dtype in self.COLUMNS.items():
+            file = os.path.join(path, f"{col}.bin")
+            columns[col] = np.memmap(file, dtype=dtype, mode="r", shape=(n,)) if n and os.path.exists(file) else np.zeros(n, dtype)
+        return columns
+
+    def _text(self, cuber: str, event: str, year: int, col: str, selection: slice) -> np.ndarray:
+        '''
+        Decodes the rows of a text column of one partition (empty strings where it was never written).
+        '''
+        path = self._dir(cuber, event, year)
+        n = self._length(path)
+        end_file = os.path.join(path, f"{col}.end.bin")
+        rows = range(n)[selection]
+        if not len(rows) or not os.path.exists(end_file):
+            return np.full(len(rows), "", dtype=object)
+        ends = np.memmap(end_file, dtype=self.OFFSET, mode="r", shape=(n,))
+        starts = np.concatenate(([0], ends[:-1]))
+        with open(os.path.join(path, f"{col}.bin"), "rb") as f:
+            f.seek(starts[rows.start])
+            data = f.read(int(ends[rows.stop - 1] - starts[rows.start]))
+        base = starts[rows.start]
+        return np.array([data[a - base:b - base].decode() for a, b in zip(starts[selection], ends[selection])], dtype=object)
+
+    def _write_text(self, path: str, col: str, values, mode: str, base: int = 0) -> None:
+        '''
+        Writes (mode "wb") or appends (mode "ab") text values and their end offsets, counted from base.
+        '''
+        encoded = [str(value).encode() for value in values]
+        ends = base + np.cumsum([len(value) for value in encoded], dtype=np.int64)
+        with open(os.path.join(path, f"{col}.bin"), mode) as f:
+            f.write(b"".join(encoded))
+        with open(os.path.join(path, f"{col}.end.bin"), mode) as f:
+            f.write(ends.astype(self.OFFSET).tobytes())
+
+    def partitions(self, cuber: str | None = None) -> pd.DataFrame:
+        '''
+        Returns:
+            One row per partition with cuber, event, year and solves
+        '''
+        rows = [
+            {"cuber": c, "event": e, "year": y, "solves": self._length(self._dir(c, e, y))}
+            for c in ([cuber] if cuber else self.cubers()) for e in self.events(c) for y in self.years(c, e)
+        ]
+        return pd.DataFrame(rows, columns=["cuber", "event", "year", "solves"])
+
+    # ----- Writing -----
+
+    def append(self, cuber: str, event: str, solves: pd.DataFrame) -> int:
+        """
+        Adds solves ("date", "time_sec" and optionally "penalty", "scramble") to the cuber's event.
+        Solves later than the last stored solve of their year are appended to the column files; a partition
+        receiving older solves is merged and rewritten (stable sort, so solves with equal dates keep their order).
+
+        Returns:
+            Number of solves added
+        """
+        dates = solves["date"].to_numpy(dtype="datetime64[ns]")
+        order = np.argsort(dates, kind="stable")
+        dates = dates[order]
+        values = {
+            "time_sec": solves["time_sec"].to_numpy(dtype=np.float32)[order],
+            "penalty": (solves["penalty"].to_numpy(dtype=np.int8) if "penalty" in solves else np.zeros(len(dates), np.int8))[order],
+        }
+        texts = {col: (solves[col].fillna("").to_numpy(dtype=object) if col in solves else np.full(len(dates), "", dtype=object))[order] for col in self.TEXT_COLUMNS}
+
+        years = dates.astype("datetime64[Y]").astype(np.int64) + 1970
+        bounds = np.flatnonzero(np.diff(years)) + 1
+        for part in np.split(np.arange(len(dates)), bounds):
+            if len(part) == 0:
+                continue
+            year = int(years[part[0]])
+            path = self._dir(cuber, event, year)
+            os.makedirs(path, exist_ok=True)
+            new = {"date": dates[part], **{col: column[part] for col, column in values.items()}}
+            new_text = {col: column[part] for col, column in texts.items()}
+
+            files = self._files(path)
+            n = self._length(path)
+            for col, (file, dtype) in files.items():
+                if not os.path.exists(file): # column added after this partition was written: default values
+                    np.zeros(n, dtype).tofile(file)
+                    if col in self.TEXT_COLUMNS:
+                        open(os.path.join(path, f"{col}.bin"), "wb").close()
+                os.truncate(file, n * dtype.itemsize) # drop the rows of an interrupted append
+            text_ends = {col: self._text_end(path, col, n) for col in self.TEXT_COLUMNS}
+            for col, end in text_ends.items():
+                os.truncate(os.path.join(path, f"{col}.bin"), end)
+
+            stored = self._columns(cuber, event, year)
+            if n and new["date"][0] < stored["date"][-1]:
+                merged = {col: np.concatenate((stored[col], new[col])) for col in self.COLUMNS}
+                order = np.argsort(merged["date"], kind="stable")
+                merged_text = {col: np.concatenate((self._text(cuber, event, year, col, slice(None)), new_text[col]))[order] for col in self.TEXT_COLUMNS}
+                del stored
+                for col, (file, dtype) in files.items():
+                    if col in self.COLUMNS:
+                        merged[col][order].astype(dtype).tofile(file + ".tmp")
+                        os.replace(file + ".tmp", file)
+                for col, text in merged_text.items():
+                    self._write_text(path, col, text, "wb")
+            else:
+                del stored
+                for col in self.COLUMNS:
+                    with open(files[col][0], "ab") as f:
+                        f.write(new[col].astype(self.COLUMNS[col]).tobytes())
+                for col, text in new_text.items():
+                    self._write_text(path, col, text, "ab", base=text_ends[col])
+        return len(dates)
+
+    def _text_end(self, path: str, col: str, n: int) -> int:
+        '''
+        Byte size of the first n values of a text column.
+        '''
+        if n == 0:
+            return 0
+        with open(os.path.join(path, f"{col}.end.bin"), "rb") as f:
+            f.seek((n - 1) * self.OFFSET.itemsize)
+            return int(np.frombuffer(f.read(self.OFFSET.itemsize), dtype=self.OFFSET)[0])
+
+    def import_csv(self, cuber: str, path: str, event: str = "333", chunk_rows: int = 1_000_000) -> int:
+        '''
+        Streams a "date;time" solves file (data.csv layout) into the store chunk by chunk.
+
+        Returns:
+            Number of solves added
+        '''
+        added = 0
+        for chunk in pd.read_csv(path, sep=";", dtype=str, encoding="utf-8-sig", chunksize=chunk_rows):
+            chunk.columns = chunk.columns.str.strip().str.lower()
+            added += self.append(cuber, event, pd.DataFrame({
+                "date": dp.parse_solve_dates(chunk["date"]),
+                "time_sec": dp.parse_solve_times(chunk["time"]),
+            }))
+        return added
+
+    # ----- Queries -----
+
+    def _previous_times(self, cuber: str, event: str, year: int, stop: int, n: int) -> np.ndarray:
+        '''
+        Times of the (up to) n solves before position stop of a partition, reaching back into earlier years.
+        '''
+        parts = []
+        for y in reversed([y for y in self.years(cuber, event) if y <= year]):
+            if n <= 0:
+                break
+            times = self._columns(cuber, event, y)["time_sec"]
+            end = stop if y == year else len(times)
+            parts.append(np.array(times[max(end - n, 0):end], dtype=np.float64))
+            n -= len(parts[-1])
+        return np.concatenate(parts[::-1]) if parts else np.empty(0)
+
+    def chunks(self, cuber: str, event: str, start_date=None, end_date=None, window: int | None = None, scrambles: bool = False):
+        """
+        Yields the selected solves one year partition at a time as frames with date, time_sec, penalty
+        (scramble if requested, z_score with a window, using the solves before the range like the dashboard).
+        Only the window - 1 latest times are carried between partitions.
+        """
+        first_year = None if start_date is None else pd.Timestamp(start_date).year
+        last_year = None if end_date is None else pd.Timestamp(end_date).year
+        tail = None
+        for year in self.years(cuber, event):
+            if (first_year is not None and year < first_year) or (last_year is not None and year > last_year):
+                continue
+            columns = self._columns(cuber, event, year)
+            selection = dp.date_range_slice(columns["date"], start_date, end_date)
+            if selection.stop <= selection.start:
+                continue
+
+            chunk = pd.DataFrame({col: np.array(values[selection]) for col, values in columns.items()})
+            if scrambles:
+                chunk["scramble"] = self._text(cuber, event, year, "scramble", selection)
+            if window:
+                if tail is None:
+                    tail = self._previous_times(cuber, event, year, selection.start, window - 1)
+                values = np.concatenate((tail, chunk["time_sec"].to_numpy(np.float64)))
+                _, _, z = dp.RollingStats(values).z_score(window)
+                chunk["z_score"] = z[len(tail):].astype(np.float32)
+                tail = values[len(values) - (window - 1):]
+            yield chunk
+
+    def read(self, cuber: str, event: str, start_date=None, end_date=None, window: int | None = None, scrambles: bool = False) -> pd.DataFrame:
+        '''
+        Materializes the solves of a date range (only the partitions it overlaps are read).
+        '''
+        chunks = list(self.chunks(cuber, event, start_date, end_date, window, scrambles))
+        if not chunks:
+            empty = pd.DataFrame({col: np.empty(0, dtype) for col, dtype in self.COLUMNS.items()})
+            if scrambles:
+                empty["scramble"] = np.empty(0, dtype=object)
+            return empty.assign(z_score=np.empty(0, np.float32)) if window else empty
+        return pd.concat(chunks, ignore_index=True)
+
+    def session_stats(self, cuber: str, event: str, start_date=None, end_date=None, session_max_gap_sec: int = 600, window: int | None = None) -> pd.DataFrame:
+        """
+        compute_session_stats of a date range, streamed over the partitions.
+        The last (possibly unfinished) session of a partition is carried into the next one,
+        so sessions crossing New Year are not split.
+
+        Returns:
+            Frame indexed by session_id (numbered from 0 within the range)
+        """
+        pieces = []
+        carry = None
+        next_id = 0
+        for chunk in self.chunks(cuber, event, start_date, end_date, window):
+            if carry is not None:
+                chunk = pd.concat([carry, chunk], ignore_index=True)
+            offsets = dp.GapIndex(chunk["date"].to_numpy()).sessions(session_max_gap_sec).offsets
+            complete = int(offsets[-2])
+            if complete > 0:
+                sessions = dp.SessionIndex(offsets[:-1], np.arange(next_id, next_id + len(offsets) - 2))
+                pieces.append(dp.compute_session_stats(chunk.iloc[:complete], sessions))
+                next_id += len(sessions)
+            carry = chunk.iloc[complete:].reset_index(drop=True)
+
+        if carry is not None and len(carry):
+            pieces.append(dp.compute_session_stats(carry, dp.SessionIndex(np.array([0, len(carry)]), np.array([next_id]))))
+        if not pieces:
+            return dp.compute_session_stats(pd.DataFrame({"date": np.empty(0, "datetime64[ns]"), "time_sec": np.empty(0)}), dp.SessionIndex(np.zeros(1)))
+        return pd.concat(pieces)
+
+    def rollup(self, cuber: str, event: str, level: str, start_date=None, end_date=None, window: int = 500) -> pd.DataFrame:
+        '''
+        RollupCube.rollup of a date range (e.g. "weekday_hour" for the heatmap), built per partition
+        and merged by adding the sums, so only one partition's cube is in memory at a time.
+        '''
+        parts = []
+        for chunk in self.chunks(cuber, event, start_date, end_date, window):
+            dates = chunk["date"].to_numpy()
+            cube = dp.RollupCube(dates, chunk["time_sec"].to_numpy(), chunk["z_score"].to_numpy(), np.zeros(len(dates), dtype=np.int32))
+            parts.append(cube.rollup(level)[dp.RollupCube.SUMS])
+        if not parts:
+            return dp.rollup_statistics(pd.DataFrame(columns=dp.RollupCube.SUMS, dtype=np.float64))
+
+        sums = pd.concat(parts)
+        sums = sums.groupby(level=list(range(sums.index.nlevels))).sum()
+        sums = sums.sort_index(key=lambda keys: keys.map(dp.WEEKDAYS.index) if keys.name == "weekday" else keys) # calendar order, not alphabetical
+        return dp.rollup_statistics(sums)
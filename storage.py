@@ -0,0 +1,320 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = ".cache"
+
+HASH_BLOCK = 1 << 20 # bytes per content hash of the cached sources
+
+def block_hashes(path: str, start: int = 0, stop: int | None = None, block_size: int = HASH_BLOCK) -> list[str]:
+    """Returns the sha1 hex digests of the blocks of block_size bytes of a file between start (a block boundary) and stop"""
+    digests = []
+    remaining = (os.path.getsize(path) if stop is None else stop) - start
+    with open(path, "rb") as f:
+        f.seek(start)
+        while remaining > 0:
+            chunk = f.read(min(block_size, remaining))
+            if not chunk:
+                break
+            digests.append(hashlib.sha1(chunk).hexdigest())
+            remaining -= len(chunk)
+    return digests
+
+def save_frame(df: pd.DataFrame, path: str) -> None:
+    '''
+    Saves a dataframe as a binary npz file, one array per column (no pickling).
+    Object/string columns are stored as fixed-width unicode arrays, categoricals as codes plus categories.
+    '''
+    arrays = {"__index__": df.index.to_numpy()}
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            arrays[f"__categories__{col}"] = df[col].cat.categories.to_numpy().astype(str)
+            arrays[f"__ordered__{col}"] = np.array(df[col].cat.ordered)
+            values = df[col].cat.codes.to_numpy()
+        else:
+            values = df[col].to_numpy()
+        if values.dtype == object:
+            values = values.astype(str)
+        arrays[col] = values
+
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+def load_frame(path: str) -> pd.DataFrame:
+    '''
+    Loads a dataframe written by save_frame.
+    '''
+    with np.load(path, allow_pickle=False) as data:
+        columns = {}
+        for name in data.files:
+            if name.startswith("__"):
+                continue
+            columns[name] = data[name]
+            if f"__categories__{name}" in data.files:
+                columns[name] = pd.Categorical.from_codes(
+                    data[name],
+                    categories=data[f"__categories__{name}"],
+                    ordered=bool(data[f"__ordered__{name}"])
+                )
+        index = data["__index__"]
+    return pd.DataFrame(columns, index=index)
+
+class FrameCache:
+    """
+    Binary cache of the frame prepared from a source file that grows by appending (like "data.csv").
+    - load() reuses the cache while the source is unchanged: same size and mtime, or same content hash
+    - When the source only grew, extend(frame, offset) prepares the rows appended after byte offset; they are saved
+      as a new segment file next to the cache instead of rewriting it, and the segments are merged into one file
+      once there are max_segments of them
+    - The content is hashed in HASH_BLOCK blocks: growth is checked on the last cached block only, so an append
+      costs O(appended bytes) (an edit of earlier rows in the same write goes unnoticed), while a change that
+      keeps the size re-hashes every block
+    params are any other inputs of the frame (e.g. the session gap); a change in them rebuilds the cache.
+    """
+
+    def __init__(self, source_path: str, params: dict, cache_dir: str = CACHE_DIR, max_segments: int = 32):
+        self.source_path = source_path
+        self.params = params
+        self.max_segments = max_segments
+        os.makedirs(cache_dir, exist_ok=True)
+        key = hashlib.sha1(json.dumps([os.path.abspath(source_path), params], sort_keys=True).encode()).hexdigest()[:16]
+        self._base_path = os.path.join(cache_dir, key)
+        self.meta = {}
+
+    def _data_path(self, segment: int) -> str:
+        return f"{self._base_path}.npz" if segment == 0 else f"{self._base_path}.{segment}.npz"
+
+    def _read_meta(self) -> dict:
+        if not os.path.exists(self._base_path + ".json") or not os.path.exists(self._data_path(0)):
+            return {}
+        with open(self._base_path + ".json") as f:
+            meta = json.load(f)
+        return meta if "blocks" in meta else {} # caches of older versions hashed the whole file
+
+    def _write_meta(self, meta: dict) -> None:
+        tmp_path = self._base_path + ".json.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._base_path + ".json")
+        self.meta = meta
+
+    def _read_frame(self, meta: dict) -> pd.DataFrame:
+        frames = [load_frame(self._data_path(segment)) for segment in range(meta["segments"] + 1)]
+        return frames[0] if len(frames) == 1 else pd.concat(frames)
+
+    def _save(self, df: pd.DataFrame, stat) -> None:
+        save_frame(df, self._data_path(0))
+        self._write_meta({
+            "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "segments": 0,
+            "blocks": block_hashes(self.source_path, 0, stat.st_size), "params": self.params
+        })
+
+    def _grown(self, meta: dict, stat) -> bool:
+        '''True if the source is larger than the cached one and its last cached block is unchanged.'''
+        if not meta or stat.st_size <= meta["size"] or meta["size"] == 0:
+            return False
+        last = (meta["size"] - 1) // HASH_BLOCK
+        return block_hashes(self.source_path, last * HASH_BLOCK, meta["size"]) == meta["blocks"][last:]
+
+    def _unchanged(self, meta: dict, stat) -> dict | None:
+        '''
+        Returns:
+            meta (with the new mtime if only the mtime changed) if the source has the cached content, else None
+        '''
+        if not meta or meta["size"] != stat.st_size:
+            return None
+        if meta["mtime_ns"] != stat.st_mtime_ns:
+            if block_hashes(self.source_path, 0, stat.st_size) != meta["blocks"]:
+                return None
+            meta = {**meta, "mtime_ns": stat.st_mtime_ns}
+            self._write_meta(meta)
+        return meta
+
+    def _save_appended(self, meta: dict, df: pd.DataFrame, new: pd.DataFrame, stat) -> None:
+        '''Saves the rows appended to the cached frame df as a segment, or the whole frame once there are too many.'''
+        if meta["segments"] + 1 >= self.max_segments:
+            self._save(pd.concat([df, new]), stat)
+            return
+        save_frame(new, self._data_path(meta["segments"] + 1))
+        last = (meta["size"] - 1) // HASH_BLOCK
+        self._write_meta({
+            **meta, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "segments": meta["segments"] + 1,
+            "blocks": meta["blocks"][:last] + block_hashes(self.source_path, last * HASH_BLOCK, stat.st_size)
+        })
+
+    def load(self, build, extend=None) -> pd.DataFrame:
+        """
+        Returns build() for the source, reusing the cache while the source is unchanged.
+        If the source only grew and extend is given, extend(cached frame, cached size) prepares the appended rows;
+        it may return None to force a full rebuild.
+
+        Returns:
+            The prepared dataframe
+        """
+        stat = os.stat(self.source_path)
+        meta = self._read_meta()
+        unchanged = self._unchanged(meta, stat)
+        if unchanged is not None:
+            self.meta = unchanged
+            return self._read_frame(unchanged)
+
+        if extend is not None and self._grown(meta, stat):
+            df = self._read_frame(meta)
+            new = extend(df, meta["size"])
+            if new is not None:
+                self._save_appended(meta, df, new, stat)
+                return pd.concat([df, new]) if len(new) else df
+
+        df = build()
+        self._save(df, stat)
+        return df
+
+    def append(self, df: pd.DataFrame, extend) -> pd.DataFrame | None:
+        """
+        Rows appended to the source since the last load/append of this cache, where df is the frame as of then:
+        extend(df, offset) prepares the rows after byte offset, and they are saved as a segment of the cache.
+
+        Returns:
+            The new rows (empty if the source is unchanged), or None if the source changed in another way
+            or extend returned None (load again)
+        """
+        stat = os.stat(self.source_path)
+        unchanged = self._unchanged(self.meta, stat)
+        if unchanged is not None:
+            self.meta = unchanged
+            return df.iloc[:0]
+        if not self._grown(self.meta, stat):
+            return None
+        new = extend(df, self.meta["size"])
+        if new is not None:
+            self._save_appended(self.meta, df, new, stat)
+        return new
+
+def _ascii_digits(values: np.ndarray, width: int) -> np.ndarray:
+    powers = 10 ** np.arange(width - 1, -1, -1)
+    return (values[:, None] // powers % 10 + ord("0")).astype(np.uint8)
+
+def write_solves_csv(df: pd.DataFrame, path: str, append: bool = False) -> None:
+    '''
+    Writes a history in the "date;time" layout of data.csv ("dd/mm/yyyy hh:mm;mm:ss.xx"),
+    composing the fixed-width lines as one byte matrix instead of formatting rows one by one.
+    With append, the rows are added at the end of an existing file (no header).
+    '''
+    dates = df["date"].to_numpy().astype("datetime64[m]")
+    days = dates.astype("datetime64[D]")
+    months = dates.astype("datetime64[M]")
+    years = dates.astype("datetime64[Y]").astype(np.int64) + 1970
+    minutes_of_day = (dates - days).astype(np.int64)
+
+    centis = np.round(np.minimum(df["time_sec"].to_numpy(np.float64), 3599.99) * 100).astype(np.int64)
+
+    columns = [
+        _ascii_digits((days - months).astype(np.int64) + 1, 2), "/",
+        _ascii_digits(months.astype(np.int64) % 12 + 1, 2), "/",
+        _ascii_digits(years, 4), " ",
+        _ascii_digits(minutes_of_day // 60, 2), ":",
+        _ascii_digits(minutes_of_day % 60, 2), ";",
+        _ascii_digits(centis // 6000, 2), ":",
+        _ascii_digits(centis // 100 % 60, 2), ".",
+        _ascii_digits(centis % 100, 2), "\n",
+    ]
+    lines = np.hstack([
+        np.full((len(df), 1), ord(c), dtype=np.uint8) if isinstance(c, str) else c
+        for c in columns
+    ])
+
+    with open(path, "ab" if append else "wb") as f:
+        if not append:
+            f.write(b"Date;Time\n")
+        f.write(lines.tobytes())
+
+def frame_hash(df: pd.DataFrame) -> str:
+    """Returns a sha1 of the content of a dataframe (values, index, column names and dtypes)"""
+    digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    digest.update(repr([(str(col), str(dtype)) for col, dtype in df.dtypes.items()]).encode())
+    return digest.hexdigest()
+
+class FrameExporter:
+    """
+    Writes dataframes to out_dir as Parquet (plus CSV for the names in csv) on a background thread.
+    - A frame is only written when its content hash differs from the last written one
+    - Exports queued while the worker is busy are coalesced, only the latest frame per name is written
+    write_seconds keeps the duration of the last write per name (hash check included).
+    errors keeps the error of the last failed write per name (cleared by the next successful one); failures are also logged.
+    """
+
+    def __init__(self, out_dir: str, csv: tuple = ()):
+        self.out_dir = out_dir
+        self.csv = set(csv)
+        self._hashes = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._future = None
+        self.write_seconds = {}
+        self.errors = {}
+
+    def export(self, frames: dict[str, pd.DataFrame]) -> None:
+        '''
+        Queues frames ({name: frame}) for export and returns immediately. Frames must not be mutated afterwards.
+        '''
+        with self._lock:
+            self._pending.update(frames)
+            if self._future is None or self._future.done():
+                self._future = self._executor.submit(self._drain)
+
+    def wait(self) -> None:
+        '''
+        Blocks until all queued exports are written.
+        '''
+        while True:
+            with self._lock:
+                future = self._future
+            if future is None:
+                return
+            future.result()
+            with self._lock:
+                if self._future is future and not self._pending:
+                    return
+
+    def _drain(self) -> None:
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return
+                name, df = self._pending.popitem()
+
+            start = time.perf_counter()
+            digest = frame_hash(df)
+            if self._hashes.get(name) == digest:
+                continue
+            try:
+                self._write(name, df)
+            except Exception as e: # keep draining the other frames, the next export of this one retries
+                logger.exception("Export of '%s' to %s failed", name, self.out_dir)
+                self.errors[name] = f"{type(e).__name__}: {e}"
+                continue
+            self._hashes[name] = digest
+            self.errors.pop(name, None)
+            self.write_seconds[name] = time.perf_counter() - start
+
+    def _write(self, name: str, df: pd.DataFrame) -> None:
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, f"{name}.parquet")
+        df.to_parquet(path + ".tmp", engine="pyarrow")
+        os.replace(path + ".tmp", path)
+
+        if name in self.csv:
+            path = os.path.join(self.out_dir, f"{name}.csv")
+            df.to_csv(path + ".tmp")
+            os.replace(path + ".tmp", path)
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+# Share of practice sessions starting at each hour of the day (afternoon/evening peaks, almost nothing at night)
+HOUR_WEIGHTS = np.array([
+    0.5, 0.2, 0.1, 0.0, 0.0, 0.0, 0.1, 0.5, 1.0, 1.5, 2.0, 2.5,
+    3.0, 3.5, 4.5, 5.5, 6.0, 6.0, 5.5, 5.5, 5.0, 4.0, 2.5, 1.0
+])
+
+SOLVES_PER_YEAR = 9000
+
+def generate_solves(
+    n_solves: int,
+    seed: int = 0,
+    start: str = "2018-07-24",
+    start_mean: float = 25.0,
+    floor_mean: float = 7.5,
+    mean_session_size: float = 25.0,
+    years: float | None = None
+) -> pd.DataFrame:
+    """
+    Generates a realistic, reproducible solve history:
+    - Sessions spread over years (default: ~9000 solves per year like data.csv, at most 60 years so
+      10M solves still fit datetime64), start hours following HOUR_WEIGHTS, sessions never overlap
+    - Lognormal session sizes, 8-25 s between solves (scramble + inspection) and at least 11 min between sessions
+    - Mean time improving exponentially from start_mean towards floor_mean over the history
+    - Time-of-day effect (best in the afternoon), warm-up and fatigue within sessions, lognormal noise and pops
+
+    Returns:
+        Frame with "date" (datetime64, second resolution) and "time_sec", sorted by date
+    """
+    rng = np.random.default_rng(seed)
+
+    # ----- Sessions -----
+    sizes = np.empty(0, dtype=np.int64)
+    while sizes.sum() < n_solves:
+        batch = rng.lognormal(np.log(mean_session_size) - 0.5, 1.0, size=max(16, int(1.2 * n_solves / mean_session_size)))
+        sizes = np.concatenate((sizes, np.clip(batch.astype(np.int64), 1, 400)))
+    sizes = sizes[:np.searchsorted(np.cumsum(sizes), n_solves) + 1]
+    sizes[-1] -= sizes.sum() - n_solves
+    n_sessions = len(sizes)
+
+    if years is None:
+        years = min(max(n_solves / SOLVES_PER_YEAR, 1), 60)
+    day = np.sort(rng.integers(0, int(365 * years), n_sessions)) # rest days appear where no session lands
+    hour = rng.choice(24, size=n_sessions, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum())
+    planned = day * 86400.0 + hour * 3600.0 + rng.uniform(0, 3600, n_sessions)
+    planned = np.sort(planned)
+
+    # ----- Solves -----
+    session = np.repeat(np.arange(n_sessions), sizes)
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+    position = np.arange(n_solves) - offsets[session]
+    relative = position / np.maximum(sizes[session] - 1, 1)
+
+    progress = np.arange(n_solves) / max(n_solves - 1, 1)
+    skill = floor_mean + (start_mean - floor_mean) * np.exp(-5 * progress)
+
+    spacing = rng.uniform(8, 25, n_solves) # scramble + inspection + solve
+    within = np.cumsum(spacing) - np.repeat(np.cumsum(spacing)[offsets[:-1]] - spacing[offsets[:-1]], sizes)
+    durations = within[offsets[1:] - 1]
+
+    # Push sessions that would overlap the previous one: start_k = max(planned_k, end_(k-1) + 11 min)
+    occupied = np.concatenate(([0.0], np.cumsum(durations[:-1] + 660)))
+    session_start = np.maximum.accumulate(planned - occupied) + occupied
+    seconds = session_start[session] + within
+
+    hour_of_day = (seconds % 86400) / 3600
+    time_of_day = 1 - 0.03 * np.cos((hour_of_day - 16) / 24 * 2 * np.pi) # fastest around 16:00
+    fatigue = 1 + 0.05 * np.exp(-position / 3) + 0.06 * relative ** 4
+    times = skill * time_of_day * fatigue * rng.lognormal(0, 0.12, n_solves)
+    pops = rng.random(n_solves) < 0.03
+    times[pops] += rng.uniform(2, 6, pops.sum())
+
+    dates = np.datetime64(start, "s") + np.round(seconds).astype("timedelta64[s]")
+    return pd.DataFrame({"date": dates.astype("datetime64[ns]"), "time_sec": np.round(times, 2)})
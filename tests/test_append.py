@@ -0,0 +1,122 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import data_processing as dp
+import storage
+from pipeline import StageGraph
+
+def _raw_solves(seed: int, n: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp("2025-12-28 09:00") + pd.to_timedelta(np.cumsum(rng.exponential(400, n)).round(), unit="s") # crosses a new year
+    times = rng.gamma(20, 0.6, n)
+    return pd.DataFrame({"date": dates.strftime("%d/%m/%Y %H:%M:%S"), "time": [f"00:{t:05.2f}" for t in times]})
+
+def _write(path, raw: pd.DataFrame, append: bool = False) -> None:
+    with open(path, "a" if append else "w") as f:
+        if not append:
+            f.write("Date;Time\n")
+        f.writelines(f"{date};{time}\n" for date, time in zip(raw["date"], raw["time"]))
+
+def test_solve_log_appends_match_a_full_preparation():
+    raw = _raw_solves(0, 3000)
+    log = dp.SolveLog(dp.prepare_base_dataframe(raw.iloc[:1000], 600))
+    first = log.frame()
+    for start, stop in ((1000, 1001), (1001, 1001), (1001, 2400), (2400, 3000)):
+        new = dp.prepare_appended_solves(log.frame(), raw.iloc[start:stop], 600)
+        log.append(new)
+    pd.testing.assert_frame_equal(log.frame(), dp.prepare_base_dataframe(raw, 600), check_index_type=False)
+    assert len(first) == 1000 # frames taken earlier keep their solves
+    assert not log.frame()["time_sec"].to_numpy().flags.writeable
+    assert dp.prepare_appended_solves(log.frame(), raw.iloc[:5], 600) is None # reaches back, full rebuild
+
+def test_extended_gaps_and_cube_match_a_rebuild():
+    df = dp.prepare_base_dataframe(_raw_solves(1, 4000), 600)
+    dates, times = df["date"].to_numpy(), df["time_sec"].to_numpy()
+    z = dp.RollingStats(times).z_score(50)[2]
+    gaps = dp.GapIndex(dates[:1500])
+    sessions = gaps.sessions(600)
+    cube = dp.RollupCube(dates[:1500], times[:1500], z[:1500], sessions.session_ids)
+    for n in (1501, 1502, 2900, 4000):
+        gaps = gaps.extended(dates[:n])
+        sessions = gaps.sessions(600)
+        cube = cube.extended(dates[:n], times[:n], z[:n], sessions.session_ids)
+        rebuilt = dp.GapIndex(dates[:n])
+        for threshold in (600, 60): # threshold 60 was never split before the appends
+            extended, expected = gaps.sessions(threshold), rebuilt.sessions(threshold)
+            for name in ("offsets", "ids", "session_ids", "positions"):
+                np.testing.assert_array_equal(getattr(extended, name), getattr(expected, name))
+        np.testing.assert_array_equal(gaps.sorted_gaps, rebuilt.sorted_gaps)
+
+        expected = dp.RollupCube(dates[:n], times[:n], z[:n], rebuilt.sessions(600).session_ids)
+        pd.testing.assert_frame_equal(cube.weekly(), expected.weekly())
+        pd.testing.assert_frame_equal(cube.rollup("weekday_hour"), expected.rollup("weekday_hour"), rtol=1e-12)
+
+def test_frame_cache_appends_segments_and_detects_rewrites(tmp_path):
+    raw = _raw_solves(2, 2000)
+    source = tmp_path / "data.csv"
+    _write(source, raw.iloc[:1200])
+    build = lambda: dp.prepare_base_dataframe(dp.read_solves_csv(str(source)), 600)
+    extend = lambda df, offset: dp.prepare_appended_solves(df, dp.read_solves_csv(str(source), offset), 600)
+    cache = storage.FrameCache(str(source), {"gap": 600}, cache_dir=str(tmp_path / "cache"), max_segments=3)
+
+    df = cache.load(build, extend)
+    assert len(cache.append(df, extend)) == 0 # unchanged
+    for start, stop, segments in ((1200, 1500, 1), (1500, 1700, 2), (1700, 2000, 0)): # the third append merges the segments
+        _write(source, raw.iloc[start:stop], append=True)
+        new = cache.append(df, extend)
+        assert len(new) == stop - start
+        df = pd.concat([df, new])
+        assert cache.meta["segments"] == segments
+    expected = dp.prepare_base_dataframe(raw, 600)
+    pd.testing.assert_frame_equal(df, expected, check_index_type=False)
+
+    _write(source, raw.iloc[:1000])
+    assert cache.append(df, extend) is None # rewritten, load again
+    fresh = storage.FrameCache(str(source), {"gap": 600}, cache_dir=str(tmp_path / "cache"))
+    pd.testing.assert_frame_equal(fresh.load(build, extend), dp.prepare_base_dataframe(raw.iloc[:1000], 600), check_index_type=False)
+
+def test_segments_are_read_back_on_load(tmp_path):
+    raw = _raw_solves(3, 900)
+    source = tmp_path / "data.csv"
+    _write(source, raw.iloc[:600])
+    build = lambda: dp.prepare_base_dataframe(dp.read_solves_csv(str(source)), 600)
+    extend = lambda df, offset: dp.prepare_appended_solves(df, dp.read_solves_csv(str(source), offset), 600)
+    cache_dir = str(tmp_path / "cache")
+
+    storage.FrameCache(str(source), {}, cache_dir=cache_dir).load(build, extend)
+    _write(source, raw.iloc[600:900], append=True)
+    storage.FrameCache(str(source), {}, cache_dir=cache_dir).load(build, extend) # grown since the cache: saved as a segment
+    cache = storage.FrameCache(str(source), {}, cache_dir=cache_dir)
+    df = cache.load(lambda: None, extend)
+    assert cache.meta["segments"] == 1
+    pd.testing.assert_frame_equal(df, dp.prepare_base_dataframe(raw, 600), check_index_type=False)
+    os.utime(source) # same content, new mtime
+    pd.testing.assert_frame_equal(storage.FrameCache(str(source), {}, cache_dir=cache_dir).load(lambda: None), df)
+
+def test_graph_extends_the_results_of_the_previous_graph():
+    calls = []
+
+    def build(history, previous=None):
+        graph = StageGraph(previous=previous)
+
+        @graph.stage(params=("n",), extend=lambda previous, n: previous + history[len(previous):])
+        def total(n):
+            calls.append(n)
+            return list(history)
+
+        @graph.stage(deps=("total",))
+        def size(total):
+            return len(total)
+        return graph
+
+    graph = build([1, 2, 3])
+    assert graph.get("size", {"n": 1}) == 3
+    graph.get("total", {"n": 2})
+    graph = build([1, 2, 3, 4], graph) # n=2 is not requested from this graph, it is carried over
+    assert graph.get("size", {"n": 1}) == 4
+    graph = build([1, 2, 3, 4, 5], graph)
+    assert graph.get("total", {"n": 2}) == [1, 2, 3, 4, 5]
+    assert graph.get("total", {"n": 3}) == [1, 2, 3, 4, 5]
+    assert calls == [1, 2, 3] # n=1 and n=2 extended, only n=3 computed from scratch
@@ -0,0 +1,47 @@
+import numpy as np
+from sklearn.metrics import adjusted_rand_score
+
+import data_processing as dp
+
+def _features(seed: int, n: int = 600) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = np.array([[5, 1], [20, 3], [40, 8], [80, 2]])
+    return centers[rng.integers(0, len(centers), n)] + rng.normal(0, 3, (n, 2))
+
+def test_labels_do_not_depend_on_earlier_fits():
+    features = _features(0)
+    cold = dp.ClusteringStage(random_state=1).fit_predict(features, 4)
+
+    stage = dp.ClusteringStage(random_state=1)
+    stage.fit_predict(_features(1), 4)
+    stage.fit_predict(_features(2), 3)
+    stage.sweep(_features(3), range(2, 8))
+    assert np.array_equal(stage.fit_predict(features, 4), cold)
+
+def test_refit_after_eviction_reproduces_labels():
+    features = _features(4)
+    stage = dp.ClusteringStage(random_state=1, max_entries=1)
+    first = stage.fit_predict(features, 4)
+    stage.fit_predict(_features(5), 4) # evicts the labels
+    assert np.array_equal(stage.fit_predict(features, 4), first)
+
+def test_sweep_chain_is_deterministic_and_close_to_individual_fits():
+    features = _features(6)
+    sweep = dp.ClusteringStage(random_state=1).sweep(features, [2, 3, 4, 5])
+
+    stage = dp.ClusteringStage(random_state=1)
+    stage.fit_predict(_features(7), 5, warm_start=True)
+    stage.sweep(_features(8), range(2, 8))
+    assert stage.sweep(features, [2, 3, 4, 5]).equals(sweep)
+
+    assert sweep["inertia"].iloc[0] == dp.ClusteringStage(random_state=1)._fit(features, 2)[1]
+    for k, inertia in zip(sweep["k"], sweep["inertia"]):
+        assert inertia <= 1.05 * dp.ClusteringStage(random_state=1)._fit(features, k)[1]
+
+def test_opt_in_warm_start_follows_the_last_fit():
+    features = _features(9)
+    stage = dp.ClusteringStage(random_state=1)
+    stage.fit_predict(features[:-50], 4)
+    warm = stage.fit_predict(features, 4, warm_start=True)
+    cold = dp.ClusteringStage(random_state=1).fit_predict(features, 4)
+    assert adjusted_rand_score(warm, cold) > 0.95
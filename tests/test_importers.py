@@ -0,0 +1,128 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_processing as dp
+import importers
+from solve_store import SolveStore
+
+def _cstimer_solves(seed: int, n: int, start: int):
+    rng = np.random.default_rng(seed)
+    penalties = rng.choice([0, 0, 0, 2000, -1], n)
+    return [
+        [[int(p), int(ms)], f"R U R' {i}", "", start + 90 * i]
+        for i, (p, ms) in enumerate(zip(penalties, rng.integers(7000, 20000, n)))
+    ]
+
+def _naive_cstimer(document: dict) -> pd.DataFrame:
+    rows = []
+    for key, solves in document.items():
+        if not key.startswith("session") or key == "sessionData":
+            continue
+        for (penalty, ms), scramble, _, timestamp in (json.loads(solves) if isinstance(solves, str) else solves):
+            time_sec = np.inf if penalty == -1 else (ms + penalty) / 1000
+            code = importers.PENALTY_DNF if penalty == -1 else importers.PENALTY_PLUS_TWO if penalty else importers.PENALTY_NONE
+            rows.append((key, pd.Timestamp(timestamp, unit="s").to_datetime64(), time_sec, code, scramble))
+    return pd.DataFrame(rows, columns=["session", "date", "time_sec", "penalty", "scramble"])
+
+def test_json_stream_walks_values_across_buffer_refills():
+    document = {"a": [1.25, -3, "x y", {"k": [1, 2]}, None, True, 12345678901234], "b": "z"}
+    stream = importers._JsonStream(io.StringIO(json.dumps(document)), read_bytes=3) # numbers split across reads
+    stream.expect("{")
+    assert stream.value() == "a"
+    stream.expect(":")
+    stream.expect("[")
+    values = []
+    while not stream.consume("]"):
+        values.append(stream.value())
+        stream.consume(",")
+    assert values == document["a"]
+
+@pytest.mark.parametrize("chunk_rows", [1, 7, 1000])
+def test_cstimer_matches_json_load(tmp_path, chunk_rows):
+    document = {
+        "session1": _cstimer_solves(0, 25, 1_600_000_000),
+        "session2": json.dumps(_cstimer_solves(1, 10, 1_700_000_000)), # older exports store sessions as strings
+        "properties": {"sessionData": json.dumps({"1": {"name": "3x3"}})},
+    }
+    path = tmp_path / "cstimer.txt"
+    path.write_text(json.dumps(document))
+    chunks = list(importers.iter_cstimer_json(str(path), chunk_rows=chunk_rows))
+    assert all(len(chunk) <= chunk_rows for chunk in chunks)
+    result = pd.concat(chunks, ignore_index=True)
+    expected = _naive_cstimer(document)
+    pd.testing.assert_frame_equal(result, expected.astype(result.dtypes.to_dict()))
+
+def test_delimited_results_and_penalties(tmp_path):
+    path = tmp_path / "prisma.csv"
+    path.write_text(
+        "Date,Time,Penalty,Scramble\n"
+        "2024-03-01 10:00:00,12.34,,F R U\n"
+        "2024-03-01 10:01:00,1:02.50,,F R U\n"
+        "2024-03-01 10:02:00,14.34+,,F R U\n"
+        "2024-03-01 10:03:00,11.00,+2,F R U\n"
+        "2024-03-01 10:04:00,DNF(12.34),,F R U\n"
+        "2024-03-01 10:05:00,10.00,DNF,F R U\n"
+        "2024-03-01 10:06:00,DNS,,F R U\n"
+        "2024-03-01 10:07:00,oops,,F R U\n"
+    )
+    result = pd.concat(importers.iter_delimited(str(path), chunk_rows=3), ignore_index=True)
+    np.testing.assert_array_equal(result["time_sec"], [12.34, 62.5, 14.34, 13.0, np.inf, np.inf])
+    np.testing.assert_array_equal(result["penalty"], [0, 0, 2, 2, -1, -1])
+    np.testing.assert_array_equal(result["date"], pd.date_range("2024-03-01 10:00", periods=6, freq="min").to_numpy())
+    assert (result["scramble"] == "F R U").all()
+
+def test_delimited_epoch_and_day_first_dates(tmp_path):
+    epoch = tmp_path / "epoch.csv"
+    epoch.write_text("timestamp;time\n1700000000000;9.87\n1700000060000;8.76\n")
+    result = next(importers.iter_delimited(str(epoch)))
+    np.testing.assert_array_equal(result["date"], pd.to_datetime([1700000000, 1700000060], unit="s").to_numpy())
+
+    day_first = tmp_path / "data.csv"
+    day_first.write_text("Date;Time\n05/02/2024 10:00;00:09.50\n")
+    assert next(importers.iter_delimited(str(day_first)))["date"].iloc[0] == pd.Timestamp("2024-02-05 10:00")
+
+def test_wca_rows_give_one_solve_per_attempt(tmp_path):
+    path = tmp_path / "wca.tsv"
+    path.write_text(
+        "competitionId\tyear\tmonth\tday\tvalue1\tvalue2\tvalue3\tvalue4\tvalue5\n"
+        "Open2023\t2023\t5\t20\t950\t-1\t1012\t-2\t880\n"
+        "Open2024\t2024\t6\t1\t700\t812\t0\t0\t0\n"
+    )
+    result = next(importers.iter_delimited(str(path)))
+    np.testing.assert_array_equal(result["time_sec"], [9.5, np.inf, 10.12, 8.8, 7.0, 8.12])
+    np.testing.assert_array_equal(result["penalty"], [0, -1, 0, 0, 0, 0])
+    assert result["session"].tolist() == ["Open2023"] * 4 + ["Open2024"] * 2
+    assert result["date"].dt.date.astype(str).tolist() == ["2023-05-20"] * 4 + ["2024-06-01"] * 2
+
+def test_export_to_csv_round_trips_finite_solves(tmp_path):
+    document = {"session1": _cstimer_solves(2, 40, 1_650_000_000)}
+    source = tmp_path / "cstimer.txt"
+    source.write_text(json.dumps(document))
+    out = tmp_path / "data.csv"
+    written = importers.export_to_csv(str(source), str(out), chunk_rows=6)
+
+    expected = _naive_cstimer(document)
+    expected = expected[np.isfinite(expected["time_sec"])]
+    parsed = dp.read_solves_csv(str(out))
+    assert written == len(expected) == len(parsed)
+    np.testing.assert_array_equal(pd.to_datetime(dp.parse_solve_dates(parsed["date"])).to_numpy(), expected["date"].dt.floor("min").to_numpy())
+    np.testing.assert_allclose(dp.parse_solve_times(parsed["time"]), expected["time_sec"], atol=0.005 + 1e-9) # centiseconds
+
+def test_import_to_store_keeps_penalties(tmp_path):
+    document = {"session1": _cstimer_solves(3, 30, 1_600_000_000), "session2": _cstimer_solves(4, 5, 1_500_000_000)}
+    source = tmp_path / "cstimer.txt"
+    source.write_text(json.dumps(document))
+    store = SolveStore(str(tmp_path / "store"))
+    assert importers.import_to_store(store, "me", str(source), chunk_rows=4, sessions=["session1"]) == 30
+
+    expected = _naive_cstimer(document)
+    expected = expected[expected["session"] == "session1"].sort_values("date", kind="stable")
+    stored = store.read("me", "333", scrambles=True)
+    np.testing.assert_array_equal(stored["date"].to_numpy(dtype="datetime64[ns]"), expected["date"].to_numpy())
+    np.testing.assert_allclose(stored["time_sec"], expected["time_sec"], rtol=1e-6)
+    np.testing.assert_array_equal(stored["penalty"], expected["penalty"])
+    assert stored["scramble"].tolist() == expected["scramble"].tolist()
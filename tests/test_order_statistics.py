@@ -0,0 +1,53 @@
+import warnings
+
+import numpy as np
+import pytest
+from numpy.lib.stride_tricks import sliding_window_view
+
+import data_processing as dp
+
+def _values(seed: int, n: int = 600) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    values = rng.normal(12, 2, n).round(1) # rounding makes ties
+    values[rng.random(n) < 0.1] = np.inf
+    values[200:240] = np.inf # a DNF streak longer than half of the small windows
+    values[300] = np.nan
+    return values
+
+def test_kth_matches_sort():
+    values = _values(0)
+    order_statistics = dp.SlidingOrderStatistics(values)
+    rng = np.random.default_rng(1)
+    lo = rng.integers(0, len(values) - 1, 500)
+    hi = lo + 1 + rng.integers(0, len(values) - lo)
+    k = (rng.random(500) * (hi - lo)).astype(np.int64)
+    ranked = np.where(np.isnan(values), np.inf, values)
+    expected = [np.sort(ranked[a:b])[c] for a, b, c in zip(lo, hi, k)]
+    np.testing.assert_array_equal(order_statistics.kth(lo, hi, k), expected)
+
+@pytest.mark.parametrize("window", [1, 2, 5, 12, 51, 100])
+def test_rolling_median_and_mad_match_numpy(window):
+    values = _values(window)
+    order_statistics = dp.SlidingOrderStatistics(values)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error") # DNF windows must not raise RuntimeWarnings
+        median = order_statistics.rolling_median(window)
+        mad = order_statistics.rolling_mad(window, median)
+
+    windows = sliding_window_view(np.where(np.isnan(values), np.inf, values), window)
+    with np.errstate(invalid="ignore"):
+        expected_median = np.median(windows, axis=1)
+        expected_mad = np.median(np.abs(windows - expected_median[:, None]), axis=1)
+    expected_mad[~np.isfinite(expected_median)] = np.nan
+    assert np.isnan(median[:window - 1]).all() and np.isnan(mad[:window - 1]).all()
+    np.testing.assert_array_equal(median[window - 1:], expected_median)
+    np.testing.assert_array_equal(mad[window - 1:], expected_mad)
+
+def test_robust_z_score_is_scaled_mad():
+    values = _values(3)
+    median, scale, z = dp.RollingStats(values).robust_z_score(25)
+    order_statistics = dp.SlidingOrderStatistics(values)
+    expected_scale = dp.MAD_TO_STD * order_statistics.rolling_mad(25)
+    expected_scale[expected_scale == 0] = np.nan
+    np.testing.assert_array_equal(median, order_statistics.rolling_median(25))
+    np.testing.assert_array_equal(scale, expected_scale)
@@ -0,0 +1,25 @@
+import tracemalloc
+
+import profiling
+
+def test_tracing_left_by_an_unclosed_profiler_is_stopped_or_taken_over():
+    profiling.StageProfiler(trace_memory=True) # never closed, like a rerun that raised
+    assert tracemalloc.is_tracing()
+    profiling.StageProfiler().close()
+    assert not tracemalloc.is_tracing()
+
+    profiling.StageProfiler(trace_memory=True)
+    profiler = profiling.StageProfiler(trace_memory=True) # takes over the tracing
+    profiler.checkpoint("stage")
+    profiler.close()
+    assert not tracemalloc.is_tracing()
+
+def test_tracing_started_elsewhere_is_left_running():
+    tracemalloc.start()
+    try:
+        profiling.StageProfiler().close()
+        with profiling.StageProfiler(trace_memory=True):
+            pass
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
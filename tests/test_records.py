@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_processing as dp
+
+def _history(seed: int, n: int = 3000):
+    rng = np.random.default_rng(seed)
+    dates = np.datetime64("2019-11-20T10:00") + np.cumsum(rng.exponential(2.0, n) * 3600).astype("timedelta64[s]") # ~8 months, crosses two new years
+    times = np.round(rng.normal(15, 2, n) - np.linspace(0, 4, n), 2)
+    times[rng.random(n) < 0.05] = np.inf # DNFs
+    times[0] = np.inf # history starting with a DNF
+    session_ids = np.cumsum(rng.random(n) < 0.1).astype(np.int32)
+    return dates.astype("datetime64[ns]"), times, session_ids
+
+def _naive_progression(dates, values, scope):
+    best, rows = {}, []
+    for date, value in zip(dates, values):
+        key = date.astype("datetime64[Y]") if scope == "year" else None
+        if not np.isfinite(value):
+            continue
+        if key not in best or value < best[key]:
+            previous = best.get(key, np.nan)
+            rows.append((date, value, previous))
+            best[key] = value
+    return rows
+
+@pytest.mark.parametrize("kind", ["single", "ao5", "ao12", "ao100"])
+@pytest.mark.parametrize("scope", ["all", "year"])
+def test_progression_matches_naive_scan(kind, scope):
+    dates, times, session_ids = _history(0)
+    index = dp.RecordIndex(dates, times, session_ids)
+    progression = index.progression(kind, scope)
+    expected = _naive_progression(dates, index.series[kind], scope)
+    assert len(progression) == len(expected)
+    np.testing.assert_array_equal(progression["date"].to_numpy(), [row[0] for row in expected])
+    np.testing.assert_array_equal(progression["value"], [row[1] for row in expected])
+    np.testing.assert_array_equal(progression["previous"], [row[2] for row in expected])
+
+def test_progression_date_filter_is_a_slice_of_the_full_timeline():
+    dates, times, session_ids = _history(1)
+    index = dp.RecordIndex(dates, times, session_ids)
+    full = index.progression("ao5")
+    start, end = pd.Timestamp("2020-02-01").date(), pd.Timestamp("2020-04-30").date()
+    inside = full[(full["date"].dt.date >= start) & (full["date"].dt.date <= end)].reset_index(drop=True)
+    pd.testing.assert_frame_equal(index.progression("ao5", start_date=start, end_date=end), inside)
+
+@pytest.mark.parametrize("kind", ["single", "ao5", "ao12"])
+def test_best_matches_naive_minimum(kind):
+    dates, times, session_ids = _history(2)
+    index = dp.RecordIndex(dates, times, session_ids)
+    n = 1 if kind == "single" else int(kind[2:])
+    rng = np.random.default_rng(3)
+    for start, stop in [(0, len(times)), (0, 3), (10, 10 + n - 1)] + [tuple(sorted(rng.integers(0, len(times), 2))) for _ in range(30)]:
+        averages = dp.rolling_wca_average(times[start:stop], session_ids[start:stop], n) if n > 1 else times[start:stop]
+        finite = averages[np.isfinite(averages)]
+        best = index.best(kind, slice(start, stop))
+        if len(finite):
+            assert best == pytest.approx(finite.min(), rel=1e-12) # prefix sums of a different start round differently
+        else:
+            assert best is None
+
+def test_extended_index_matches_a_rebuild():
+    dates, times, session_ids = _history(5)
+    index = dp.RecordIndex(dates[:700], times[:700], session_ids[:700])
+    for n in (701, 1500, 1501, 3000): # crosses the new years
+        index = index.extended(dates[:n], times[:n], session_ids[:n])
+        rebuilt = dp.RecordIndex(dates[:n], times[:n], session_ids[:n])
+        for kind in rebuilt.kinds:
+            np.testing.assert_allclose(index.series[kind], rebuilt.series[kind], rtol=1e-12)
+            for scope in ("all", "year"):
+                progression, expected = index.progression(kind, scope), rebuilt.progression(kind, scope)
+                np.testing.assert_array_equal(progression["date"], expected["date"])
+                np.testing.assert_allclose(progression[["value", "previous"]], expected[["value", "previous"]], rtol=1e-12)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+import data_processing as dp
+
+def _naive_wca_average(times, session_ids, n):
+    trim = int(np.ceil(n * 0.05)) if n >= 3 else 0
+    result = np.full(len(times), np.nan)
+    for end in range(n - 1, len(times)):
+        window = times[end - n + 1:end + 1]
+        if len(set(session_ids[end - n + 1:end + 1])) > 1:
+            continue
+        kept = np.sort(window)[trim:n - trim]
+        result[end] = np.inf if np.isinf(kept).any() else kept.mean()
+    return result
+
+def _history(seed: int, n: int = 400):
+    rng = np.random.default_rng(seed)
+    times = rng.normal(12, 2, n).round(2)
+    times[rng.random(n) < 0.08] = np.inf # DNFs
+    times[50:53] = 11.11 # ties
+    session_ids = np.cumsum(rng.random(n) < 0.05).astype(np.int32)
+    return times, session_ids
+
+@pytest.mark.parametrize("n", [1, 2, 3, 5, 12, 50, 100])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_matches_naive_average(n, seed):
+    times, session_ids = _history(seed)
+    np.testing.assert_allclose(dp.rolling_wca_average(times, session_ids, n), _naive_wca_average(times, session_ids, n), rtol=1e-12)
+
+def test_windows_never_span_sessions():
+    times = np.arange(1.0, 11.0)
+    session_ids = np.array([0] * 4 + [1] * 6)
+    averages = dp.rolling_wca_average(times, session_ids, 5)
+    assert np.isnan(averages[:8]).all() # windows ending in the first 4 solves of session 1 reach into session 0
+    np.testing.assert_allclose(averages[8:], [7.0, 8.0])
+
+def test_shorter_history_than_window():
+    assert np.isnan(dp.rolling_wca_average(np.array([10.0, 11.0]), np.zeros(2), 5)).all()
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_processing as dp
+
+def test_cache_keeps_only_recent_windows():
+    stats = dp.RollingStats(np.random.default_rng(0).normal(10, 1, 500), max_entries=2)
+    first = stats.z_score(10)
+    stats.z_score(20)
+    assert stats.z_score(10) is first # hit, becomes the most recent entry
+    stats.z_score(30) # evicts window 20
+    assert len(stats._cache) == 2 and (20, 100) not in stats._cache
+    np.testing.assert_array_equal(stats.z_score(20)[2], dp.RollingStats(stats.values).z_score(20)[2])
+
+def _values(seed: int, n: int = 1500) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    values = rng.normal(12, 2, n)
+    values[rng.random(n) < 0.05] = np.nan
+    values[rng.random(n) < 0.05] = np.inf # DNFs are skipped like NaN
+    return values
+
+@pytest.mark.parametrize("window", [1, 2, 5, 50, 500, 2000])
+def test_mean_and_std_match_pandas_rolling(window):
+    values = _values(window)
+    stats = dp.RollingStats(values)
+    series = pd.Series(values).replace(np.inf, np.nan)
+    np.testing.assert_allclose(stats.mean(window), series.rolling(window).mean(), rtol=1e-9, atol=1e-9)
+    min_periods = min(10, window)
+    np.testing.assert_allclose(stats.std(window, min_periods), series.rolling(window, min_periods=min_periods).std(), rtol=1e-7, atol=1e-9)
+
+def test_z_score_matches_pandas_rolling():
+    values = _values(7)
+    ma, std, z = dp.RollingStats(values).z_score(300)
+    series = pd.Series(values).replace(np.inf, np.nan)
+    expected_ma = series.rolling(300).mean()
+    expected_std = series.rolling(300, min_periods=100).std()
+    np.testing.assert_allclose(ma, expected_ma, rtol=1e-9)
+    np.testing.assert_allclose(std, expected_std, rtol=1e-7)
+    with np.errstate(invalid="ignore"):
+        np.testing.assert_allclose(z, (values - expected_ma) / expected_std, rtol=1e-6)
+
+def test_extended_stats_match_a_rebuild():
+    values = _values(7, 3000)
+    stats = dp.RollingStats(values[:1000])
+    stats.z_score(50)
+    stats.robust_z_score(25)
+    for n in (1000, 1001, 1800, 3000): # extended once or several times, cached windows extended on their next use
+        stats = stats.extended(values[:n])
+        rebuilt = dp.RollingStats(values[:n])
+        for extended, expected in zip(stats.z_score(50) + stats.robust_z_score(25), rebuilt.z_score(50) + rebuilt.robust_z_score(25)):
+            np.testing.assert_allclose(extended, expected, rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(stats.z_score(7)[2], dp.RollingStats(values).z_score(7)[2], rtol=1e-9, atol=1e-9)
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_processing as dp
+
+def _cells(seed: int, n: int = 3000, n_groups: int = 12, effect: float = 0.0):
+    rng = np.random.default_rng(seed)
+    groups = rng.integers(0, n_groups, n)
+    values = rng.normal(0, 1, n) + effect * (groups == 0) # only group 0 is shifted
+    values[rng.random(n) < 0.02] = np.nan
+    return values, groups
+
+def _naive_p_values(values, groups, n_permutations, rng):
+    valid = ~np.isnan(values)
+    values, groups = values[valid], groups[valid]
+    labels = np.unique(groups)
+    overall = values.mean()
+    observed = np.array([abs(values[groups == g].mean() - overall) for g in labels])
+    extreme = np.zeros(len(labels))
+    for _ in range(n_permutations):
+        shuffled = rng.permutation(groups)
+        extreme += np.array([abs(values[shuffled == g].mean() - overall) for g in labels]) >= observed * (1 - 1e-9)
+    return (1 + extreme) / (1 + n_permutations)
+
+def _naive_benjamini_hochberg(p_values):
+    # q_i = min over p_j >= p_i of m * p_j / rank_j, capped at 1
+    m = len(p_values)
+    adjusted = {p: m * p / (p_values <= p).sum() for p in p_values}
+    return np.array([min(1.0, min(adjusted[q] for q in p_values if q >= p)) for p in p_values])
+
+def test_group_means_match_groupby():
+    values, groups = _cells(0)
+    result = dp.group_mean_significance(values, groups, n_permutations=100, n_boot=100)
+    expected = pd.Series(values).groupby(groups).agg(["count", "mean"])
+    np.testing.assert_array_equal(result.index, expected.index)
+    np.testing.assert_array_equal(result["n"], expected["count"])
+    np.testing.assert_allclose(result["mean"], expected["mean"])
+
+def test_p_values_match_naive_permutation_test():
+    values, groups = _cells(1, n=1500, n_groups=5, effect=0.15)
+    result = dp.group_mean_significance(values, groups, n_permutations=4000, n_boot=100)
+    naive = _naive_p_values(values, groups, 4000, np.random.default_rng(2))
+    np.testing.assert_allclose(result["p_value"], naive, atol=0.03) # Monte Carlo error of both tests
+
+def test_bootstrap_interval_matches_naive_bootstrap():
+    values, groups = _cells(3, n=800, n_groups=3)
+    result = dp.group_mean_significance(values, groups, n_permutations=10, n_boot=4000)
+    rng = np.random.default_rng(4)
+    for group in result.index:
+        members = values[(groups == group) & ~np.isnan(values)]
+        boots = [rng.choice(members, len(members)).mean() for _ in range(4000)]
+        low, high = np.percentile(boots, [2.5, 97.5])
+        assert result.loc[group, "ci_low"] == pytest.approx(low, abs=0.03)
+        assert result.loc[group, "ci_high"] == pytest.approx(high, abs=0.03)
+
+def test_false_positive_rate_under_the_null():
+    values, groups = _cells(5, n=20000, n_groups=200)
+    p_values = dp.group_mean_significance(values, groups, n_permutations=1000, n_boot=10)["p_value"]
+    assert 0.01 <= (p_values < 0.05).mean() <= 0.10
+
+def test_detects_a_shifted_group():
+    values, groups = _cells(6, effect=0.5)
+    result = dp.group_mean_significance(values, groups, n_permutations=2000, n_boot=10)
+    assert result["q_value"].iloc[0] < 0.01
+    assert (result["q_value"].iloc[1:] > 0.05).mean() > 0.8
+
+def test_benjamini_hochberg_matches_definition():
+    p_values = np.random.default_rng(7).random(40) ** 2
+    np.testing.assert_allclose(dp.benjamini_hochberg(p_values), _naive_benjamini_hochberg(p_values))
+
+def test_results_are_deterministic_for_any_worker_count():
+    values, groups = _cells(8, n=1000, n_groups=4)
+    serial = dp.group_mean_significance(values, groups, n_permutations=400, n_boot=200, seed=3)
+    pd.testing.assert_frame_equal(serial, dp.group_mean_significance(values, groups, n_permutations=400, n_boot=200, seed=3))
+    pd.testing.assert_frame_equal(serial, dp.group_mean_significance(values, groups, n_permutations=400, n_boot=200, seed=3, workers=2))
+
+def _sessions(seed: int, n_sessions: int = 600, n_cells: int = 40):
+    # whole sessions land in one random cell and share a session effect (form of the day): no real cell effect
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(5, 60, n_sessions)
+    session_ids = np.repeat(np.arange(n_sessions), sizes)
+    values = rng.normal(0, 0.8, n_sessions)[session_ids] + rng.normal(0, 0.6, len(session_ids))
+    cells = rng.integers(0, n_cells, n_sessions)[session_ids]
+    return values, cells, session_ids
+
+def _naive_block_p_values(values, groups, blocks, n_permutations, rng):
+    units = pd.DataFrame({"value": values, "group": groups, "block": blocks}).groupby(["group", "block"])["value"].agg(["sum", "count"]).reset_index()
+    overall = units["sum"].sum() / units["count"].sum()
+    def group_means(labels):
+        totals = units.assign(group=labels).groupby("group")[["sum", "count"]].sum()
+        return (totals["sum"] / totals["count"]).to_numpy()
+    observed = np.abs(group_means(units["group"].to_numpy()) - overall)
+    extreme = sum(np.abs(group_means(rng.permutation(units["group"].to_numpy())) - overall) >= observed * (1 - 1e-9) for _ in range(n_permutations))
+    return (1 + extreme) / (1 + n_permutations)
+
+def test_session_blocks_keep_the_null_calibrated():
+    rates = {None: [], "sessions": []}
+    for seed in range(3):
+        values, cells, session_ids = _sessions(seed)
+        for blocks in rates:
+            p_values = dp.group_mean_significance(values, cells, n_permutations=1000, n_boot=10, blocks=session_ids if blocks else None)["p_value"]
+            rates[blocks].append((p_values < 0.05).mean())
+    assert np.mean(rates[None]) > 0.2 # solves as units: correlated solves make most cells look significant
+    assert np.mean(rates["sessions"]) <= 0.1
+
+def test_block_p_values_match_naive_unit_permutation():
+    values, cells, session_ids = _sessions(9, n_sessions=120, n_cells=4)
+    cells[::7] = (cells[::7] + 1) % 4 # some sessions span two cells, each part is its own unit
+    result = dp.group_mean_significance(values, cells, n_permutations=3000, n_boot=10, blocks=session_ids)
+    naive = _naive_block_p_values(values, cells, session_ids, 1500, np.random.default_rng(10))
+    np.testing.assert_allclose(result["p_value"], naive, atol=0.04)
+    np.testing.assert_array_equal(result["units"], pd.DataFrame({"c": cells, "s": session_ids}).drop_duplicates().groupby("c").size())
+
+def test_one_value_blocks_match_the_solve_level_test():
+    values, groups = _cells(11, n=600, n_groups=5)
+    unblocked = dp.group_mean_significance(values, groups, n_permutations=300, n_boot=300)
+    blocked = dp.group_mean_significance(values, groups, n_permutations=300, n_boot=300, blocks=np.arange(len(values)))
+    pd.testing.assert_frame_equal(blocked, unblocked)
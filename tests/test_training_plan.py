@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+import data_processing as dp
+
+def _simulator(weekly_z_mean, weekly_volume, n_sessions, recent_seed: int = 0):
+    weekly = pd.DataFrame(
+        {"weekly_volume": weekly_volume, "weekly_z_mean": weekly_z_mean, "n_sessions": n_sessions},
+        index=pd.date_range("2023-01-02", periods=len(weekly_volume), freq="W-MON", name="week"),
+    )
+    _, weekly_valid = dp.weekly_tables(weekly)
+    recent = np.random.default_rng(recent_seed).normal(10, 1, 500)
+    return dp.TrainingPlanSimulator(dp.add_weekly_structure_bins(weekly_valid), recent, dp.weekly_structure_edges(weekly_valid))
+
+def test_zero_effect_pool_stays_flat():
+    rng = np.random.default_rng(1)
+    n = 80
+    simulator = _simulator(np.full(n, 0.2), rng.integers(50, 800, n), rng.integers(1, 12, n)) # every week reaches the same level
+    projection = simulator.simulate(400, 6, weeks=26, n_sims=2000)
+    for column in ("mean_time_p10", "mean_time_p50", "mean_time_p90"):
+        np.testing.assert_allclose(projection[column], simulator.center)
+    np.testing.assert_allclose(projection["p_sub_goal"], projection["p_sub_goal"].iloc[0])
+
+def test_noise_without_structure_effect_does_not_drift():
+    rng = np.random.default_rng(2)
+    n = 300
+    simulator = _simulator(rng.normal(0, 0.3, n), rng.integers(50, 800, n), rng.integers(1, 12, n))
+    projection = simulator.simulate(400, 6, weeks=52, n_sims=4000)
+    steady = projection.iloc[1:]
+    for column in ("mean_time_p10", "mean_time_p50", "mean_time_p90"):
+        assert steady[column].nunique() == 1 # the level is held, not accumulated
+    assert abs(steady["mean_time_p50"].iloc[-1] - simulator.center) < 0.15 * simulator.scale
+    assert steady["mean_time_p90"].iloc[-1] - steady["mean_time_p10"].iloc[-1] < 0.5 * simulator.scale
+
+def test_better_bin_projects_faster_times():
+    rng = np.random.default_rng(3)
+    n = 200
+    volume = rng.integers(50, 800, n)
+    level = np.where(volume > 400, -0.4, 0.4) # weeks after high-volume weeks are faster
+    z_mean = np.concatenate(([0.0], level[:-1])) + rng.normal(0, 0.05, n)
+    simulator = _simulator(z_mean, volume, rng.integers(1, 12, n))
+    high = simulator.simulate(750, 6, weeks=8, n_sims=2000)
+    low = simulator.simulate(60, 6, weeks=8, n_sims=2000)
+    assert high["mean_time_p50"].iloc[-1] < simulator.center < low["mean_time_p50"].iloc[-1]
+    assert high["p_sub_goal"].iloc[-1] > low["p_sub_goal"].iloc[-1]